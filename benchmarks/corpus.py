@@ -0,0 +1,55 @@
+"""Generators of synthetic code used by benchmarks.
+
+Every corpus yields top-level statements of a valid program which can also be executed. Names are
+long enough not to be recognised by lexer as misspelled reserved words.
+"""
+
+OPERATORS = ["+", "-", "*"]
+
+
+def flat_statements(size):
+    """Declaration followed by short assignments"""
+    yield "int total := 0;"
+    for index in range(1, size):
+        yield "total := total + {};".format(index % 7)
+
+
+def nested_expressions(size, depth=50):
+    """Declarations of values computed by expressions nested given number of times"""
+    yield "int value_0 := 1;"
+    for index in range(1, size):
+        expression = "value_0"
+        for level in range(depth):
+            expression = "(value_{} {} {})".format(level % index, OPERATORS[level % len(OPERATORS)], expression)
+        yield "int value_{} := {} % 1000;".format(index, expression)
+
+
+def identifiers(size, distinct=1000):
+    """Declarations of distinct names followed by assignments reading several of them"""
+    distinct = max(1, min(distinct, size // 2))
+    for index in range(distinct):
+        yield "int item_{} := {};".format(index, index)
+    for index in range(distinct, size):
+        names = ["item_{}".format((index * factor) % distinct) for factor in (1, 3, 7, 11)]
+        yield "item_{} := ({}) % 1000;".format(index % distinct, " + ".join(names))
+
+
+def long_loops(size, body=100, iterations=10):
+    """Loops with bodies of given number of statements, size is total number of statements in bodies"""
+    yield "int total := 0;"
+    yield "int index := 0;"
+    for _ in range(max(1, size // body)):
+        statements = " ".join("total := total + index * {};".format(step) for step in range(body))
+        yield "for(index := 0; index < {}; index := index + 1) {{ {} }};".format(iterations, statements)
+
+
+CORPORA = {
+    "flat_statements": flat_statements,
+    "nested_expressions": nested_expressions,
+    "identifiers": identifiers,
+    "long_loops": long_loops,
+}
+
+
+def generate_statements(name, size, **options):
+    return list(CORPORA[name](size, **options))
@@ -0,0 +1,193 @@
+"""Execution time of example programs and generated stress workloads.
+
+Every program is compiled and run by Interpreter with each engine, with and without optimisations. Reported
+are the shortest wall time of repeated runs, peak memory of a separate run traced with tracemalloc
+and the number of temporaries introduced by common subexpression elimination of the AST optimizer.
+Output of programs is discarded. Results are printed or written to a file as JSON and can be
+compared against a baseline saved earlier, the run fails when any program got slower than allowed.
+
+    python -m benchmarks.execution [--workload NAME ...] [--scale N] [--save-baseline FILE]
+                                   [--baseline FILE] [--threshold RATIO]
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from benchmarks.workloads import WORKLOADS, generate_program
+from compiler.interpreter import Interpreter
+from compiler.visitor import NodeVisitor
+
+ENGINES = ("ast", "ir")
+EXAMPLES_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "examples")
+DEFAULT_SCALE = 20000
+
+
+class NullOutput:
+    def write(self, text):
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+class TemporaryCounter(NodeVisitor):
+    """Collects names of temporaries saved by the program"""
+
+    def __init__(self):
+        self._names = set()
+
+    def count(self, program):
+        self.visit(program)
+        return len(self._names)
+
+    def visit_TemporaryAssignment(self, node):
+        self._names.add(node.name)
+        self.generic_visit(node)
+
+
+class ExecutionBenchmark:
+    def __init__(self, repeat=3, measure_memory=True):
+        self._repeat = repeat
+        self._measure_memory = measure_memory
+        self._interpreters = {(engine, opt): Interpreter(opt, engine) for engine in ENGINES for opt in (False, True)}
+
+    def execute(self, code, engine, opt):
+        """Returns compiled program after its run, None when code could not be parsed"""
+        program = self._interpreters[engine, opt].compile(code)
+        if program is not None:
+            program.run(outputs=NullOutput())
+        return program
+
+    def measure(self, code, engine, opt):
+        """Returns parsed program and the shortest time of repeated runs"""
+        program, best = None, None
+        for _ in range(self._repeat):
+            start = time.perf_counter()
+            program = self.execute(code, engine, opt)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return program, best
+
+    def run(self, name, code):
+        results = []
+        for engine in ENGINES:
+            for opt in (False, True):
+                program, seconds = self.measure(code, engine, opt)
+                if program is None:
+                    raise RuntimeError("Program {} could not be parsed".format(name))
+
+                executed_ast = program.compiled is None
+                result = {
+                    "program": name,
+                    "engine": engine,
+                    "opt": opt,
+                    "fallback": engine != "ast" and executed_ast,
+                    "wall_seconds": seconds,
+                    "cse_temporaries": TemporaryCounter().count(program.program) if opt and executed_ast else None,
+                }
+                if self._measure_memory:
+                    result["peak_memory_bytes"] = peak_memory(self.execute, code, engine, opt)
+                results.append(result)
+        return results
+
+
+def peak_memory(function, *args):
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def load_programs(workloads, scale, examples=True):
+    programs = []
+    if examples:
+        for file_name in sorted(glob.glob(os.path.join(EXAMPLES_DIRECTORY, "*.cd"))):
+            with open(file_name, "r") as input_file:
+                programs.append(("examples/" + os.path.basename(file_name), input_file.read()))
+    for workload in workloads:
+        programs.append((workload, generate_program(workload, scale)))
+    return programs
+
+
+def result_key(result):
+    return result["program"], result["engine"], result["opt"]
+
+
+def compare(results, baseline, threshold):
+    """Returns comparison of every result found in baseline and whether any of them regressed"""
+    baseline_results = {result_key(result): result for result in baseline["results"]}
+    comparison, regressed = [], False
+    for result in results:
+        previous = baseline_results.get(result_key(result))
+        if previous is None:
+            continue
+        ratio = result["wall_seconds"] / previous["wall_seconds"]
+        slower = ratio > threshold
+        regressed = regressed or slower
+        comparison.append({
+            "program": result["program"],
+            "engine": result["engine"],
+            "opt": result["opt"],
+            "baseline_seconds": previous["wall_seconds"],
+            "wall_seconds": result["wall_seconds"],
+            "ratio": ratio,
+            "regressed": slower,
+        })
+    return comparison, regressed
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Interpreter execution benchmark")
+    argparser.add_argument("--workload", choices=sorted(WORKLOADS), action="append",
+                           help="Workload to measure, may be repeated, all workloads by default")
+    argparser.add_argument("--scale", type=int, default=DEFAULT_SCALE, help="Number of iterations of every workload")
+    argparser.add_argument("--no-examples", action="store_true", help="Skip programs from examples directory")
+    argparser.add_argument("--repeat", type=int, default=3, help="Number of timed runs, the best one is reported")
+    argparser.add_argument("--no-memory", action="store_true", help="Skip measurement of peak memory")
+    argparser.add_argument("--output", type=str, help="Write results to given file instead of standard output")
+    argparser.add_argument("--save-baseline", type=str, help="Also write results to given baseline file")
+    argparser.add_argument("--baseline", type=str, help="Compare results against given baseline file")
+    argparser.add_argument("--threshold", type=float, default=1.2,
+                           help="Ratio of wall time to the baseline above which program regressed")
+    args = argparser.parse_args()
+
+    benchmark = ExecutionBenchmark(args.repeat, not args.no_memory)
+    results = []
+    for name, code in load_programs(args.workload or sorted(WORKLOADS), args.scale, not args.no_examples):
+        results.extend(benchmark.run(name, code))
+    report = {
+        "benchmark": "execution",
+        "python": platform.python_version(),
+        "scale": args.scale,
+        "results": results,
+    }
+
+    regressed = False
+    if args.baseline:
+        with open(args.baseline, "r") as baseline_file:
+            report["comparison"], regressed = compare(results, json.load(baseline_file), args.threshold)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Throughput of lexer and parser measured on synthetic corpora.
+
+Lexer is measured in tokens per second, parser (including lexing) in top-level statements per
+second, peak memory of parsing is measured in a separate run with tracemalloc. Results are printed
+or written to a file as JSON.
+
+    python -m benchmarks.frontend [--corpus NAME ...] [--size N] [--repeat N] [--output FILE]
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from benchmarks.corpus import CORPORA, generate_statements
+from compiler.lexer import Lexer
+from compiler.parser import Parser
+
+DEFAULT_SIZES = {
+    "flat_statements": 100000,
+    "nested_expressions": 500,
+    "identifiers": 20000,
+    "long_loops": 20000,
+}
+
+
+class FrontendBenchmark:
+    def __init__(self, repeat=3, measure_memory=True):
+        self._repeat = repeat
+        self._measure_memory = measure_memory
+        self._lexer = Lexer()
+        self._lexer.build()
+        self._parser = Parser(self._lexer.tokens)
+        self._parser.build(write_tables=False, debug=False)
+
+    def count_tokens(self, code):
+        lexer = self._lexer.lexer
+        lexer.input(code)
+        count = 0
+        while lexer.token() is not None:
+            count += 1
+        return count
+
+    def parse(self, code):
+        program = self._parser.parse(self._lexer, code)
+        if program is None:
+            raise RuntimeError("Generated code could not be parsed")
+        return len(program.statement_list)
+
+    def measure(self, function, code):
+        """Returns result of function and the shortest time of its repeated runs"""
+        result, best = None, None
+        for _ in range(self._repeat):
+            # every run starts with names not classified yet, as in a new process
+            Lexer.classify_name.cache_clear()
+            start = time.perf_counter()
+            result = function(code)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return result, best
+
+    def run(self, corpus, size):
+        statements = generate_statements(corpus, size)
+        code = "\n".join(statements)
+
+        tokens, lex_seconds = self.measure(self.count_tokens, code)
+        parsed, parse_seconds = self.measure(self.parse, code)
+        if parsed != len(statements):
+            raise RuntimeError("Parsed {} statements out of {}".format(parsed, len(statements)))
+
+        result = {
+            "corpus": corpus,
+            "size": size,
+            "bytes": len(code),
+            "tokens": tokens,
+            "statements": parsed,
+            "lex_seconds": lex_seconds,
+            "tokens_per_second": tokens / lex_seconds,
+            "parse_seconds": parse_seconds,
+            "statements_per_second": parsed / parse_seconds,
+        }
+        if self._measure_memory:
+            result["parse_peak_memory_bytes"] = peak_memory(self.parse, code)
+        return result
+
+
+def peak_memory(function, code):
+    Lexer.classify_name.cache_clear()
+    tracemalloc.start()
+    try:
+        function(code)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Lexer and parser throughput benchmark")
+    argparser.add_argument("--corpus", choices=sorted(CORPORA), action="append",
+                           help="Corpus to measure, may be repeated, all corpora by default")
+    argparser.add_argument("--size", type=int, help="Number of statements of every corpus")
+    argparser.add_argument("--repeat", type=int, default=3, help="Number of timed runs, the best one is reported")
+    argparser.add_argument("--no-memory", action="store_true", help="Skip measurement of peak memory")
+    argparser.add_argument("--output", type=str, help="Write results to given file instead of standard output")
+    args = argparser.parse_args()
+
+    benchmark = FrontendBenchmark(args.repeat, not args.no_memory)
+    results = [benchmark.run(corpus, args.size or DEFAULT_SIZES[corpus])
+               for corpus in args.corpus or sorted(CORPORA)]
+    report = {
+        "benchmark": "frontend",
+        "python": platform.python_version(),
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Startup time of the compiler run as a new process on small programs.
+
+Every program is written to a temporary file and run by main.py in a fresh interpreter, once as it
+is and once with numpy, scipy.special and graphviz imported before main.py starts, which is how the
+compiler started when these modules were imported eagerly. Reported are the shortest wall time of
+repeated runs of both variants and heavy modules imported by the plain run. Results are printed or
+written to a file as JSON.
+
+    python -m benchmarks.startup [--program NAME ...] [--repeat N] [--output FILE]
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+HEAVY_MODULES = ("numpy", "scipy", "graphviz")
+
+PROGRAMS = {
+    "plain": "int counter := 1;\nprint(counter + 1);",
+    "arrays": "int numbers[10];\nnumbers[3] := 7;\nprint(numbers[3]);",
+    "bessel": "print(j(1.5, 0));",
+}
+
+# runs main.py like the command line does, then writes which heavy modules were imported
+RUNNER = """
+import json, runpy, sys
+main_file, report_file, eager = sys.argv[1], sys.argv[2], sys.argv[3] == "eager"
+if eager:
+    import numpy, scipy.special, graphviz
+sys.argv = [main_file] + sys.argv[4:]
+try:
+    runpy.run_path(main_file, run_name="__main__")
+finally:
+    with open(report_file, "w") as report:
+        json.dump(sorted(name for name in {heavy} if name in sys.modules), report)
+""".format(heavy=HEAVY_MODULES)
+
+
+class StartupBenchmark:
+    def __init__(self, repeat=5):
+        self._repeat = repeat
+
+    def execute(self, program_file, eager):
+        """Returns wall time of a single run and heavy modules it imported"""
+        with tempfile.TemporaryDirectory() as directory:
+            report_file = os.path.join(directory, "modules.json")
+            command = [sys.executable, "-c", RUNNER, MAIN, report_file, "eager" if eager else "lazy", program_file]
+            start = time.perf_counter()
+            subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            elapsed = time.perf_counter() - start
+            with open(report_file, "r") as report:
+                return elapsed, json.load(report)
+
+    def measure(self, program_file, eager):
+        best, modules = None, None
+        for _ in range(self._repeat):
+            elapsed, modules = self.execute(program_file, eager)
+            best = elapsed if best is None else min(best, elapsed)
+        return best, modules
+
+    def run(self, name):
+        with tempfile.TemporaryDirectory() as directory:
+            program_file = os.path.join(directory, name + ".cd")
+            with open(program_file, "w") as output_file:
+                output_file.write(PROGRAMS[name] + "\n")
+
+            # parsing tables are written by the first run, it is not measured
+            self.execute(program_file, False)
+            lazy_seconds, modules = self.measure(program_file, False)
+            eager_seconds, _ = self.measure(program_file, True)
+
+        return {
+            "program": name,
+            "seconds": lazy_seconds,
+            "eager_imports_seconds": eager_seconds,
+            "speedup": eager_seconds / lazy_seconds,
+            "imported_modules": modules,
+        }
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Compiler startup time benchmark")
+    argparser.add_argument("--program", choices=sorted(PROGRAMS), action="append",
+                           help="Program to run, may be repeated, all programs by default")
+    argparser.add_argument("--repeat", type=int, default=5, help="Number of timed runs, the best one is reported")
+    argparser.add_argument("--output", type=str, help="Write results to given file instead of standard output")
+    args = argparser.parse_args()
+
+    benchmark = StartupBenchmark(args.repeat)
+    results = [benchmark.run(name) for name in args.program or sorted(PROGRAMS)]
+    report = {
+        "benchmark": "startup",
+        "python": platform.python_version(),
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
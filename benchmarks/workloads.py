@@ -0,0 +1,110 @@
+"""Programs stressing the interpreter, generated for a given scale.
+
+Every workload is a complete program which prints a short result, so its output can be checked
+while the benchmark itself discards it.
+"""
+
+
+def while_loop(scale):
+    """Counting loop with arithmetic on several variables"""
+    return "\n".join([
+        "int counter := 0;",
+        "int total := 0;",
+        "while(counter < {}) {{ total := (total + counter * 3) % 1000; counter := counter + 1; }};".format(scale),
+        "print(total);",
+    ])
+
+
+def for_loop(scale):
+    """Loop repeating the same subexpressions, candidates for common subexpression elimination"""
+    return "\n".join([
+        "int counter := 0;",
+        "int first := 7;",
+        "int second := 5;",
+        "int total := 0;",
+        "for(counter := 0; counter < {}; counter := counter + 1) {{".format(scale),
+        "    total := (total + (first * second + counter) - (first * second + counter) % 3) % 1000;",
+        "};",
+        "print(total);",
+    ])
+
+
+def recursive_calls(scale):
+    """Recursive fibonacci, scale is the number of calls rounded up to the nearest fibonacci argument"""
+    argument, calls = 1, 1
+    while calls < scale:
+        argument += 1
+        calls = fibonacci_calls(argument)
+    return "\n".join([
+        "function fibonacci(int number) {",
+        "    int result := number;",
+        "    if(number > 1) { result := fibonacci(number - 1) + fibonacci(number - 2); };",
+        "} return result;",
+        "print(fibonacci({}));".format(argument),
+    ])
+
+
+def fibonacci_calls(argument):
+    previous, current = 1, 1
+    for _ in range(argument - 1):
+        previous, current = current, previous + current + 1
+    return current
+
+
+def array_fill(scale):
+    """Writes to every element of an array"""
+    return "\n".join([
+        "int numbers[{}];".format(scale),
+        "int position := 0;",
+        "while(position < {}) {{ numbers[position] := position * 2; position := position + 1; }};".format(scale),
+        "print(numbers[{}]);".format(scale - 1),
+    ])
+
+
+def string_concatenation(scale):
+    """Text growing by one character in every iteration"""
+    return "\n".join([
+        "string text := '';",
+        "int counter := 0;",
+        "while(counter < {}) {{ text := text + 'a'; counter := counter + 1; }};".format(scale),
+        "print(text == '');",
+    ])
+
+
+def string_wrapping(scale):
+    """Text growing at both ends in every iteration"""
+    return "\n".join([
+        "string text := '';",
+        "int counter := 0;",
+        "while(counter < {}) {{ text := 'aa' + text + 'cc'; counter := counter + 1; }};".format(scale),
+        "print(text == '');",
+    ])
+
+
+def parallel_loops(scale):
+    """Two loops over separate variables run in parallel block"""
+    half = max(1, scale // 2)
+    return "\n".join([
+        "int first_counter := 0;",
+        "int second_counter := 0;",
+        "parallel(",
+        "    while(first_counter < {}) {{ first_counter := first_counter + 1; }};".format(half),
+        "    while(second_counter < {}) {{ second_counter := second_counter + 1; }};".format(half),
+        ");",
+        "print(first_counter + second_counter);",
+    ])
+
+
+WORKLOADS = {
+    "while_loop": while_loop,
+    "for_loop": for_loop,
+    "recursive_calls": recursive_calls,
+    "array_fill": array_fill,
+    "string_concatenation": string_concatenation,
+    "string_wrapping": string_wrapping,
+    "parallel_loops": parallel_loops,
+}
+
+
+def generate_program(name, scale):
+    return WORKLOADS[name](scale)
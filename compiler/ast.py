@@ -1,173 +1,258 @@
 import abc
 import copy
+import functools
+import itertools
+import operator
 import threading
 
 from compiler.errors import *
+from compiler.names import is_array
+from compiler.visitor import NodeVisitor
+
+
+node_ids = itertools.count()
+
+
+def execute_in_thread(statement, scope, opt):
+    """Executes statement in own thread, reported errors do not leave scopes shared with other threads"""
+    try:
+        statement.execute(scope, opt)
+    except HANDLED_ERRORS as err:
+        scope.report_error(runtime_error(err, statement.position))
+
+
+@functools.lru_cache(maxsize=None)
+def get_slots(node_class):
+    return tuple(slot for base in node_class.__mro__ for slot in getattr(base, "__slots__", ()))
+
+
+def get_node_classes():
+    classes, pending = [], list(Node.__subclasses__())
+    while pending:
+        node_class = pending.pop()
+        classes.append(node_class)
+        pending.extend(node_class.__subclasses__())
+    return classes
 
 
 class Node(object):
     __metaclass__ = abc.ABCMeta
+    __slots__ = ("_id", "_names", "_line", "_column")
+
+    # attributes holding child nodes or lists of them, in order of evaluation
+    _fields = ()
+    # cached sets of used and declared names are valid while the generation is current
+    _names_generation = 0
+
+    def __init__(self):
+        self._id = next(node_ids)
+        self._names = None
+        self._line = None
+        self._column = None
 
     @property
     def id(self):
-        return str(id(self))
+        return self._id
+
+    @property
+    def position(self):
+        """Source line and column where the node starts, None for nodes created by the compiler"""
+        return (self._line, self._column) if self._line is not None else None
+
+    @position.setter
+    def position(self, position):
+        self._line, self._column = position if position is not None else (None, None)
+
+    @property
+    def line(self):
+        return self._line
+
+    def children(self):
+        for field in self._fields:
+            value = getattr(self, field)
+            if isinstance(value, list):
+                yield from (element for element in value if isinstance(element, Node))
+            elif isinstance(value, Node):
+                yield value
+
+    def replace_children(self, replace):
+        for field in self._fields:
+            value = getattr(self, field)
+            if isinstance(value, list):
+                setattr(self, field, [replace(element) if isinstance(element, Node) else element
+                                      for element in value])
+            elif isinstance(value, Node):
+                setattr(self, field, replace(value))
+
+    def __deepcopy__(self, memo):
+        result = object.__new__(self.__class__)
+        memo[id(self)] = result
+        for slot in get_slots(self.__class__):
+            setattr(result, slot, copy.deepcopy(getattr(self, slot), memo))
+        # copy is a new node
+        result._id = next(node_ids)
+        result._names = None
+        return result
 
-    @abc.abstractmethod
     def get_used_names(self):
-        pass
+        return self.get_names()[0]
 
     def get_declared_names(self):
-        return []
+        return self.get_names()[1]
+
+    def get_names(self):
+        if self._names is None or self._names[0] != Node._names_generation:
+            used, declared = NameCollector().analyze(self)
+            self._names = Node._names_generation, frozenset(used), frozenset(declared)
+        return self._names[1:]
+
+    @staticmethod
+    def invalidate_names():
+        Node._names_generation += 1
 
     @abc.abstractmethod
     def execute(self, scope, opt):
         pass
 
     def execute_and_handle_errors(self, scope, opt):
+        """Executes top-level statement, error is reported and scopes left open by it are closed"""
+        depth = scope.depth
+        if scope.tracer is not None:
+            scope.tracer.on_statement(self)
         try:
             return self.execute(scope, opt)
-        except BinaryOperationError as err:
-            msg, = err.args
-            print("Error with binary operation: {}".format(msg))
-        except ConditionError as err:
-            msg, = err.args
-            print("Error with given condition: {}".format(msg))
-        except ConversionError as err:
-            msg, = err.args
-            print("Error with conversion: {}".format(msg))
-        except AssignmentError as err:
-            msg, = err.args
-            print("Error with assignment: {}".format(msg))
-        except ValueError as err:
-            msg, = err.args
-            print("Value Error: {}".format(msg))
-        except IndexError as err:
-            msg, = err.args
-            print("Index error when using array type: {}".format(msg))
-        """except:
-            print("Unrecognized error")"""
-
-    @staticmethod
-    def remove_needless_statements(statement_list, scope):
-        needless_statements = []
-        unused_names = scope.get_unused_names()
-        unused_functions = scope.get_unused_functions()
-
-        for statement in statement_list:
-            if isinstance(statement, (Declaration, Assignment)) and statement.name in unused_names.keys():
-                needless_statements.append(statement)
-            elif isinstance(statement, CustomFunction) and statement.name in unused_functions.keys():
-                needless_statements.append(statement)
-
-        return list(filter(lambda x: x not in needless_statements, statement_list))
+        except HANDLED_ERRORS as err:
+            scope.unwind(depth)
+            scope.report_error(runtime_error(err, self.position))
 
 
 class Program(Node):
+    __slots__ = ("_statement_list", "_repl_mode")
+    _fields = ("_statement_list",)
+
     def __init__(self, statement_list):
+        super().__init__()
         self._statement_list = statement_list
         self._repl_mode = False
 
-    def get_used_names(self):
-        result = []
-        for statement in self._statement_list:
-            result += statement.get_used_names()
-        return result
-
-    def get_declared_names(self):
-        result = []
-        for statement in self._statement_list:
-            result += statement.get_declared_names()
-        return result
-
     def execute(self, scope, opt):
-        for statement in self._statement_list:
-            result = statement.execute_and_handle_errors(scope, opt)
-
-            if self._repl_mode and result is not None:
-                print(result)
-
-        if opt:
-            self._statement_list = Node.remove_needless_statements(self._statement_list, scope)
+        statements = self._statement_list
+        depth = scope.depth
+        tracer = scope.tracer
+        index = 0
+        # try block is entered again only after an error, not for every statement
+        while index < len(statements):
+            try:
+                while index < len(statements):
+                    statement = statements[index]
+                    index += 1
+                    if tracer is not None:
+                        tracer.on_statement(statement)
+                    result = statement.execute(scope, opt)
+
+                    if self._repl_mode and result is not None:
+                        scope.print_value(result)
+            except BudgetExceeded as err:
+                scope.unwind(depth)
+                scope.report_error(runtime_error(err, statement.position))
+                return
+            except HANDLED_ERRORS as err:
+                scope.unwind(depth)
+                scope.report_error(runtime_error(err, statement.position))
 
     @property
     def statement_list(self):
         return self._statement_list
 
+    @statement_list.setter
+    def statement_list(self, statement_list):
+        self._statement_list = statement_list
+
     def activate_repl_mode(self):
         self._repl_mode = True
 
 
 class Block(Node):
+    __slots__ = ("_statement_list",)
+    _fields = ("_statement_list",)
+
     def __init__(self, statement_list):
+        super().__init__()
         self._statement_list = statement_list
 
-    def get_used_names(self):
-        used_names = []
-        declared_names = self.get_declared_names()
-
-        for statement in self._statement_list:
-            used_names += statement.get_used_names()
-        return [name for name in used_names if name not in declared_names]
-
-    def get_declared_names(self):
-        result = []
-        for statement in self._statement_list:
-            result += statement.get_declared_names()
-        return result
-
     def execute(self, scope, opt):
-        for statement in self._statement_list:
-            statement.execute(scope, opt)
+        tracer = scope.tracer
+        try:
+            for statement in self._statement_list:
+                if tracer is not None:
+                    tracer.on_statement(statement)
+                statement.execute(scope, opt)
+        except HANDLED_ERRORS as err:
+            raise runtime_error(err, statement.position)
 
-        if opt:
-            self._statement_list = Node.remove_needless_statements(self._statement_list, scope)
+    @property
+    def statement_list(self):
+        return self._statement_list
+
+    @statement_list.setter
+    def statement_list(self, statement_list):
+        self._statement_list = statement_list
+        Node.invalidate_names()
 
 
 class FunctionArgumentList(Node):
+    __slots__ = ("_arguments",)
+    _fields = ("_arguments",)
+
     def __init__(self, arguments):
+        super().__init__()
         self._arguments = arguments
 
-    def get_used_names(self):
-        result = []
-        for argument in self._arguments:
-            result += argument.get_used_names()
-        return result
-
     def execute(self, scope, opt):
         result = []
         for argument in self._arguments:
             result += [argument.execute(scope, opt)]
         return result
 
+    @property
+    def arguments(self):
+        return self._arguments
+
     def append_argument(self, argument):
         self._arguments.append(argument)
 
 
 class FunctionArgument(Node):
+    __slots__ = ("_name", "_type")
+
     def __init__(self, arg_type, arg_name):
+        super().__init__()
         self._name = arg_name
         self._type = arg_type
 
-    def get_used_names(self):
-        return [self._name.get_used_names()]
-
     def execute(self, scope, opt):
         return self._name, self._type
 
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def type(self):
+        return self._type
+
 
 class CustomFunction(Node):
+    __slots__ = ("_name", "_arg_list", "_body", "_returned_value")
+    _fields = ("_arg_list", "_body", "_returned_value")
+
     def __init__(self, name, arg_list, body, returned_value=None):
+        super().__init__()
         self._name = name
         self._arg_list = arg_list
         self._body = body
         self._returned_value = returned_value
 
-    def get_used_names(self):
-        return self._body.get_used_names() + self._returned_value.get_used_names()
-
-    def get_declared_names(self):
-        return [self._name]
-
     def execute(self, scope, opt):
         scope.declare_function(self._name, self._arg_list, self._body, self._returned_value)
 
@@ -175,69 +260,92 @@ class CustomFunction(Node):
     def name(self):
         return self._name
 
+    @property
+    def arg_list(self):
+        return self._arg_list
+
+    @property
+    def body(self):
+        return self._body
+
+    @property
+    def returned_value(self):
+        return self._returned_value
+
 
 class Print(Node):
+    __slots__ = ("_expression",)
+    _fields = ("_expression",)
+
     def __init__(self, expression):
+        super().__init__()
         self._expression = expression
 
-    def get_used_names(self):
-        return self._expression.get_used_names()
-
     def execute(self, scope, opt):
         result = self._expression.execute(scope, opt)
-
-        if opt:
-            saved_expression = scope.get_expression(self._expression)
-            if saved_expression is not None:
-                self._expression = saved_expression
-
-        print(result)
+        scope.print_value(result)
 
     @property
     def expression(self):
         return self._expression
 
+    @expression.setter
+    def expression(self, expression):
+        self._expression = expression
+
     def __eq__(self, other):
         return isinstance(other, Print) and \
                self.expression == other.expression
 
 
 class Parallel(Node):
+    __slots__ = ("_statement_list",)
+    _fields = ("_statement_list",)
+
     def __init__(self, statement_list):
+        super().__init__()
         self._statement_list = statement_list
 
-    def get_used_names(self):
-        result = []
-        for statement in self._statement_list:
-            result += statement.get_used_names()
-        return result
-
-    def get_declared_names(self):
-        result = []
-        for statement in self._statement_list:
-            result += statement.get_declared_names()
-        return result
-
     def execute(self, scope, opt):
         thread_list = []
+        tracer = scope.tracer
         for statement in self._statement_list:
-            statement_thread = threading.Thread(target=statement.execute_and_handle_errors, args=(scope, opt))
+            if tracer is not None:
+                tracer.on_statement(statement)
+            statement_thread = threading.Thread(target=execute_in_thread, args=(statement, scope, opt))
             statement_thread.start()
             thread_list.append(statement_thread)
 
         for statement_thread in thread_list:
             statement_thread.join()
 
+    @property
+    def statement_list(self):
+        return self._statement_list
+
+    @statement_list.setter
+    def statement_list(self, statement_list):
+        self._statement_list = statement_list
+
 
 class RepeatUntil(Node):
-    def __init__(self, block, condition):
+    __slots__ = ("_block", "_condition", "_preheader")
+    _fields = ("_preheader", "_block", "_condition")
+
+    def __init__(self, block, condition, preheader=None):
+        super().__init__()
         self._block = block
         self._condition = condition
-
-    def get_used_names(self):
-        return self._block.get_used_names() + self._condition.get_used_names()
+        self._preheader = preheader
 
     def execute(self, scope, opt):
+        enter_preheader(self._preheader, scope, opt)
+
+        budget, tracer = scope.budget, scope.tracer
+        if budget is not None:
+            budget.spend()
+        if tracer is not None:
+            tracer.on_loop_iteration(self)
         scope.start_new()
         self._block.execute(scope, opt)
         scope.end_current()
@@ -247,103 +355,218 @@ class RepeatUntil(Node):
             raise ConditionError("Given repeat-until condition is not bool")
 
         while not condition:
+            if budget is not None:
+                budget.spend()
+            if tracer is not None:
+                tracer.on_loop_iteration(self)
             scope.start_new()
             self._block.execute(scope, opt)
             scope.end_current()
             condition = self._condition.execute(scope, opt)
 
+        leave_preheader(self._preheader, scope)
+
+    @property
+    def block(self):
+        return self._block
+
+    @property
+    def condition(self):
+        return self._condition
+
+    @property
+    def preheader(self):
+        return self._preheader
+
+    @preheader.setter
+    def preheader(self, preheader):
+        self._preheader = preheader
+
 
 class For(Node):
-    def __init__(self, initial_assignment, condition, step_assignment, block):
+    __slots__ = ("_initial_assignment", "_condition", "_step_assignment", "_block", "_preheader",
+                 "_iteration_condition", "_parallel")
+    # iteration condition is the condition itself until the loop gets a preheader
+    _fields = ("_initial_assignment", "_condition", "_preheader", "_block", "_step_assignment")
+
+    def __init__(self, initial_assignment, condition, step_assignment, block, preheader=None):
+        super().__init__()
         self._initial_assignment = initial_assignment
         self._condition = condition
         self._step_assignment = step_assignment
         self._block = block
-
-    def get_used_names(self):
-        return self._initial_assignment.get_used_names() + \
-               self._condition.get_used_names() + \
-               self._step_assignment.get_used_names() + \
-               self._block.get_used_names()
+        self._preheader = preheader
+        self._iteration_condition = condition
+        # decided before optimizations change names used in the block
+        self._parallel = isinstance(block, Block) and len(block.get_used_names()) == 0
 
     def execute(self, scope, opt):
         self._initial_assignment.execute(scope, opt)
 
-        execute_parallel = False
-        if isinstance(self._block, Block):
-            used_names = self._block.get_used_names()
-            if len(used_names) == 0:
-                execute_parallel = True
-
-        if execute_parallel:
-            self.__execute_parallel(scope, opt)
-        else:
-            self.__execute_sequential(scope, opt)
-
-    def __execute_parallel(self, scope, opt):
-        print("Running loop in parallel way")
+        if self._parallel:
+            scope.print_value("Running loop in parallel way")
 
         condition = self._condition.execute(scope, opt)
         if not isinstance(condition, bool):
             raise ConditionError("Given for condition is not bool")
 
-        threads = []
-        while condition:
-            scope_copy = copy.copy(scope)
-            scope_copy.start_new()
+        if not condition:
+            return
 
-            for_thread = threading.Thread(target=self._block.execute, args=(scope_copy, opt))
-            for_thread.start()
-            threads.append(for_thread)
+        enter_preheader(self._preheader, scope, opt)
 
-            self._step_assignment.execute(scope, opt)
-            condition = self._condition.execute(scope, opt)
+        if self._parallel:
+            self.__execute_parallel(scope, opt)
+        else:
+            self.__execute_sequential(scope, opt)
 
-        for thread in threads:
-            thread.join()
+        leave_preheader(self._preheader, scope)
 
-    def __execute_sequential(self, scope, opt):
-        condition = self._condition.execute(scope, opt)
-        if not isinstance(condition, bool):
-            raise ConditionError("Given for condition is not bool")
+    def __execute_parallel(self, scope, opt):
+        condition = True
+        threads = []
+        budget, tracer = scope.budget, scope.tracer
+        try:
+            while condition:
+                # every iteration starts a thread, the budget limits their number
+                if budget is not None:
+                    budget.spend()
+                if tracer is not None:
+                    tracer.on_loop_iteration(self)
+                scope_copy = copy.copy(scope)
+                scope_copy.start_new()
+
+                for_thread = threading.Thread(target=execute_in_thread, args=(self._block, scope_copy, opt))
+                for_thread.start()
+                threads.append(for_thread)
+
+                self._step_assignment.execute(scope, opt)
+                condition = self._iteration_condition.execute(scope, opt)
+        finally:
+            for thread in threads:
+                thread.join()
 
+    def __execute_sequential(self, scope, opt):
+        condition = True
+        budget, tracer = scope.budget, scope.tracer
         while condition:
+            if budget is not None:
+                budget.spend()
+            if tracer is not None:
+                tracer.on_loop_iteration(self)
             scope.start_new()
             self._block.execute(scope, opt)
             scope.end_current()
             self._step_assignment.execute(scope, opt)
-            condition = self._condition.execute(scope, opt)
+            condition = self._iteration_condition.execute(scope, opt)
+
+    @property
+    def initial_assignment(self):
+        return self._initial_assignment
+
+    @property
+    def condition(self):
+        return self._condition
+
+    @property
+    def step_assignment(self):
+        return self._step_assignment
+
+    @property
+    def block(self):
+        return self._block
+
+    @property
+    def preheader(self):
+        return self._preheader
+
+    @preheader.setter
+    def preheader(self, preheader):
+        self._preheader = preheader
+
+    @property
+    def iteration_condition(self):
+        return self._iteration_condition
+
+    @iteration_condition.setter
+    def iteration_condition(self, iteration_condition):
+        self._iteration_condition = iteration_condition
+
+    @property
+    def parallel(self):
+        return self._parallel
 
 
 class While(Node):
-    def __init__(self, condition, block):
+    __slots__ = ("_condition", "_block", "_preheader", "_iteration_condition")
+    # iteration condition is the condition itself until the loop gets a preheader
+    _fields = ("_condition", "_preheader", "_block")
+
+    def __init__(self, condition, block, preheader=None):
+        super().__init__()
         self._condition = condition
         self._block = block
-
-    def get_used_names(self):
-        return self._condition.get_used_names() + self._block.get_used_names()
+        self._preheader = preheader
+        self._iteration_condition = condition
 
     def execute(self, scope, opt):
         condition = self._condition.execute(scope, opt)
         if not isinstance(condition, bool):
             raise ConditionError("Given while condition is not bool")
 
+        if not condition:
+            return
+
+        enter_preheader(self._preheader, scope, opt)
+
+        budget, tracer = scope.budget, scope.tracer
         while condition:
+            if budget is not None:
+                budget.spend()
+            if tracer is not None:
+                tracer.on_loop_iteration(self)
             scope.start_new()
             self._block.execute(scope, opt)
             scope.end_current()
-            condition = self._condition.execute(scope, opt)
+            condition = self._iteration_condition.execute(scope, opt)
+
+        leave_preheader(self._preheader, scope)
+
+    @property
+    def condition(self):
+        return self._condition
+
+    @property
+    def block(self):
+        return self._block
+
+    @property
+    def preheader(self):
+        return self._preheader
+
+    @preheader.setter
+    def preheader(self, preheader):
+        self._preheader = preheader
+
+    @property
+    def iteration_condition(self):
+        return self._iteration_condition
+
+    @iteration_condition.setter
+    def iteration_condition(self, iteration_condition):
+        self._iteration_condition = iteration_condition
 
 
 class ConditionalIfElse(Node):
+    __slots__ = ("_condition", "_block_if", "_block_else")
+    _fields = ("_condition", "_block_if", "_block_else")
+
     def __init__(self, condition, block_if, block_else):
+        super().__init__()
         self._condition = condition
         self._block_if = block_if
         self._block_else = block_else
 
-    def get_used_names(self):
-        return self._condition.get_used_names() + self._block_if.get_used_names() + self._block_else.get_used_names()
-
     def execute(self, scope, opt):
         condition = self._condition.execute(scope, opt)
         if not isinstance(condition, bool):
@@ -356,15 +579,32 @@ class ConditionalIfElse(Node):
             self._block_else.execute(scope, opt)
         scope.end_current()
 
+    @property
+    def condition(self):
+        return self._condition
+
+    @condition.setter
+    def condition(self, condition):
+        self._condition = condition
+
+    @property
+    def block_if(self):
+        return self._block_if
+
+    @property
+    def block_else(self):
+        return self._block_else
+
 
 class ConditionalIf(Node):
+    __slots__ = ("_condition", "_statement")
+    _fields = ("_condition", "_statement")
+
     def __init__(self, condition, statement):
+        super().__init__()
         self._condition = condition
         self._statement = statement
 
-    def get_used_names(self):
-        return self._condition.get_used_names() + self._statement.get_used_names()
-
     def execute(self, scope, opt):
         condition = self._condition.execute(scope, opt)
         if not isinstance(condition, bool):
@@ -375,48 +615,61 @@ class ConditionalIf(Node):
             self._statement.execute(scope, opt)
             scope.end_current()
 
+    @property
+    def condition(self):
+        return self._condition
+
+    @condition.setter
+    def condition(self, condition):
+        self._condition = condition
+
+    @property
+    def statement(self):
+        return self._statement
+
 
 class CallArgumentList(Node):
+    __slots__ = ("_arguments",)
+    _fields = ("_arguments",)
+
     def __init__(self, arguments):
+        super().__init__()
         self._arguments = arguments
 
-    def get_used_names(self):
-        result = []
-        for argument in self._arguments:
-            result += argument.get_used_names()
-        return result
-
     def execute(self, scope, opt):
         result = []
-        for index, argument in enumerate(self._arguments):
+        for argument in self._arguments:
             result.append(argument.execute(scope, opt))
-
-            if opt:
-                saved_argument = scope.get_expression(argument)
-                if saved_argument is not None:
-                    self._arguments[index] = saved_argument
-
         return result
 
     def append_argument(self, argument):
         self._arguments.append(argument)
 
+    @property
+    def arguments(self):
+        return self._arguments
+
 
 class Call(Node):
+    __slots__ = ("_function_name", "_arg_list")
+    _fields = ("_arg_list",)
+
     def __init__(self, function_name, arg_list):
+        super().__init__()
         self._function_name = function_name
         self._arg_list = arg_list
 
-    def get_used_names(self):
-        return [self._function_name.get_used_names()] + self._arg_list.get_used_names()
-
     def execute(self, scope, opt):
+        if scope.budget is not None:
+            scope.budget.spend()
+        if scope.tracer is not None:
+            scope.tracer.on_call(self)
         function = scope.read_function(self._function_name)
         call_arguments = self._arg_list.execute(scope, opt)
         function_arguments = function.arg_list.execute(scope, opt)
 
         if len(call_arguments) != len(function_arguments):
-            raise ValueError("Difference in number of arguments for call, expected: {} given: {}"
+            raise CalcValueError("Difference in number of arguments for call, expected: {} given: {}"
                              .format(len(function_arguments), len(call_arguments)))
 
         scope.start_new()
@@ -441,17 +694,25 @@ class Call(Node):
         scope.end_current()
         return result
 
+    @property
+    def function_name(self):
+        return self._function_name
+
+    @property
+    def arg_list(self):
+        return self._arg_list
+
 
 class PreFixExpression(Node):
+    __slots__ = ("_name", "_operation")
+
     def __init__(self, name, operation):
+        super().__init__()
         self._name = name
         self._operation = operation
 
-    def get_used_names(self):
-        return [self._name.get_used_names()]
-
     def execute(self, scope, opt):
-        value, _ = scope.read_name(self._name)
+        value = scope.read_name(self._name)
 
         if self._operation == "++":
             value += 1
@@ -461,17 +722,25 @@ class PreFixExpression(Node):
         scope.assign_name(self._name, value)
         return value
 
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def operation(self):
+        return self._operation
+
 
 class PostFixExpression(Node):
+    __slots__ = ("_name", "_operation")
+
     def __init__(self, name, operation):
+        super().__init__()
         self._name = name
         self._operation = operation
 
-    def get_used_names(self):
-        return [self._name.get_used_names()]
-
     def execute(self, scope, opt):
-        value, _ = scope.read_name(self._name)
+        value = scope.read_name(self._name)
 
         if self._operation == "++":
             scope.assign_name(self._name, value + 1)
@@ -480,95 +749,158 @@ class PostFixExpression(Node):
 
         return value
 
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def operation(self):
+        return self._operation
+
 
 class BuiltInFunction(Node):
-    def __init__(self, function, arguments):
-        self._function = function
-        self._arguments = arguments
+    __slots__ = ("_built_in", "_function", "_arguments", "_vectorized")
+    _fields = ("_arguments",)
 
-    def get_used_names(self):
-        return self._arguments.get_used_names()
+    def __init__(self, built_in, arguments):
+        super().__init__()
+        self._built_in = built_in
+        self._function = built_in.function
+        self._arguments = arguments
+        self._vectorized = built_in.vectorized
 
     def execute(self, scope, opt):
         executed_arguments = self._arguments.execute(scope, opt)
+        if self._vectorized is not None and any(is_array(argument) for argument in executed_arguments):
+            return self._vectorized(*executed_arguments)
         return self._function(*executed_arguments)
 
+    @property
+    def built_in(self):
+        """Registered function with its signature"""
+        return self._built_in
+
+    @property
+    def name(self):
+        return self._built_in.name
+
+    @property
+    def function(self):
+        return self._function
+
+    @property
+    def vectorized(self):
+        """Function applied to every element when some argument is an array"""
+        return self._vectorized
+
+    @property
+    def arguments(self):
+        return self._arguments
+
 
 class Assignment(Node):
+    __slots__ = ("_name", "_value", "_index", "_concatenation")
+    _fields = ("_value", "_index")
+
     def __init__(self, name, value, index=None):
+        super().__init__()
         self._name = name
         self._value = value
         self._index = index
-
-    def get_used_names(self):
-        return self._name.get_used_names()
+        # assigned value and its parts added before and after the name, found on first execution
+        self._concatenation = None
 
     def execute(self, scope, opt):
+        if self._concatenation is None or self._concatenation[0] is not self._value:
+            self._concatenation = self._value, get_concatenation(self)
+        if self._concatenation[1] is not None and self.__extend(scope, opt, *self._concatenation[1]):
+            return
+
         executed_value = self._value.execute(scope, opt)
 
-        if opt:
-            saved_value = scope.get_expression(self._value)
-            if saved_value is not None:
-                self._value = saved_value
+        index = get_indices(self._index, scope, opt) if self._index is not None else None
+        scope.assign_name(self._name, executed_value, index)
+
+    def __extend(self, scope, opt, prefixes, suffixes):
+        """Adds strings around the value of string variable, which is not copied until it is read.
 
-        if self._index is not None:
-            self._index = get_indices(self._index, scope, opt)
+        Returns False when some value is not a string, the assignment is then executed as usual. Parts
+        do not change any names, so executing them again gives the same values and errors.
+        """
+        if scope.read_name_type(self._name) is not str:
+            return False
 
-        scope.assign_name(self._name, executed_value, self._index)
+        executed_prefixes, executed_suffixes = [], []
+        for parts, executed_parts in ((prefixes, executed_prefixes), (suffixes, executed_suffixes)):
+            for part in parts:
+                executed_part = part.execute(scope, opt)
+                if type(executed_part) is not str:
+                    return False
+                executed_parts.append(executed_part)
+
+        scope.extend_name(self._name, executed_prefixes, executed_suffixes)
+        return True
 
     @property
     def name(self):
         return self._name
 
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+
+    @property
+    def index(self):
+        return self._index
+
 
 class Minus(Node):
+    __slots__ = ("_value",)
+    _fields = ("_value",)
+
     def __init__(self, value):
+        super().__init__()
         self._value = value
 
-    def get_used_names(self):
-        return self._value.get_used_names()
-
     def execute(self, scope, opt):
         executed_value = self._value.execute(scope, opt)
+        return (-1) * executed_value
 
-        if opt:
-            saved_value = scope.get_expression(self._value)
-            if saved_value is not None:
-                self._value = saved_value
+    @property
+    def value(self):
+        return self._value
 
-        return (-1) * executed_value
+    @value.setter
+    def value(self, value):
+        self._value = value
 
 
 class Declaration(Node):
+    __slots__ = ("_name", "_value_type", "_value", "_array_size")
+    _fields = ("_value", "_array_size")
+
     def __init__(self, name, value_type, value=None, array_size=None):
+        super().__init__()
         self._name = name
         self._value_type = value_type
         self._value = value
         self._array_size = array_size
 
-    def get_used_names(self):
-        if self._value is not None:
-            return self._value.get_used_names()
-        else:
-            return []
-
-    def get_declared_names(self):
-        return [self._name]
-
     def execute(self, scope, opt):
-        if self._value is not None:
+        if self._array_size is not None:
+            array_size = get_indices(self._array_size, scope, opt)
+            executed_value = self._value.execute(scope, opt) if self._value is not None else None
+            scope.declare_name(self._name, self._value_type, executed_value, array_size)
+        elif self._value is not None:
             executed_value = self._value.execute(scope, opt)
 
-            if opt:
-                saved_value = scope.get_expression(self._value)
-                if saved_value is not None:
-                    self._value = saved_value
-
-            scope.declare_name(self._name, self._value_type, value=executed_value)
-        elif self._array_size is not None:
-            self._array_size = get_indices(self._array_size, scope, opt)
-
-            scope.declare_name(self._name, self._value_type, array_size=self._array_size)
+            # compiler generated temporaries take type of their initial value
+            value_type = self._value_type if self._value_type is not None else type(executed_value)
+            scope.declare_name(self._name, value_type, value=executed_value)
         else:
             scope.declare_name(self._name, self._value_type, None)
 
@@ -576,16 +908,33 @@ class Declaration(Node):
     def name(self):
         return self._name
 
+    @property
+    def value_type(self):
+        return self._value_type
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+
+    @property
+    def array_size(self):
+        return self._array_size
+
 
 class Conversion(Node):
+    __slots__ = ("_type_from", "_operation", "_value")
+    _fields = ("_value",)
+
     def __init__(self, type_from, operation, value):
+        super().__init__()
         self._type_from = type_from
         self._operation = operation
         self._value = value
 
-    def get_used_names(self):
-        return self._value.get_used_names()
-
     def execute(self, scope, opt):
         value = self._value.execute(scope, opt)
 
@@ -593,38 +942,41 @@ class Conversion(Node):
             raise ConversionError("Converted value is in incorrect type, expected {} given {}"
                                   .format(self._type_from.__name__, type(value).__name__))
 
-        if opt:
-            saved_value = scope.get_expression(self._value)
-            if saved_value is not None:
-                self._value = saved_value
-
         return self._operation(value)
 
+    @property
+    def type_from(self):
+        return self._type_from
+
+    @property
+    def operation(self):
+        return self._operation
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+
 
 class BinaryOperation(Node):
+    __slots__ = ("_left", "_operation", "_is_reversible", "_right")
+    _fields = ("_left", "_right")
+
     def __init__(self, left, operation, right):
+        super().__init__()
         self._left = left
         self._operation, self._is_reversible = operation
         self._right = right
 
-    def get_used_names(self):
-        return self._left.get_used_names() + self._right.get_used_names()
-
     def execute(self, scope, opt):
         left = self._left.execute(scope, opt)
         right = self._right.execute(scope, opt)
 
-        if scope.get_expression(self) is None:
-            scope.add_expression(self)
-
-        result = scope.get_expression_result(self)
-        if result is not None:
-            return result
-
         if type(left) == type(right):
-            result = self._operation(left, right)
-            scope.save_expression_result(self, result)
-            return result
+            return self._operation(left, right)
         else:
             raise BinaryOperationError("Types of arguments do not match! Left is {} while right is {}"
                                        .format(type(left).__name__, type(right).__name__))
@@ -633,14 +985,26 @@ class BinaryOperation(Node):
     def left(self):
         return self._left
 
+    @left.setter
+    def left(self, left):
+        self._left = left
+
     @property
     def right(self):
         return self._right
 
+    @right.setter
+    def right(self, right):
+        self._right = right
+
     @property
     def operation(self):
         return self._operation
 
+    @property
+    def is_reversible(self):
+        return self._is_reversible
+
     def __eq__(self, other):
         common_condition = isinstance(other, BinaryOperation) and self.operation == other.operation
 
@@ -657,12 +1021,12 @@ class BinaryOperation(Node):
 
 
 class Real(Node):
+    __slots__ = ("_value",)
+
     def __init__(self, value):
+        super().__init__()
         self._value = value
 
-    def get_used_names(self):
-        return []
-
     def execute(self, scope, opt):
         return self._value
 
@@ -679,12 +1043,12 @@ class Real(Node):
 
 
 class Integer(Node):
+    __slots__ = ("_value",)
+
     def __init__(self, value):
+        super().__init__()
         self._value = value
 
-    def get_used_names(self):
-        return []
-
     def execute(self, scope, opt):
         return self._value
 
@@ -701,12 +1065,12 @@ class Integer(Node):
 
 
 class Boolean(Node):
+    __slots__ = ("_value",)
+
     def __init__(self, value):
+        super().__init__()
         self._value = value
 
-    def get_used_names(self):
-        return []
-
     def execute(self, scope, opt):
         return self._value
 
@@ -720,12 +1084,12 @@ class Boolean(Node):
 
 
 class String(Node):
+    __slots__ = ("_value",)
+
     def __init__(self, value):
+        super().__init__()
         self._value = value
 
-    def get_used_names(self):
-        return []
-
     def execute(self, scope, opt):
         return self._value
 
@@ -742,30 +1106,22 @@ class String(Node):
 
 
 class Name(Node):
+    __slots__ = ("_name", "_index")
+    _fields = ("_index",)
+
     def __init__(self, name, index=None):
+        super().__init__()
         self._name = name
-        self._changes = None  # to not include name in common subexpressions after variable modification
         self._index = index
 
-    def get_used_names(self):
-        return [self._name]
-
     def execute(self, scope, opt):
-        if self._index is not None:
-            self._index = get_indices(self._index, scope, opt)
-
-        value, changes = scope.read_name(self._name, self._index)
-        self._changes = changes
-        return value
+        index = get_indices(self._index, scope, opt) if self._index is not None else None
+        return scope.read_name(self._name, index)
 
     @property
     def name(self):
         return self._name
 
-    @property
-    def changes(self):
-        return self._changes
-
     @property
     def index(self):
         return self._index
@@ -773,11 +1129,170 @@ class Name(Node):
     def __eq__(self, other):
         return isinstance(other, Name) and \
                self.name == other.name and \
-               self.changes == other.changes and \
                self.index == other._index
 
     def __hash__(self):
-        return hash((self._name, self._changes))
+        return hash(self._name)
+
+
+class TemporaryAssignment(Node):
+    """Evaluates common subexpression and saves its value for following TemporaryName nodes"""
+    __slots__ = ("_name", "_expression")
+    _fields = ("_expression",)
+
+    def __init__(self, name, expression):
+        super().__init__()
+        self._name = name
+        self._expression = expression
+
+    def execute(self, scope, opt):
+        value = self._expression.execute(scope, opt)
+        scope.set_temporary(self._name, value)
+        return value
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def expression(self):
+        return self._expression
+
+
+class TemporaryName(Node):
+    """Reads saved common subexpression, evaluates it when saving statement failed"""
+    __slots__ = ("_name", "_expression")
+    _fields = ("_expression",)
+
+    def __init__(self, name, expression):
+        super().__init__()
+        self._name = name
+        self._expression = expression
+
+    def execute(self, scope, opt):
+        value = scope.read_temporary(self._name)
+        if scope.tracer is not None:
+            scope.tracer.on_temporary(self, value is not None)
+        if value is None:
+            value = self._expression.execute(scope, opt)
+        return value
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def expression(self):
+        return self._expression
+
+
+class NameCollector(NodeVisitor):
+    """Adds names used and declared by visited nodes to given sets, declarations nested in blocks are not included"""
+
+    def analyze(self, node):
+        used, declared = set(), set()
+        if isinstance(node, Block):
+            # names declared in the block are not used by it
+            for statement in node.statement_list:
+                self.visit(statement, used, declared)
+            used -= declared
+        else:
+            self.visit(node, used, declared)
+        return used, declared
+
+    def visit_Block(self, node, used, declared):
+        block_used, block_declared = node.get_names()
+        used |= block_used
+        declared |= block_declared
+
+    def visit_FunctionArgument(self, node, used, declared):
+        used.add(node.name)
+
+    def visit_CustomFunction(self, node, used, declared):
+        used |= node.body.get_used_names()
+        if node.returned_value is not None:
+            self.visit(node.returned_value, used, declared)
+        declared.add(node.name)
+
+    def visit_RepeatUntil(self, node, used, declared):
+        used |= node.block.get_used_names()
+        self.visit(node.condition, used, declared)
+
+    def visit_For(self, node, used, declared):
+        self.visit(node.initial_assignment, used, declared)
+        self.visit(node.condition, used, declared)
+        self.visit(node.step_assignment, used, declared)
+        used |= node.block.get_used_names()
+
+    def visit_While(self, node, used, declared):
+        self.visit(node.condition, used, declared)
+        used |= node.block.get_used_names()
+
+    def visit_ConditionalIfElse(self, node, used, declared):
+        self.visit(node.condition, used, declared)
+        used |= node.block_if.get_used_names()
+        used |= node.block_else.get_used_names()
+
+    def visit_ConditionalIf(self, node, used, declared):
+        self.visit(node.condition, used, declared)
+        used |= node.statement.get_used_names()
+
+    def visit_Call(self, node, used, declared):
+        used.add(node.function_name)
+        self.visit(node.arg_list, used, declared)
+
+    def visit_PreFixExpression(self, node, used, declared):
+        used.add(node.name)
+
+    def visit_PostFixExpression(self, node, used, declared):
+        used.add(node.name)
+
+    def visit_Assignment(self, node, used, declared):
+        used.add(node.name)
+        self.visit(node.value, used, declared)
+
+    def visit_Declaration(self, node, used, declared):
+        if node.value is not None:
+            self.visit(node.value, used, declared)
+        declared.add(node.name)
+
+    def visit_Name(self, node, used, declared):
+        used.add(node.name)
+
+
+def get_concatenation(assignment):
+    """Returns parts added before and after the assigned name by its value, like a := "a" + a + "b".
+
+    None is returned when the value is not such concatenation, when it reads the name again or when
+    its parts may change names.
+    """
+    if assignment.index is not None:
+        return None
+
+    parts = get_sum_parts(assignment.value)
+    positions = [position for position, part in enumerate(parts)
+                 if isinstance(part, Name) and part.name == assignment.name and part.index is None]
+    if len(positions) != 1:
+        return None
+
+    position = positions[0]
+    other_parts = parts[:position] + parts[position + 1:]
+    if not other_parts or any(assignment.name in part.get_used_names() or changes_names(part)
+                              for part in other_parts):
+        return None
+    return parts[:position], parts[position + 1:]
+
+
+def get_sum_parts(expression):
+    if isinstance(expression, BinaryOperation) and expression.operation is operator.add:
+        return get_sum_parts(expression.left) + get_sum_parts(expression.right)
+    return [expression]
+
+
+def changes_names(expression):
+    if isinstance(expression, (Call, PreFixExpression, PostFixExpression)):
+        return True
+    return any(changes_names(child) for child in expression.children())
 
 
 def get_indices(index_list, scope, opt):
@@ -786,6 +1301,17 @@ def get_indices(index_list, scope, opt):
         executed_indices.append(element.execute(scope, opt))
 
     if any(not isinstance(element, int) for element in executed_indices):
-        raise ValueError("Array indices must be integer")
+        raise CalcValueError("Array indices must be integer")
 
     return executed_indices
+
+
+def enter_preheader(preheader, scope, opt):
+    if preheader is not None:
+        scope.start_new()
+        preheader.execute(scope, opt)
+
+
+def leave_preheader(preheader, scope):
+    if preheader is not None:
+        scope.end_current()
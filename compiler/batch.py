@@ -0,0 +1,107 @@
+import concurrent.futures
+import contextlib
+import glob
+import os
+import time
+import traceback
+
+from compiler.interpreter import Interpreter
+from compiler.names import Budget
+
+# interpreter and limits of programs of the worker process, set once by its initializer
+worker_interpreter = None
+worker_limits = (None, None)
+
+
+def find_programs(paths):
+    """Returns files given directly and .cd files of given directories"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.cd"))))
+        else:
+            files.append(path)
+    return files
+
+
+def get_result_names(files):
+    """Returns name of result file for every program, programs with the same name get numbered results"""
+    names, used = [], {}
+    for file_name in files:
+        name = os.path.splitext(os.path.basename(file_name))[0]
+        used[name] = used.get(name, 0) + 1
+        names.append(name + ".out" if used[name] == 1 else "{}_{}.out".format(name, used[name]))
+    return names
+
+
+def initialize_worker(opt, engine, steps=None, seconds=None):
+    global worker_interpreter, worker_limits
+    worker_interpreter = Interpreter(opt, engine)
+    worker_limits = (steps, seconds)
+
+
+def run_program(file_name, result_file_name):
+    """Compiles and runs program writing its output, syntax and runtime errors to the result file"""
+    start = time.perf_counter()
+    status = "ok"
+    with open(file_name, "r") as input_file:
+        code = input_file.read()
+
+    with open(result_file_name, "w") as result_file, contextlib.redirect_stdout(result_file):
+        try:
+            program = worker_interpreter.compile(code)
+            if program is None:
+                status = "syntax error"
+            else:
+                steps, seconds = worker_limits
+                budget = Budget(steps, seconds) if steps is not None or seconds is not None else None
+                program.run(outputs=result_file, budget=budget)
+                if budget is not None and budget.exceeded is not None:
+                    status = "stopped"
+        except Exception:
+            status = "crashed"
+            traceback.print_exc(file=result_file)
+
+    return {
+        "file": file_name,
+        "result": result_file_name,
+        "status": status,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+class BatchRunner:
+    """Runs many programs in a pool of processes, each of them compiles its programs with own interpreter.
+
+    Parsing tables are built before the pool is started, so forked workers begin with them ready.
+    """
+
+    def __init__(self, results_directory, jobs=None, opt=False, engine="ast", steps=None, seconds=None):
+        self._results_directory = results_directory
+        self._jobs = jobs
+        self._opt = opt
+        self._engine = engine
+        self._steps = steps
+        self._seconds = seconds
+
+    def run(self, files):
+        """Returns summaries of runs in order of given files and wall time of the whole batch"""
+        Interpreter(self._opt, self._engine)
+        os.makedirs(self._results_directory, exist_ok=True)
+        result_files = [os.path.join(self._results_directory, name) for name in get_result_names(files)]
+
+        worker_arguments = (self._opt, self._engine, self._steps, self._seconds)
+        start = time.perf_counter()
+        with concurrent.futures.ProcessPoolExecutor(self._jobs, initializer=initialize_worker,
+                                                    initargs=worker_arguments) as executor:
+            summaries = list(executor.map(run_program, files, result_files))
+        return summaries, time.perf_counter() - start
+
+
+def format_summary(summaries, seconds):
+    failed = [summary for summary in summaries if summary["status"] != "ok"]
+    lines = ["{}: {} ({:.3f} s)".format(summary["file"], summary["status"], summary["seconds"])
+             for summary in failed]
+    lines.append("Ran {} programs in {:.3f} s, {:.1f} programs per second, {} failed".format(
+        len(summaries), seconds, len(summaries) / seconds if seconds > 0 else 0.0, len(failed)))
+    return "\n".join(lines)
@@ -0,0 +1,155 @@
+"""Registry of built-in functions of the language.
+
+Every built-in declares its name, number and types of arguments, type of result, whether it is pure and
+its variant applied to whole arrays. Lexer recognizes registered names, parser checks number of arguments
+of their calls, simplifier folds calls of pure ones with constant arguments, optimizers share their
+results and IR derives types of their results, so a new function is added by registering it, without
+changes of the grammar. Functions have to be registered before the first lexer is built.
+"""
+
+import math
+import re
+
+from compiler.errors import CalcValueError
+
+NUMBERS = (int, float, bool)
+
+
+def bessel_j(x, order):
+    """Bessel function of the first kind J_order(x), called as j(x, order) by programs.
+
+    Argument is given before order, unlike scipy.special.jv(order, x), both may be arrays.
+    """
+    from scipy.special import jv  # imported on first call, it takes most of the startup time
+    return jv(order, x)
+
+
+def numpy_function(name):
+    """Returns function applying numpy ufunc of given name to every element of given arrays.
+
+    Invalid arguments, division by zero and overflow raise errors, like math functions do for scalars.
+    """
+    def apply(*arguments):
+        import numpy as np
+        try:
+            with np.errstate(invalid="raise", divide="raise", over="raise"):
+                return getattr(np, name)(*arguments)
+        except FloatingPointError as err:
+            raise CalcValueError("{} in {}".format(err, name))
+
+    apply.__name__ = name
+    return apply
+
+
+class BuiltIn:
+    """Built-in function, each of its arguments has one of argument_types.
+
+    Result type None means that type of the result is not known, calls of such functions are not folded.
+    Pure functions have no effects besides giving their result, which depends only on their arguments.
+    Vectorized variant is called instead of the function when some argument is an array.
+    """
+
+    def __init__(self, name, function, arity=1, argument_types=NUMBERS, result_type=float, pure=True,
+                 vectorized=None):
+        self._name = name
+        self._function = function
+        self._arity = arity
+        self._argument_types = argument_types
+        self._result_type = result_type
+        self._pure = pure
+        self._vectorized = vectorized
+
+    def __repr__(self):
+        return "BuiltIn({!r})".format(self._name)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        # calls in copied trees refer to the same registered function
+        return self
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def function(self):
+        return self._function
+
+    @property
+    def arity(self):
+        return self._arity
+
+    @property
+    def argument_types(self):
+        return self._argument_types
+
+    @property
+    def result_type(self):
+        return self._result_type
+
+    @property
+    def pure(self):
+        return self._pure
+
+    @property
+    def vectorized(self):
+        return self._vectorized
+
+    def get_result_type(self, argument_types):
+        """Returns type of result of call with arguments of given types, None when it is not known"""
+        if len(argument_types) != self._arity or \
+                any(argument_type not in self._argument_types for argument_type in argument_types):
+            return None
+        return self._result_type
+
+
+class BuiltInRegistry:
+    """Built-in functions by their names, names are case insensitive like the rest of the language"""
+
+    def __init__(self):
+        self._built_ins = {}
+
+    def __contains__(self, name):
+        return name.lower() in self._built_ins
+
+    def __iter__(self):
+        return iter(self._built_ins.values())
+
+    def register(self, built_in):
+        name = built_in.name.lower()
+        if name in self._built_ins:
+            raise ValueError("Built-in function {} is already registered".format(name))
+        self._built_ins[name] = built_in
+        return built_in
+
+    def get(self, name):
+        return self._built_ins.get(name.lower())
+
+    def get_token_pattern(self):
+        """Returns regular expression of FUNCTION token, matching name in any case followed by arguments"""
+        # longer names first, so a name is not matched by its prefix followed by digits
+        names = sorted(self._built_ins, key=len, reverse=True)
+        return r"""(?i:{}) (?=\d+|\(.*\))""".format("|".join(re.escape(name) for name in names))
+
+
+built_ins = BuiltInRegistry()
+
+
+def register(name, function, arity=1, argument_types=NUMBERS, result_type=float, pure=True, vectorized=None):
+    """Registers built-in function in the registry used by the compiler"""
+    return built_ins.register(BuiltIn(name, function, arity, argument_types, result_type, pure, vectorized))
+
+
+register("sin", math.sin, vectorized=numpy_function("sin"))
+register("asin", math.asin, vectorized=numpy_function("arcsin"))
+register("cos", math.cos, vectorized=numpy_function("cos"))
+register("acos", math.acos, vectorized=numpy_function("arccos"))
+register("tan", math.tan, vectorized=numpy_function("tan"))
+register("atan", math.atan, vectorized=numpy_function("arctan"))
+register("exp", math.exp, vectorized=numpy_function("exp"))
+register("log", math.log, vectorized=numpy_function("log"))
+register("sqrt", math.sqrt, vectorized=numpy_function("sqrt"))
+# results of scipy are numpy scalars, their type is not one of the language
+register("j", bessel_j, arity=2, result_type=None, vectorized=bessel_j)
@@ -0,0 +1,81 @@
+"""Thin client of the interpreter server, sends lines of code and prints their output.
+
+It imports no part of the compiler, so it starts as fast as Python itself.
+
+    python -m compiler.client socket_path [file_name]
+"""
+
+import socket
+import sys
+
+# line closing output of every snippet sent by the server, it cannot be printed by programs
+END_OF_RESPONSE = "\x04"
+EXIT_COMMAND = "exit"
+
+
+class Client:
+    def __init__(self, socket_path):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(socket_path)
+        self._reader = self._socket.makefile("r", encoding="utf-8", newline="\n")
+        self._writer = self._socket.makefile("w", encoding="utf-8", newline="\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def send(self, line):
+        """Runs line of code in the session of this client and returns lines of its output"""
+        self._writer.write(line.replace("\n", " ") + "\n")
+        self._writer.flush()
+        output = []
+        for received in self._reader:
+            received = received.rstrip("\n")
+            if received == END_OF_RESPONSE:
+                return output
+            output.append(received)
+        raise ConnectionError("Server closed the connection")
+
+    def close(self):
+        try:
+            self._socket.sendall((EXIT_COMMAND + "\n").encode("utf-8"))
+        except OSError:
+            pass
+        self._reader.close()
+        self._writer.close()
+        self._socket.close()
+
+
+def main():
+    if len(sys.argv) not in (2, 3):
+        sys.exit("Usage: python -m compiler.client socket_path [file_name]")
+
+    input_file = open(sys.argv[2], "r") if len(sys.argv) == 3 else sys.stdin
+    interactive = input_file.isatty()
+    with Client(sys.argv[1]) as client:
+        while True:
+            if interactive:
+                try:
+                    line = input("calc > ")
+                except (EOFError, KeyboardInterrupt):
+                    break
+            else:
+                line = input_file.readline()
+                if not line:
+                    break
+            if line.strip().lower() == EXIT_COMMAND:
+                break
+            try:
+                output = client.send(line)
+            except ConnectionError:
+                sys.exit("Connection to the server was closed")
+            for output_line in output:
+                print(output_line)
+    if input_file is not sys.stdin:
+        input_file.close()
+
+
+if __name__ == '__main__':
+    main()
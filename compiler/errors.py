@@ -1,18 +1,91 @@
-class BinaryOperationError(Exception):
-    pass
+class CalcRuntimeError(Exception):
+    """Error of executed program, reported to the user with position of the statement which raised it"""
+    description = "Runtime error"
 
+    def __init__(self, message, position=None):
+        super().__init__(message)
+        self.position = position
 
-class ConditionError(Exception):
-    pass
+    @property
+    def message(self):
+        return self.args[0]
 
+    def describe(self):
+        message = self.message
+        if self.position is not None:
+            message = "{} (line {}, column {})".format(message, *self.position)
+        return "{}: {}".format(self.description, message)
 
-class ConversionError(Exception):
-    pass
 
+class BinaryOperationError(CalcRuntimeError):
+    description = "Error with binary operation"
 
-class AssignmentError(Exception):
-    pass
 
+class ConditionError(CalcRuntimeError):
+    description = "Error with given condition"
 
-class ExpressionResultSavingError(Exception):
-    pass
+
+class ConversionError(CalcRuntimeError):
+    description = "Error with conversion"
+
+
+class AssignmentError(CalcRuntimeError):
+    description = "Error with assignment"
+
+
+class CalcValueError(CalcRuntimeError, ValueError):
+    description = "Value Error"
+
+
+class CalcIndexError(CalcRuntimeError, IndexError):
+    description = "Index error when using array type"
+
+
+class BudgetExceeded(CalcRuntimeError):
+    """Raised when execution runs out of its budget or is cancelled, it stops the whole program.
+
+    Kind of the exceeded limit is "steps", "time" or "cancelled", limit is its configured value.
+    """
+    description = "Execution stopped"
+    messages = {
+        "steps": "Step budget of {} exhausted",
+        "time": "Time budget of {} s exhausted",
+        "cancelled": "Execution cancelled",
+    }
+
+    def __init__(self, kind, limit=None, position=None):
+        super().__init__(self.messages[kind].format(limit), position)
+        self.kind = kind
+        self.limit = limit
+
+
+# errors of Python functions called by the program are reported like errors of the program
+HANDLED_ERRORS = (CalcRuntimeError, ValueError, IndexError)
+
+
+def runtime_error(err, position=None):
+    """Returns handled error as CalcRuntimeError, placed at given position unless it already has one"""
+    if not isinstance(err, CalcRuntimeError):
+        error_type = CalcIndexError if isinstance(err, IndexError) else CalcValueError
+        err = error_type(err.args[0] if len(err.args) == 1 else str(err))
+    if err.position is None:
+        err.position = position
+    return err
+
+
+def print_error(err):
+    print(runtime_error(err).describe())
+
+
+class ErrorCollector:
+    """Error handler keeping reported errors instead of printing them"""
+
+    def __init__(self):
+        self._errors = []
+
+    def __call__(self, err):
+        self._errors.append(runtime_error(err))
+
+    @property
+    def errors(self):
+        return self._errors
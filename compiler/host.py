@@ -0,0 +1,96 @@
+import asyncio
+import concurrent.futures
+import io
+import os
+import stat
+
+from compiler.client import END_OF_RESPONSE, EXIT_COMMAND
+from compiler.interpreter import Interpreter
+from compiler.names import Budget, Scope
+
+
+class Session:
+    """Console session of a single client with own interpreter, names and budget of every line"""
+
+    def __init__(self, opt, engine, budget):
+        self._output = io.StringIO()
+        self._interpreter = Interpreter(opt, engine, self._output)
+        self._budget = budget
+        self._scope = Scope(output=self._output, budget=budget)
+
+    @property
+    def budget(self):
+        return self._budget
+
+    def run(self, line):
+        """Runs line like the interactive console and returns its output and errors"""
+        self._budget.start()
+        program = self._interpreter.compile(line, repl_mode=True)
+        if program is not None:
+            program.run(session=self._scope)
+
+        output = self._output.getvalue()
+        self._output.seek(0)
+        self._output.truncate()
+        return output
+
+
+class SessionHost:
+    """Serves console sessions of many clients from a single asyncio event loop.
+
+    Lines of all sessions are executed by a bounded pool of threads, so a long running line blocks
+    neither the loop nor other sessions, while every line is limited by the step and time budget.
+    Lines still running when the host stops are cancelled. Clients use the line protocol of the
+    interpreter server.
+    """
+
+    def __init__(self, opt=False, engine="ast", workers=4, steps=None, seconds=None):
+        self._opt = opt
+        self._engine = engine
+        self._steps = steps
+        self._seconds = seconds
+        self._executor = concurrent.futures.ThreadPoolExecutor(workers)
+        Interpreter(opt, engine)
+
+    async def handle_client(self, reader, writer):
+        session = Session(self._opt, self._engine, Budget(self._steps, self._seconds))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.decode("utf-8").strip()
+                if line.lower() == EXIT_COMMAND:
+                    break
+
+                output = await self.run(session, line) if line else ""
+                writer.write((output + END_OF_RESPONSE + "\n").encode("utf-8"))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def run(self, session, line):
+        future = asyncio.get_running_loop().run_in_executor(self._executor, session.run, line)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # executing thread cannot be stopped, the line stops itself at its next step
+            session.budget.cancel()
+            await asyncio.wait([future])
+            raise
+
+    async def serve(self, socket_path):
+        if os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+            os.unlink(socket_path)
+        server = await asyncio.start_unix_server(self.handle_client, socket_path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+    def close(self):
+        self._executor.shutdown()
@@ -0,0 +1,121 @@
+import threading
+
+from compiler import ir_engine, optimizer
+from compiler.lexer import Lexer
+from compiler.names import Scope
+from compiler.parser import Parser
+
+
+class CompiledProgram:
+    """Parsed program ready to be run any number of times, each run in a new or given session"""
+
+    def __init__(self, program, compiled, opt):
+        self._program = program
+        self._compiled = compiled
+        self._opt = opt
+
+    @property
+    def program(self):
+        return self._program
+
+    @property
+    def compiled(self):
+        """Program compiled through IR, None when it is executed as AST"""
+        return self._compiled
+
+    def run(self, inputs=None, outputs=None, error_handler=None, session=None, budget=None, tracer=None):
+        """Executes program and returns scope with its names.
+
+        Inputs are declared as variables before execution, output is written to given file object and
+        errors are passed to the handler, both printed to standard output by default. Given session
+        keeps names of previous runs. Execution of a new session is limited by given budget, started
+        by this call, and its events are passed to given tracer. Program compiled through IR runs only
+        in new sessions without inputs, budget and tracer, otherwise its AST is executed without
+        optimizations.
+        """
+        if session is None:
+            session = Scope(error_handler, outputs, budget, tracer)
+            if budget is not None:
+                budget.start()
+            elif self._compiled is not None and not inputs and tracer is None:
+                self._compiled.run(session.report_error, session.output)
+                return session
+
+        for name, value in (inputs or {}).items():
+            session.declare_name(name, type(value), value)
+        self._program.execute(session, self._opt)
+        return session
+
+
+class Interpreter:
+    """Compiles programs with own lexer and parser, sharing rules and parsing tables of all interpreters.
+
+    Syntax errors are written to given file object, standard output by default.
+    """
+    _front_end = None
+    _front_end_lock = threading.Lock()
+
+    def __init__(self, opt=False, engine="ast", output=None):
+        self._opt = opt
+        self._engine = engine
+        lexer, parser = self.__get_front_end()
+        self._lexer = lexer.clone()
+        self._lexer.output = output
+        self._parser = parser.clone()
+        self._parser.output = output
+
+    @classmethod
+    def __get_front_end(cls):
+        with cls._front_end_lock:
+            if cls._front_end is None:
+                lexer = Lexer()
+                lexer.build()
+                parser = Parser(lexer.tokens)
+                parser.build()
+                cls._front_end = lexer, parser
+            return cls._front_end
+
+    @property
+    def opt(self):
+        return self._opt
+
+    @property
+    def engine(self):
+        return self._engine
+
+    def tokens(self, source):
+        lexer = self._lexer.lexer
+        lexer.input(source)
+        token = lexer.token()
+        while token:
+            yield token
+            token = lexer.token()
+
+    def parse(self, source):
+        return self._parser.parse(self._lexer, source)
+
+    def parse_stream(self, chunks):
+        return self._parser.parse_stream(self._lexer, chunks)
+
+    def compile(self, source, repl_mode=False):
+        """Returns compiled program, None when source has syntax errors.
+
+        In REPL mode source is a line of the console, its last statement may be given without semicolon
+        and values of expression statements are printed.
+        """
+        if repl_mode and source[-1] != ";":
+            source += ";"
+
+        program = self.parse(source)
+        if program is None:
+            return None
+
+        compiled = None
+        if repl_mode:
+            program.activate_repl_mode()
+        elif self._engine == "ir":
+            compiled = ir_engine.compile_program(program, self._opt)
+
+        if compiled is None and self._opt:
+            optimizer.optimize(program, keep_names=repl_mode)
+        return CompiledProgram(program, compiled, self._opt)
@@ -0,0 +1,903 @@
+import itertools
+import operator
+
+from compiler import ast
+from compiler.built_ins import BuiltIn
+from compiler.errors import CalcValueError
+from compiler.visitor import NodeVisitor
+
+
+class UnsupportedConstructError(Exception):
+    pass
+
+
+OPERATION_SYMBOLS = {
+    operator.add: "+",
+    operator.sub: "-",
+    operator.mul: "*",
+    operator.truediv: "/",
+    operator.mod: "%",
+    operator.pow: "**",
+    operator.eq: "==",
+    operator.ne: "!=",
+    operator.lt: "<",
+    operator.le: "<=",
+    operator.gt: ">",
+    operator.ge: ">=",
+    operator.and_: "&",
+    operator.or_: "|",
+    operator.xor: "^"
+}
+
+COMMUTATIVE_SYMBOLS = {"+", "*", "==", "!=", "&", "|", "^"}
+
+DEFAULT_VALUES = {
+    int: 0,
+    float: 0.0,
+    bool: False,
+    str: ""
+}
+
+# samples used to infer result types of operations on statically known types
+TYPE_SAMPLES = {
+    int: 3,
+    float: 3.0,
+    bool: True,
+    str: "a"
+}
+
+TERMINATORS = {"jump", "branch", "return"}
+SIDE_EFFECT_OPCODES = {"print", "call", "store_global", "fail"}
+
+
+class Instruction:
+    def __init__(self, opcode, operands=(), attribute=None, value_type=None, may_raise=False):
+        self.opcode = opcode
+        self.operands = list(operands)
+        self.attribute = attribute
+        self.type = value_type
+        self.may_raise = may_raise
+        self.block = None
+        self.id = None
+        # globals to store when top level instruction raises, and block to continue with
+        self.state = None
+        self.resume = None
+        # source position of the innermost statement, given to errors raised by instruction
+        self.position = None
+        # set when phi turns out to be trivial during construction
+        self.forward = None
+
+    @property
+    def name(self):
+        return "v{}".format(self.id)
+
+    def has_side_effects(self):
+        return self.may_raise or self.opcode in SIDE_EFFECT_OPCODES or self.opcode in TERMINATORS
+
+    def has_result(self):
+        """True when instruction gives a value, calls of procedures in the program give none"""
+        if self.opcode == "call":
+            return self.type is not type(None)
+        return self.opcode not in TERMINATORS and self.opcode not in SIDE_EFFECT_OPCODES
+
+    def can_speculate(self):
+        """True when instruction can be executed even if original program would skip it"""
+        if self.may_raise or self.opcode in ("phi", "param", "load_global"):
+            return False
+
+        if self.opcode == "const":
+            return True
+
+        operand_types = [operand.type for operand in self.operands]
+        if any(operand_type not in TYPE_SAMPLES for operand_type in operand_types):
+            return False
+
+        if self.opcode in ("minus", "increment"):
+            return operand_types[0] is not str
+        if self.opcode in ("convert", "cast"):
+            target = self.type
+            return target in (str, bool) or (target is float and operand_types[0] in (int, bool))
+        if self.opcode == "binop":
+            left_type, right_type = operand_types
+            if left_type != right_type:
+                return False
+            symbol = self.attribute
+            if symbol in ("==", "!=", "<", "<=", ">", ">="):
+                return True
+            if left_type is str:
+                return symbol == "+"
+            if symbol in ("+", "-", "*"):
+                return True
+            if symbol in ("&", "|", "^"):
+                return left_type is not float
+            if symbol in ("/", "%"):
+                divisor = self.operands[1]
+                return divisor.opcode == "const" and divisor.attribute != 0
+        return False
+
+    def __str__(self):
+        operands = ", ".join(operand.name for operand in self.operands)
+        attribute = "" if self.attribute is None else " {}".format(format_attribute(self.attribute))
+        text = "{}{}".format(self.opcode, attribute)
+        if operands:
+            text += " " + operands
+        if self.has_result():
+            text = "{} = {}".format(self.name, text)
+            if self.type is not None:
+                text += " : {}".format(self.type.__name__)
+        if self.resume is not None:
+            state = ", ".join("{}={}".format(name, value.name) for name, value in self.state)
+            text += " ! b{} [{}]".format(self.resume.index, state)
+        return text
+
+
+def format_attribute(attribute):
+    if isinstance(attribute, type):
+        return attribute.__name__
+    if isinstance(attribute, tuple):
+        return "(" + ", ".join(format_attribute(element) for element in attribute) + ")"
+    if isinstance(attribute, BaseException):
+        return "{}({!r})".format(type(attribute).__name__, attribute.args[0])
+    if callable(attribute):
+        return attribute.__name__
+    if isinstance(attribute, BuiltIn):
+        return attribute.name
+    if isinstance(attribute, Variable):
+        return attribute.name
+    return repr(attribute)
+
+
+class BasicBlock:
+    def __init__(self, index):
+        self.index = index
+        self.phis = []
+        self.instructions = []
+        self.terminator = None
+        self.predecessors = []
+        self.successors = []
+        # blocks containing top level instructions which continue here after an error
+        self.exception_sources = []
+        self.sealed = False
+        self.definitions = {}
+        self.entry_values = {}
+        self.incomplete_phis = {}
+
+    def all_instructions(self):
+        result = self.phis + self.instructions
+        if self.terminator is not None:
+            result.append(self.terminator)
+        return result
+
+    def __str__(self):
+        lines = ["  b{}:  ; preds: {}".format(self.index, ", ".join("b{}".format(block.index)
+                                                                    for block in self.predecessors))]
+        for instruction in self.phis + self.instructions:
+            lines.append("    " + str(instruction))
+        if self.terminator is not None:
+            targets = ", ".join("b{}".format(block.index) for block in self.successors)
+            lines.append("    {} {}".format(self.terminator, targets).rstrip())
+        return "\n".join(lines)
+
+
+class Loop:
+    def __init__(self, preheader, header):
+        self.preheader = preheader
+        self.header = header
+        self.blocks = set()
+
+
+class Function:
+    def __init__(self, name, parameters):
+        self.name = name
+        self.parameters = parameters
+        self.blocks = []
+        self.entry = None
+        self.loops = []
+        self.return_type = None
+        self.may_raise = False
+        self.callees = set()
+        self._ids = itertools.count()
+        self._block_indices = itertools.count()
+
+    def new_block(self):
+        block = BasicBlock(next(self._block_indices))
+        self.blocks.append(block)
+        return block
+
+    def number(self, instruction):
+        instruction.id = next(self._ids)
+
+    def instructions(self):
+        for block in self.blocks:
+            yield from block.all_instructions()
+
+    def __str__(self):
+        parameters = ", ".join("{}: {}".format(name, value_type.__name__) for name, value_type in self.parameters)
+        lines = ["function {}({}):".format(self.name, parameters)]
+        lines += [str(block) for block in self.blocks]
+        return "\n".join(lines)
+
+
+class Module:
+    def __init__(self):
+        self.functions = {}
+        self.program = None
+
+    def all_functions(self):
+        return list(self.functions.values()) + [self.program]
+
+    def __str__(self):
+        return "\n\n".join(str(function) for function in self.all_functions()) + "\n"
+
+
+class Variable:
+    def __init__(self, name, value_type, is_global, serial):
+        self.name = name
+        self.type = value_type
+        self.is_global = is_global
+        self.serial = serial
+        self.possibly_undeclared = False
+
+
+class Region:
+    """Code generated for single top level statement"""
+    def __init__(self):
+        self.writes = []
+        self.declared = []
+        self.raising = []
+
+
+def resolve(value):
+    while value.forward is not None:
+        value = value.forward
+    return value
+
+
+def static_result_type(function, *operand_types):
+    if any(operand_type not in TYPE_SAMPLES for operand_type in operand_types):
+        return None
+    try:
+        return type(function(*(TYPE_SAMPLES[operand_type] for operand_type in operand_types)))
+    except Exception:
+        return None
+
+
+class IRBuilder(NodeVisitor):
+    """Translates AST into SSA form, variables are resolved on the fly as in Braun et al."""
+    def __init__(self):
+        self._module = Module()
+        self._function = None
+        self._block = None
+        self._scopes = []
+        self._open_loops = []
+        self._region = None
+        self._position = None
+        self._declared_functions = {}
+        self._statement_index = 0
+        self._variable_serials = itertools.count()
+        self._undefined = None
+
+    def build(self, program):
+        statements = program.statement_list
+
+        for index, statement in enumerate(statements):
+            if isinstance(statement, ast.CustomFunction) and statement.name not in self._declared_functions:
+                self._declared_functions[statement.name] = (index, statement)
+
+        for name, (_, declaration) in self._declared_functions.items():
+            self._module.functions[name] = Function(name, get_parameters(declaration))
+        for name, (_, declaration) in self._declared_functions.items():
+            self.__build_function(self._module.functions[name], declaration)
+        self.__compute_raising_functions()
+
+        program_function = Function("$program", [])
+        self._module.program = program_function
+        self.__start_function(program_function)
+        # errors leave blocks in the middle, so entry block is kept free of instructions which may raise
+        first_block = self.new_block()
+        self.jump(first_block)
+        self.seal(first_block)
+        self.set_block(first_block)
+        for index, statement in enumerate(statements):
+            self._statement_index = index
+            self._region = Region()
+            self._position = statement.position
+            self.visit(statement)
+            self.__close_region()
+        self._region = None
+        self._position = None
+        self.emit_terminator("return")
+        self.__finish_function()
+
+        return self._module
+
+    @property
+    def in_program(self):
+        return self._function is self._module.program
+
+    @property
+    def at_top_level(self):
+        return self.in_program and len(self._scopes) == 1
+
+    def __start_function(self, function):
+        self._function = function
+        self._scopes = [{}]
+        function.entry = self.new_block()
+        self.seal(function.entry)
+        self.set_block(function.entry)
+        self._undefined = None
+
+    def __finish_function(self):
+        function = self._function
+        changed = True
+        while changed:
+            changed = False
+            for block in function.blocks:
+                for phi in list(block.phis):
+                    operands = set(resolve(operand) for operand in phi.operands) - {phi}
+                    if len(operands) == 1:
+                        phi.forward = operands.pop()
+                        block.phis.remove(phi)
+                        changed = True
+            for instruction in function.instructions():
+                instruction.operands = [resolve(operand) for operand in instruction.operands]
+                if instruction.state is not None:
+                    instruction.state = [(name, resolve(value)) for name, value in instruction.state]
+
+        for block in function.blocks:
+            block.definitions = block.entry_values = block.incomplete_phis = None
+
+    def __build_function(self, function, declaration):
+        self.__start_function(function)
+        for index, (name, value_type) in enumerate(function.parameters):
+            value = self.emit("param", attribute=index, value_type=value_type)
+            self.declare_variable(name, value_type, value)
+
+        self.visit(declaration.body)
+        returned_value = None
+        if declaration.returned_value is not None:
+            returned_value = self.visit(declaration.returned_value)
+            function.return_type = returned_value.type
+        else:
+            function.return_type = type(None)
+
+        self.emit_terminator("return", [] if returned_value is None else [returned_value])
+        self.__finish_function()
+
+    def __compute_raising_functions(self):
+        functions = self._module.functions
+        for function in functions.values():
+            function.may_raise = any(instruction.may_raise and instruction.opcode != "call"
+                                     for instruction in function.instructions())
+
+        changed = True
+        while changed:
+            changed = False
+            for function in functions.values():
+                if not function.may_raise and any(functions[callee].may_raise for callee in function.callees):
+                    function.may_raise = True
+                    changed = True
+
+        for function in functions.values():
+            for instruction in function.instructions():
+                if instruction.opcode == "call":
+                    instruction.may_raise = functions[instruction.attribute].may_raise
+
+    def __close_region(self):
+        region = self._region
+        if not region.raising:
+            return
+
+        for variable in region.writes:
+            self.emit("store_global", [self.read_variable(variable)], attribute=variable.name)
+
+        resume = self.new_block()
+        self.jump(resume)
+        self.seal(resume)
+
+        for instruction, definitions, block, serial in region.raising:
+            instruction.resume = resume
+            if block not in resume.exception_sources:
+                resume.exception_sources.append(block)
+            instruction.state = [(variable.name, definitions[variable] if variable in definitions
+                                  else self.entry_value(variable, block))
+                                 for variable in region.writes if variable.serial < serial]
+
+        for variable in region.declared:
+            variable.possibly_undeclared = True
+
+        self.set_block(resume)
+        for variable in region.writes:
+            value = self.emit("load_global", attribute=(variable.name, variable.possibly_undeclared),
+                              value_type=variable.type)
+            self.write_variable(variable, value)
+
+    # blocks and instructions
+    def new_block(self):
+        block = self._function.new_block()
+        for loop in self._open_loops:
+            loop.blocks.add(block)
+        return block
+
+    def set_block(self, block):
+        self._block = block
+
+    @property
+    def block(self):
+        return self._block
+
+    def emit(self, opcode, operands=(), attribute=None, value_type=None, may_raise=False):
+        instruction = Instruction(opcode, operands, attribute, value_type, may_raise)
+        self._function.number(instruction)
+        instruction.block = self._block
+        self._block.instructions.append(instruction)
+
+        if may_raise:
+            instruction.position = self._position
+        if may_raise and self._region is not None and self.in_program:
+            self._region.raising.append((instruction, dict(self._block.definitions), self._block,
+                                         next(self._variable_serials)))
+        return instruction
+
+    def emit_terminator(self, opcode, operands=(), attribute=None):
+        instruction = Instruction(opcode, operands, attribute)
+        self._function.number(instruction)
+        instruction.block = self._block
+        self._block.terminator = instruction
+        return instruction
+
+    def add_edge(self, source, target):
+        source.successors.append(target)
+        target.predecessors.append(source)
+
+    def jump(self, target):
+        self.emit_terminator("jump")
+        self.add_edge(self._block, target)
+
+    def branch(self, condition, if_true, if_false):
+        self.emit_terminator("branch", [condition])
+        self.add_edge(self._block, if_true)
+        self.add_edge(self._block, if_false)
+
+    def seal(self, block):
+        for variable, phi in block.incomplete_phis.items():
+            self.__add_phi_operands(variable, phi)
+        block.incomplete_phis = {}
+        block.sealed = True
+
+    def constant(self, value):
+        return self.emit("const", attribute=value, value_type=type(value))
+
+    def undefined(self):
+        if self._undefined is None:
+            entry = self._function.entry
+            self._undefined = Instruction("const", value_type=type(None))
+            self._function.number(self._undefined)
+            self._undefined.block = entry
+            entry.instructions.insert(0, self._undefined)
+        return self._undefined
+
+    def fail(self, error):
+        self.emit("fail", attribute=error, may_raise=True)
+        return self.undefined()
+
+    # SSA construction
+    def write_variable(self, variable, value, block=None):
+        block = block if block is not None else self._block
+        block.definitions[variable] = value
+        if variable.is_global and self._region is not None and variable not in self._region.writes:
+            self._region.writes.append(variable)
+
+    def read_variable(self, variable, block=None):
+        block = block if block is not None else self._block
+        value = block.definitions.get(variable)
+        if value is not None:
+            return resolve(value)
+        return self.entry_value(variable, block)
+
+    def entry_value(self, variable, block):
+        value = block.entry_values.get(variable)
+        if value is not None:
+            return resolve(value)
+
+        if not block.sealed:
+            value = self.__new_phi(block, variable)
+            block.incomplete_phis[variable] = value
+        elif len(block.predecessors) == 1:
+            value = self.read_variable(variable, block.predecessors[0])
+        elif not block.predecessors:
+            value = self.undefined()
+        else:
+            phi = self.__new_phi(block, variable)
+            block.entry_values[variable] = phi
+            value = self.__add_phi_operands(variable, phi)
+
+        block.entry_values[variable] = value
+        return value
+
+    def __new_phi(self, block, variable):
+        phi = Instruction("phi", attribute=variable.name, value_type=variable.type)
+        self._function.number(phi)
+        phi.block = block
+        block.phis.append(phi)
+        return phi
+
+    def __add_phi_operands(self, variable, phi):
+        for predecessor in phi.block.predecessors:
+            phi.operands.append(self.read_variable(variable, predecessor))
+        return self.__remove_trivial_phi(phi)
+
+    @staticmethod
+    def __remove_trivial_phi(phi):
+        same = None
+        for operand in phi.operands:
+            operand = resolve(operand)
+            if operand is same or operand is phi:
+                continue
+            if same is not None:
+                return phi
+            same = operand
+
+        if same is None:
+            return phi
+        phi.forward = same
+        phi.block.phis.remove(phi)
+        return same
+
+    # names
+    def push_scope(self):
+        self._scopes.append({})
+
+    def pop_scope(self):
+        self._scopes.pop()
+
+    def lookup(self, name):
+        for scope in reversed(self._scopes):
+            if name in scope:
+                return scope[name]
+
+        if not self.in_program:
+            raise UnsupportedConstructError("Function uses name {} from enclosing scope".format(name))
+        return None
+
+    def declare_variable(self, name, value_type, value):
+        scope = self._scopes[-1]
+        if name in scope:
+            if scope[name].possibly_undeclared:
+                raise UnsupportedConstructError("Redeclaration of {} may succeed".format(name))
+            self.fail(CalcValueError("Variable is already declared!"))
+            return
+
+        if value is None:
+            value = self.constant(DEFAULT_VALUES[value_type])
+        elif value_type is None:
+            value_type = value.type
+        else:
+            value = self.check_type(value, name, value_type)
+
+        variable = Variable(name, value_type, self.at_top_level, next(self._variable_serials))
+        scope[name] = variable
+        self.write_variable(variable, value)
+        if variable.is_global:
+            self._region.declared.append(variable)
+
+    def read_name(self, name):
+        variable = self.lookup(name)
+        if variable is None:
+            return None, self.fail(CalcValueError("Name {} not declared in any scope".format(name)))
+
+        value = self.read_variable(variable)
+        if variable.possibly_undeclared:
+            value = self.emit("check_declared", [value], attribute=name, value_type=variable.type, may_raise=True)
+        return variable, value
+
+    def assign_name(self, name, value):
+        variable, _ = self.read_name(name)
+        if variable is None:
+            return
+
+        if variable.type is not None:
+            value = self.check_type(value, name, variable.type)
+        self.write_variable(variable, value)
+
+    def check_type(self, value, name, expected_type):
+        if value.type is expected_type:
+            return value
+        return self.emit("check_type", [value], attribute=(name, expected_type), value_type=expected_type,
+                         may_raise=True)
+
+    def check_condition(self, value, message):
+        if value.type is bool:
+            return value
+        return self.emit("check_bool", [value], attribute=message, value_type=bool, may_raise=True)
+
+    def is_first_declaration(self, name):
+        index, _ = self._declared_functions[name]
+        return index == self._statement_index
+
+    def resolve_function(self, name):
+        if name not in self._declared_functions:
+            return None
+
+        if self.in_program:
+            index, _ = self._declared_functions[name]
+            if index >= self._statement_index:
+                return None
+            for callee in self.__reachable_functions(name):
+                if self._declared_functions[callee][0] >= self._statement_index:
+                    raise UnsupportedConstructError("Function {} may be called before declaration".format(callee))
+        else:
+            self._function.callees.add(name)
+        return self._module.functions[name]
+
+    def __reachable_functions(self, name):
+        visited = {name}
+        stack = [name]
+        while stack:
+            for callee in self._module.functions[stack.pop()].callees:
+                if callee not in visited:
+                    visited.add(callee)
+                    stack.append(callee)
+        return visited
+
+    # loops
+    def open_loop(self, preheader, header):
+        loop = Loop(preheader, header)
+        loop.blocks.add(header)
+        self._open_loops.append(loop)
+        return loop
+
+    def close_loop(self, loop):
+        self._open_loops.remove(loop)
+        self._function.loops.append(loop)
+
+    def build_loop(self, preheader_statements, body, condition_builder, exit_when):
+        """Builds loop entered from current block, condition_builder emits condition at end of iteration"""
+        preheader = self.new_block()
+        self.jump(preheader)
+        self.seal(preheader)
+        self.set_block(preheader)
+
+        if preheader_statements is not None:
+            self.push_scope()
+            self.visit(preheader_statements)
+
+        header = self.new_block()
+        self.jump(header)
+        loop = self.open_loop(preheader, header)
+        self.set_block(header)
+
+        self.push_scope()
+        self.visit(body)
+        self.pop_scope()
+        condition = condition_builder()
+
+        self.close_loop(loop)
+        exit_block = self.new_block()
+        if exit_when:
+            self.branch(condition, exit_block, header)
+        else:
+            self.branch(condition, header, exit_block)
+        self.seal(header)
+        self.seal(exit_block)
+
+        if preheader_statements is not None:
+            self.pop_scope()
+        return exit_block
+
+    def build_conditional_blocks(self, condition, blocks):
+        """Builds if or if-else, blocks without statements are given as None"""
+        join = self.new_block()
+        targets = []
+        for block in blocks:
+            if block is None:
+                targets.append(join)
+            else:
+                target = self.new_block()
+                targets.append(target)
+        self.branch(condition, *targets)
+
+        for block, target in zip(blocks, targets):
+            if block is None:
+                continue
+            self.seal(target)
+            self.set_block(target)
+            self.push_scope()
+            self.visit(block)
+            self.pop_scope()
+            self.jump(join)
+
+        self.seal(join)
+        self.set_block(join)
+
+
+    # translation of nodes
+    def generic_visit(self, node):
+        raise UnsupportedConstructError("{} is not supported by IR".format(type(node).__name__))
+
+    def visit_Block(self, node):
+        position = self._position
+        for statement in node.statement_list:
+            self._position = statement.position
+            self.visit(statement)
+        self._position = position
+
+    def visit_CustomFunction(self, node):
+        if not self.at_top_level:
+            raise UnsupportedConstructError("Nested function declarations are not supported by IR")
+
+        if not self.is_first_declaration(node.name):
+            self.fail(CalcValueError("Function {} is already declared!".format(node.name)))
+
+    def visit_Print(self, node):
+        value = self.visit(node.expression)
+        # conversion of a large int to text raises ValueError
+        self.emit("print", [value], may_raise=value.type not in (float, bool, str))
+
+    def visit_RepeatUntil(self, node):
+        def build_condition():
+            condition = self.visit(node.condition)
+            return self.check_condition(condition, "Given repeat-until condition is not bool")
+
+        exit_block = self.build_loop(node.preheader, node.block, build_condition, exit_when=True)
+        self.set_block(exit_block)
+
+    def visit_For(self, node):
+        self.visit(node.initial_assignment)
+
+        if node.parallel:
+            self.emit("print", [self.constant("Running loop in parallel way")])
+
+        condition = self.visit(node.condition)
+        condition = self.check_condition(condition, "Given for condition is not bool")
+        exit_block = self.new_block()
+        loop_entry = self.new_block()
+        self.branch(condition, loop_entry, exit_block)
+        self.seal(loop_entry)
+        self.set_block(loop_entry)
+
+        def build_step():
+            self.visit(node.step_assignment)
+            return self.visit(node.iteration_condition)
+
+        loop_exit = self.build_loop(node.preheader, node.block, build_step, exit_when=False)
+        self.set_block(loop_exit)
+        self.jump(exit_block)
+        self.seal(exit_block)
+        self.set_block(exit_block)
+
+    def visit_While(self, node):
+        condition = self.visit(node.condition)
+        condition = self.check_condition(condition, "Given while condition is not bool")
+        exit_block = self.new_block()
+        loop_entry = self.new_block()
+        self.branch(condition, loop_entry, exit_block)
+        self.seal(loop_entry)
+        self.set_block(loop_entry)
+
+        loop_exit = self.build_loop(node.preheader, node.block,
+                                    lambda: self.visit(node.iteration_condition), exit_when=False)
+        self.set_block(loop_exit)
+        self.jump(exit_block)
+        self.seal(exit_block)
+        self.set_block(exit_block)
+
+    def visit_ConditionalIfElse(self, node):
+        condition = self.visit(node.condition)
+        condition = self.check_condition(condition, "Given if-else condition is not bool")
+        self.build_conditional_blocks(condition, [node.block_if, node.block_else])
+
+    def visit_ConditionalIf(self, node):
+        condition = self.visit(node.condition)
+        condition = self.check_condition(condition, "Given if condition is not bool")
+        self.build_conditional_blocks(condition, [node.statement, None])
+
+    def visit_Call(self, node):
+        function = self.resolve_function(node.function_name)
+        if function is None:
+            return self.fail(CalcValueError("Function {} not declared in any scope".format(node.function_name)))
+
+        arguments = [self.visit(argument) for argument in node.arg_list.arguments]
+        if len(arguments) != len(function.parameters):
+            return self.fail(CalcValueError("Difference in number of arguments for call, expected: {} given: {}"
+                                        .format(len(function.parameters), len(arguments))))
+
+        converted_arguments = []
+        for argument, (_, expected_type) in zip(arguments, function.parameters):
+            if argument.type is not expected_type:
+                argument = self.emit("cast", [argument], attribute=expected_type, value_type=expected_type,
+                                     may_raise=argument.type not in (int, float, bool))
+            converted_arguments.append(argument)
+
+        return self.emit("call", converted_arguments, attribute=node.function_name,
+                         value_type=function.return_type if self.in_program else None,
+                         may_raise=function.may_raise if self.in_program else True)
+
+    def visit_PreFixExpression(self, node):
+        variable, value = self.read_name(node.name)
+        if variable is None:
+            return value
+
+        step = 1 if node.operation == "++" else -1
+        value = self.emit("increment", [value], attribute=step,
+                          value_type=static_result_type(lambda x: x + step, value.type))
+        self.assign_name(node.name, value)
+        return value
+
+    def visit_PostFixExpression(self, node):
+        variable, value = self.read_name(node.name)
+        if variable is None:
+            return value
+
+        step = 1 if node.operation == "++" else -1
+        new_value = self.emit("increment", [value], attribute=step,
+                              value_type=static_result_type(lambda x: x + step, value.type))
+        self.assign_name(node.name, new_value)
+        return value
+
+    def visit_BuiltInFunction(self, node):
+        arguments = [self.visit(argument) for argument in node.arguments.arguments]
+        value_type = node.built_in.get_result_type([argument.type for argument in arguments])
+        return self.emit("builtin", arguments, attribute=node.built_in, value_type=value_type, may_raise=True)
+
+    def visit_Assignment(self, node):
+        if node.index is not None:
+            raise UnsupportedConstructError("Arrays are not supported by IR")
+        self.assign_name(node.name, self.visit(node.value))
+
+    def visit_Minus(self, node):
+        value = self.visit(node.value)
+        return self.emit("minus", [value], value_type=static_result_type(lambda x: (-1) * x, value.type))
+
+    def visit_Declaration(self, node):
+        if node.array_size is not None:
+            raise UnsupportedConstructError("Arrays are not supported by IR")
+
+        value = self.visit(node.value) if node.value is not None else None
+        self.declare_variable(node.name, node.value_type, value)
+
+    def visit_Conversion(self, node):
+        value = self.visit(node.value)
+        may_raise = not (value.type is not None and issubclass(value.type, node.type_from)) or \
+            (node.type_from is str and node.operation in (int, float))
+        return self.emit("convert", [value], attribute=(node.type_from, node.operation),
+                         value_type=node.operation, may_raise=may_raise)
+
+    def visit_BinaryOperation(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+
+        value_type = None
+        if left.type is right.type:
+            value_type = static_result_type(node.operation, left.type, right.type)
+            if node.operation is operator.pow and left.type is int:
+                value_type = None
+        may_raise = left.type is None or left.type is not right.type
+        return self.emit("binop", [left, right], attribute=OPERATION_SYMBOLS[node.operation],
+                         value_type=value_type, may_raise=may_raise)
+
+    def visit_Real(self, node):
+        return self.constant(node.value)
+
+    def visit_Integer(self, node):
+        return self.constant(node.value)
+
+    def visit_Boolean(self, node):
+        return self.constant(node.value)
+
+    def visit_String(self, node):
+        return self.constant(node.value)
+
+    def visit_Name(self, node):
+        if node.index is not None:
+            raise UnsupportedConstructError("Arrays are not supported by IR")
+        _, value = self.read_name(node.name)
+        return value
+
+
+def get_parameters(declaration):
+    return [(argument.name, argument.type) for argument in declaration.arg_list.arguments]
+
+
+def build(program):
+    return IRBuilder().build(program)
@@ -0,0 +1,275 @@
+import functools
+import math
+
+from compiler import ir
+from compiler import ir_optimizer
+from compiler.errors import *
+from compiler.output import print_line
+
+# marks top level variable which declaration failed
+UNDECLARED = object()
+
+
+class StatementFailure(Exception):
+    def __init__(self, error, resume, state):
+        super().__init__(error)
+        self.error = error
+        self.resume = resume
+        self.state = state
+
+
+def raise_type_mismatch(left, right):
+    raise BinaryOperationError("Types of arguments do not match! Left is {} while right is {}"
+                               .format(type(left).__name__, type(right).__name__))
+
+
+def raise_assignment_error(name, expected_type, value):
+    raise AssignmentError("Value of wrong type assigned to {}. Expected {} given {}"
+                          .format(name, expected_type.__name__, type(value).__name__))
+
+
+def raise_conversion_error(expected_type, value):
+    raise ConversionError("Converted value is in incorrect type, expected {} given {}"
+                          .format(expected_type.__name__, type(value).__name__))
+
+
+def raise_condition_error(message):
+    raise ConditionError(message)
+
+
+def raise_not_declared(name):
+    raise CalcValueError("Name {} not declared in any scope".format(name))
+
+
+def raise_error(error_type, message):
+    raise error_type(message)
+
+
+class CompiledProgram:
+    def __init__(self, module, source, build):
+        self._module = module
+        self._source = source
+        self._build = build
+
+    @property
+    def module(self):
+        return self._module
+
+    @property
+    def source(self):
+        return self._source
+
+    def run(self, error_handler=print_error, output=None):
+        """Executes program, every run gets own functions bound to given output and error handler"""
+        program = self._build(functools.partial(print_line, output=output), error_handler)
+        program({})
+
+
+class CodeGenerator:
+    """Lowers IR into Python function per IR function, SSA values become local variables.
+
+    Functions are defined inside build function called for every run with its output and error handler.
+    """
+    def __init__(self, module):
+        self._module = module
+        self._lines = []
+        self._namespace = {
+            "StatementFailure": StatementFailure,
+            "CAUGHT_ERRORS": HANDLED_ERRORS,
+            "UNDECLARED": UNDECLARED,
+            "runtime_error": runtime_error,
+            "raise_type_mismatch": raise_type_mismatch,
+            "raise_assignment_error": raise_assignment_error,
+            "raise_conversion_error": raise_conversion_error,
+            "raise_condition_error": raise_condition_error,
+            "raise_not_declared": raise_not_declared,
+            "raise_error": raise_error
+        }
+        self._objects = {}
+        self._function_names = {name: "function_{}".format(index)
+                                for index, name in enumerate(module.functions)}
+        self._positions = None
+
+    def generate(self):
+        for name, function in self._module.functions.items():
+            self.__generate_function(function, self._function_names[name])
+        self.__generate_function(self._module.program, "program")
+
+        lines = ["def build(print_value, report_error):"]
+        lines.extend("    " + line if line else line for line in self._lines)
+        lines.append("    return program")
+        source = "\n".join(lines) + "\n"
+        exec(compile(source, "<ir>", "exec"), self._namespace)
+        return CompiledProgram(self._module, source, self._namespace["build"])
+
+    def __emit(self, indent, line):
+        self._lines.append("    " * indent + line)
+
+    def __object(self, value):
+        key = (type(value), id(value))
+        if key not in self._objects:
+            name = "object_{}".format(len(self._objects))
+            self._objects[key] = name
+            self._namespace[name] = value
+        return self._objects[key]
+
+    def __literal(self, value):
+        if type(value) in (int, bool, str) or type(value) is float and math.isfinite(value):
+            return repr(value)
+        if value is None:
+            return "None"
+        return self.__object(value)
+
+    def __type(self, value_type):
+        if value_type in (int, float, bool, str):
+            return value_type.__name__
+        return self.__object(value_type)
+
+    def __generate_function(self, function, name):
+        is_program = function is self._module.program
+        self._positions = {block: position for position, block in enumerate(function.blocks)}
+
+        if is_program:
+            self.__emit(0, "def {}(frame):".format(name))
+        else:
+            parameters = ", ".join("p{}".format(index) for index in range(len(function.parameters)))
+            self.__emit(0, "def {}({}):".format(name, parameters))
+        self.__emit(1, "block = {}".format(self._positions[function.entry]))
+        self.__emit(1, "while True:")
+
+        if is_program:
+            self.__emit(2, "try:")
+            self.__emit(3, "while True:")
+            self.__generate_dispatch(function.blocks, 4)
+            self.__emit(2, "except StatementFailure as failure:")
+            self.__emit(3, "frame.update(failure.state)")
+            self.__emit(3, "report_error(failure.error)")
+            self.__emit(3, "block = failure.resume")
+        else:
+            self.__generate_dispatch(function.blocks, 2)
+        self._lines.append("")
+
+    def __generate_dispatch(self, blocks, indent):
+        if len(blocks) == 1:
+            self.__generate_block(blocks[0], indent)
+            return
+
+        middle = len(blocks) // 2
+        self.__emit(indent, "if block < {}:".format(self._positions[blocks[middle]]))
+        self.__generate_dispatch(blocks[:middle], indent + 1)
+        self.__emit(indent, "else:")
+        self.__generate_dispatch(blocks[middle:], indent + 1)
+
+    def __generate_block(self, block, indent):
+        for instruction in block.instructions:
+            lines = self.__instruction_lines(instruction)
+            if instruction.resume is None and instruction.position is None:
+                for line in lines:
+                    self.__emit(indent, line)
+                continue
+
+            self.__emit(indent, "try:")
+            for line in lines:
+                self.__emit(indent + 1, line)
+            self.__emit(indent, "except CAUGHT_ERRORS as error:")
+            error = "runtime_error(error, {!r})".format(instruction.position)
+            if instruction.resume is None:
+                self.__emit(indent + 1, "raise " + error)
+            else:
+                state = ", ".join("{!r}: {}".format(name, value.name) for name, value in instruction.state)
+                self.__emit(indent + 1, "raise StatementFailure({}, {}, {{{}}})"
+                            .format(error, self._positions[instruction.resume], state))
+
+        terminator = block.terminator
+        if terminator.opcode == "return":
+            self.__emit(indent, "return" + ("" if not terminator.operands else " " + terminator.operands[0].name))
+        elif terminator.opcode == "jump":
+            self.__generate_edge(block, block.successors[0], indent)
+        else:
+            if_true, if_false = block.successors
+            self.__emit(indent, "if {}:".format(terminator.operands[0].name))
+            self.__generate_edge(block, if_true, indent + 1)
+            self.__emit(indent, "else:")
+            self.__generate_edge(block, if_false, indent + 1)
+
+    def __generate_edge(self, source, target, indent):
+        if target.phis:
+            index = target.predecessors.index(source)
+            targets = ", ".join(phi.name for phi in target.phis)
+            values = ", ".join(phi.operands[index].name for phi in target.phis)
+            self.__emit(indent, "{} = {}".format(targets, values))
+        self.__emit(indent, "block = {}".format(self._positions[target]))
+
+    def __instruction_lines(self, instruction):
+        opcode = instruction.opcode
+        result = instruction.name
+        operands = [operand.name for operand in instruction.operands]
+
+        if opcode == "const":
+            return ["{} = {}".format(result, self.__literal(instruction.attribute))]
+        if opcode == "param":
+            return ["{} = p{}".format(result, instruction.attribute)]
+        if opcode == "binop":
+            left, right = operands
+            lines = []
+            if instruction.may_raise:
+                lines.append("if type({0}) is not type({1}): raise_type_mismatch({0}, {1})".format(left, right))
+            lines.append("{} = {} {} {}".format(result, left, instruction.attribute, right))
+            return lines
+        if opcode == "minus":
+            return ["{} = (-1) * {}".format(result, operands[0])]
+        if opcode == "increment":
+            sign = "+" if instruction.attribute > 0 else "-"
+            return ["{} = {} {} 1".format(result, operands[0], sign)]
+        if opcode == "convert":
+            type_from, type_to = instruction.attribute
+            lines = []
+            if instruction.may_raise:
+                lines.append("if not isinstance({0}, {1}): raise_conversion_error({1}, {0})"
+                             .format(operands[0], self.__type(type_from)))
+            lines.append("{} = {}({})".format(result, self.__type(type_to), operands[0]))
+            return lines
+        if opcode == "cast":
+            expected_type = self.__type(instruction.attribute)
+            return ["{0} = {1} if type({1}) is {2} else {2}({1})".format(result, operands[0], expected_type)]
+        if opcode == "builtin":
+            return ["{} = {}({})".format(result, self.__object(instruction.attribute.function), ", ".join(operands))]
+        if opcode == "call":
+            return ["{} = {}({})".format(result, self._function_names[instruction.attribute], ", ".join(operands))]
+        if opcode == "print":
+            return ["print_value({})".format(operands[0])]
+        if opcode == "check_type":
+            name, expected_type = instruction.attribute
+            return ["if type({0}) is not {1}: raise_assignment_error({2!r}, {1}, {0})"
+                    .format(operands[0], self.__type(expected_type), name),
+                    "{} = {}".format(result, operands[0])]
+        if opcode == "check_bool":
+            return ["if not isinstance({0}, bool): raise_condition_error({1!r})"
+                    .format(operands[0], instruction.attribute),
+                    "{} = {}".format(result, operands[0])]
+        if opcode == "check_declared":
+            return ["if {0} is UNDECLARED: raise_not_declared({1!r})".format(operands[0], instruction.attribute),
+                    "{} = {}".format(result, operands[0])]
+        if opcode == "fail":
+            error = instruction.attribute
+            return ["raise_error({}, {!r})".format(self.__type(type(error)), error.args[0])]
+        if opcode == "load_global":
+            name, possibly_undeclared = instruction.attribute
+            if possibly_undeclared:
+                return ["{} = frame.get({!r}, UNDECLARED)".format(result, name)]
+            return ["{} = frame[{!r}]".format(result, name)]
+        if opcode == "store_global":
+            return ["frame[{!r}] = {}".format(instruction.attribute, operands[0])]
+        raise ValueError("Unknown instruction {}".format(opcode))
+
+
+def compile_program(program, opt):
+    """Returns compiled program or None when it uses constructs not supported by IR"""
+    try:
+        module = ir.build(program)
+    except ir.UnsupportedConstructError:
+        return None
+
+    if opt:
+        ir_optimizer.optimize(module)
+    return CodeGenerator(module).generate()
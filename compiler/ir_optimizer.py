@@ -0,0 +1,466 @@
+import math
+
+from compiler.ir import COMMUTATIVE_SYMBOLS, OPERATION_SYMBOLS, TYPE_SAMPLES
+
+OPERATIONS = {symbol: operation for operation, symbol in OPERATION_SYMBOLS.items()}
+
+# folding huge powers would only move long computations to compile time
+MAX_FOLDED_EXPONENT = 64
+
+
+class Overdefined:
+    pass
+
+
+OVERDEFINED = Overdefined()
+
+
+def optimize(module):
+    for function in module.all_functions():
+        ConstantPropagation(function).run()
+        remove_unreachable_blocks(function)
+        CommonSubexpressionElimination(function).run()
+        LoopInvariantCodeMotion(function).run()
+        eliminate_dead_code(function)
+        merge_blocks(function)
+
+
+def reverse_postorder(function):
+    visited = set()
+    order = []
+    stack = [(function.entry, iter(successors_with_exceptions(function.entry)))]
+    visited.add(function.entry)
+    while stack:
+        block, successors = stack[-1]
+        for successor in successors:
+            if successor not in visited:
+                visited.add(successor)
+                stack.append((successor, iter(successors_with_exceptions(successor))))
+                break
+        else:
+            stack.pop()
+            order.append(block)
+    order.reverse()
+    return order
+
+
+def successors_with_exceptions(block):
+    result = list(block.successors)
+    for instruction in block.instructions:
+        if instruction.resume is not None and instruction.resume not in result:
+            result.append(instruction.resume)
+    return result
+
+
+def compute_dominators(function):
+    """Returns immediate dominators using iterative algorithm of Cooper, Harvey and Kennedy"""
+    order = reverse_postorder(function)
+    position = {block: index for index, block in enumerate(order)}
+    dominators = {function.entry: function.entry}
+
+    def intersect(first, second):
+        while first is not second:
+            while position[first] > position[second]:
+                first = dominators[first]
+            while position[second] > position[first]:
+                second = dominators[second]
+        return first
+
+    changed = True
+    while changed:
+        changed = False
+        for block in order[1:]:
+            # error leaves its block in the middle, only values from dominators of that block are available
+            predecessors = block.predecessors + [dominators[source] for source in block.exception_sources
+                                                 if source in dominators]
+            new_dominator = None
+            for predecessor in predecessors:
+                if predecessor in dominators and predecessor in position:
+                    new_dominator = predecessor if new_dominator is None else intersect(predecessor, new_dominator)
+            if dominators.get(block) is not new_dominator:
+                dominators[block] = new_dominator
+                changed = True
+    return order, dominators
+
+
+def replace_uses(function, replacements):
+    if not replacements:
+        return
+
+    def replacement(value):
+        while value in replacements:
+            value = replacements[value]
+        return value
+
+    for instruction in function.instructions():
+        instruction.operands = [replacement(operand) for operand in instruction.operands]
+        if instruction.state is not None:
+            instruction.state = [(name, replacement(value)) for name, value in instruction.state]
+
+
+def remove_edge(source, target):
+    index = target.predecessors.index(source)
+    del target.predecessors[index]
+    for phi in target.phis:
+        del phi.operands[index]
+    source.successors.remove(target)
+
+
+def same_constant(first, second):
+    # repr distinguishes 0.0 from -0.0
+    return type(first) is type(second) and repr(first) == repr(second)
+
+
+def fold(instruction, values):
+    """Computes constant result of instruction or returns OVERDEFINED"""
+    opcode = instruction.opcode
+    if opcode == "const":
+        return instruction.attribute if type(instruction.attribute) in TYPE_SAMPLES else OVERDEFINED
+    if any(value is OVERDEFINED for value in values) or not all(type(value) in TYPE_SAMPLES for value in values):
+        return OVERDEFINED
+
+    try:
+        if opcode == "binop":
+            left, right = values
+            if type(left) is not type(right):
+                return OVERDEFINED
+            if instruction.attribute == "**" and (not isinstance(right, (int, float)) or
+                                                  abs(right) > MAX_FOLDED_EXPONENT):
+                return OVERDEFINED
+            result = OPERATIONS[instruction.attribute](left, right)
+        elif opcode == "minus":
+            result = (-1) * values[0]
+        elif opcode == "increment":
+            result = values[0] + instruction.attribute
+        elif opcode == "convert":
+            type_from, type_to = instruction.attribute
+            if not isinstance(values[0], type_from):
+                return OVERDEFINED
+            result = type_to(values[0])
+        elif opcode == "cast":
+            value = values[0]
+            result = value if type(value) is instruction.attribute else instruction.attribute(value)
+        elif opcode == "builtin":
+            built_in = instruction.attribute
+            if not built_in.pure or built_in.get_result_type([type(value) for value in values]) is None:
+                return OVERDEFINED
+            result = built_in.function(*values)
+        elif opcode == "check_type":
+            _, expected_type = instruction.attribute
+            result = values[0] if type(values[0]) is expected_type else OVERDEFINED
+        elif opcode == "check_bool":
+            result = values[0] if isinstance(values[0], bool) else OVERDEFINED
+        else:
+            return OVERDEFINED
+    except Exception:
+        return OVERDEFINED
+
+    if type(result) not in TYPE_SAMPLES or isinstance(result, float) and not math.isfinite(result):
+        return OVERDEFINED
+    return result
+
+
+class ConstantPropagation:
+    """Sparse conditional constant propagation of Wegman and Zadeck"""
+    FOLDABLE = {"const", "binop", "minus", "increment", "convert", "cast", "builtin", "check_type", "check_bool"}
+
+    def __init__(self, function):
+        self._function = function
+        self._values = {}
+        self._executable_blocks = set()
+        self._executable_edges = set()
+        self._users = {}
+
+    def run(self):
+        for instruction in self._function.instructions():
+            for operand in instruction.operands:
+                self._users.setdefault(operand, []).append(instruction)
+
+        block_worklist = [self._function.entry]
+        self._executable_blocks.add(self._function.entry)
+        instruction_worklist = []
+
+        while block_worklist or instruction_worklist:
+            while block_worklist:
+                block = block_worklist.pop()
+                for instruction in block.all_instructions():
+                    instruction_worklist.append(instruction)
+            while instruction_worklist:
+                instruction = instruction_worklist.pop()
+                if instruction.block not in self._executable_blocks:
+                    continue
+                if instruction.opcode in ("jump", "branch"):
+                    for target in self.__visit_terminator(instruction):
+                        edge = (instruction.block, target)
+                        if edge in self._executable_edges:
+                            continue
+                        self._executable_edges.add(edge)
+                        if target not in self._executable_blocks:
+                            self._executable_blocks.add(target)
+                            block_worklist.append(target)
+                        else:
+                            instruction_worklist.extend(target.phis)
+                    continue
+
+                if instruction.resume is not None and instruction.resume not in self._executable_blocks:
+                    self._executable_blocks.add(instruction.resume)
+                    block_worklist.append(instruction.resume)
+
+                value = self.__evaluate(instruction)
+                old_value = self._values.get(instruction)
+                if value is None or old_value is OVERDEFINED:
+                    continue
+                if old_value is not None:
+                    if value is not OVERDEFINED and same_constant(old_value, value):
+                        continue
+                    value = OVERDEFINED
+                self._values[instruction] = value
+                instruction_worklist.extend(self._users.get(instruction, []))
+
+        self.__rewrite()
+
+    def __value(self, instruction):
+        return self._values.get(instruction)
+
+    def __evaluate(self, instruction):
+        """Returns lattice value, None stands for not yet known"""
+        if instruction.opcode == "phi":
+            result = None
+            for predecessor, operand in zip(instruction.block.predecessors, instruction.operands):
+                if (predecessor, instruction.block) not in self._executable_edges:
+                    continue
+                value = self.__value(operand)
+                if value is None:
+                    continue
+                if value is OVERDEFINED or result is not None and not same_constant(result, value):
+                    return OVERDEFINED
+                result = value
+            return result
+
+        if instruction.opcode not in self.FOLDABLE:
+            return OVERDEFINED if instruction.opcode not in ("print", "store_global", "fail", "return") else None
+
+        values = [self.__value(operand) for operand in instruction.operands]
+        if any(value is None for value in values):
+            return None
+        return fold(instruction, values)
+
+    def __visit_terminator(self, terminator):
+        block = terminator.block
+        if terminator.opcode == "jump":
+            return block.successors
+
+        condition = self.__value(terminator.operands[0])
+        if condition is None:
+            return []
+        if condition is OVERDEFINED:
+            return block.successors
+        if_true, if_false = block.successors
+        return [if_true] if condition else [if_false]
+
+    def __rewrite(self):
+        function = self._function
+        for block in function.blocks:
+            if block not in self._executable_blocks:
+                continue
+
+            for phi in list(block.phis):
+                value = self._values.get(phi)
+                if value is not None and value is not OVERDEFINED:
+                    block.phis.remove(phi)
+                    block.instructions.insert(0, phi)
+                    make_constant(phi, value)
+
+            for instruction in block.instructions:
+                value = self._values.get(instruction)
+                if instruction.opcode != "const" and value is not None and value is not OVERDEFINED:
+                    make_constant(instruction, value)
+
+            terminator = block.terminator
+            if terminator.opcode == "branch":
+                condition = self._values.get(terminator.operands[0])
+                if condition is not None and condition is not OVERDEFINED:
+                    if_true, if_false = block.successors
+                    remove_edge(block, if_false if condition else if_true)
+                    terminator.opcode = "jump"
+                    terminator.operands = []
+
+
+def make_constant(instruction, value):
+    instruction.opcode = "const"
+    instruction.operands = []
+    instruction.attribute = value
+    instruction.type = type(value)
+    instruction.may_raise = False
+    instruction.state = None
+    instruction.resume = None
+
+
+def remove_unreachable_blocks(function):
+    reachable = set(reverse_postorder(function))
+    for block in function.blocks:
+        if block in reachable:
+            continue
+        for successor in list(block.successors):
+            remove_edge(block, successor)
+
+    function.blocks = [block for block in function.blocks if block in reachable]
+    replacements = {}
+    for block in function.blocks:
+        block.exception_sources = [source for source in block.exception_sources if source in reachable and
+                                   any(instruction.resume is block for instruction in source.instructions)]
+        # phis which have lost all but one of their inputs are copies now
+        for phi in list(block.phis):
+            operands = set(phi.operands) - {phi}
+            if len(operands) == 1:
+                replacements[phi] = operands.pop()
+                block.phis.remove(phi)
+    replace_uses(function, replacements)
+
+    for loop in function.loops:
+        loop.blocks &= reachable
+    function.loops = [loop for loop in function.loops
+                      if loop.header in reachable and loop.preheader in reachable]
+
+
+class CommonSubexpressionElimination:
+    """Dominator based value numbering of pure instructions"""
+    PURE = {"const", "binop", "minus", "increment", "convert", "cast", "builtin", "check_type", "check_bool",
+            "check_declared"}
+
+    def __init__(self, function):
+        self._function = function
+
+    def run(self):
+        order, dominators = compute_dominators(self._function)
+        children = {}
+        for block in order[1:]:
+            children.setdefault(dominators[block], []).append(block)
+
+        replacements = {}
+        table = {}
+        stack = [(self._function.entry, False)]
+        undo = []
+        while stack:
+            block, leaving = stack.pop()
+            if leaving:
+                while undo and undo[-1][0] is block:
+                    _, key, previous = undo.pop()
+                    if previous is None:
+                        del table[key]
+                    else:
+                        table[key] = previous
+                continue
+
+            stack.append((block, True))
+            for instruction in list(block.instructions):
+                if instruction.opcode not in self.PURE:
+                    continue
+                if instruction.opcode == "builtin" and not instruction.attribute.pure:
+                    continue
+                instruction.operands = [replacements.get(operand, operand) for operand in instruction.operands]
+                key = self.__key(instruction)
+                if key is None:
+                    continue
+                existing = table.get(key)
+                if existing is not None:
+                    replacements[instruction] = existing
+                    block.instructions.remove(instruction)
+                else:
+                    undo.append((block, key, table.get(key)))
+                    table[key] = instruction
+            for child in reversed(children.get(block, [])):
+                stack.append((child, False))
+
+        replace_uses(self._function, replacements)
+
+    @staticmethod
+    def __key(instruction):
+        attribute = instruction.attribute
+        if instruction.opcode == "const":
+            if type(attribute) not in TYPE_SAMPLES:
+                return None
+            attribute = repr(attribute)
+        operands = [operand.id for operand in instruction.operands]
+        if instruction.opcode == "binop" and attribute in COMMUTATIVE_SYMBOLS and \
+                all(operand.type in (int, float, bool) for operand in instruction.operands):
+            operands.sort()
+        try:
+            key = (instruction.opcode, type(instruction.attribute), attribute, tuple(operands))
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+
+class LoopInvariantCodeMotion:
+    """Moves speculatable instructions with operands defined outside of loop to its preheader"""
+    def __init__(self, function):
+        self._function = function
+
+    def run(self):
+        order = reverse_postorder(self._function)
+        for loop in self._function.loops:
+            preheader = loop.preheader
+            for block in order:
+                if block not in loop.blocks:
+                    continue
+                for instruction in list(block.instructions):
+                    if not instruction.can_speculate():
+                        continue
+                    if any(operand.block in loop.blocks for operand in instruction.operands):
+                        continue
+                    block.instructions.remove(instruction)
+                    preheader.instructions.append(instruction)
+                    instruction.block = preheader
+
+
+def eliminate_dead_code(function):
+    live = set()
+    worklist = [instruction for instruction in function.instructions() if instruction.has_side_effects()]
+    live.update(worklist)
+    while worklist:
+        instruction = worklist.pop()
+        used = list(instruction.operands)
+        if instruction.state is not None:
+            used += [value for _, value in instruction.state]
+        for operand in used:
+            if operand not in live:
+                live.add(operand)
+                worklist.append(operand)
+
+    for block in function.blocks:
+        block.phis = [phi for phi in block.phis if phi in live]
+        block.instructions = [instruction for instruction in block.instructions if instruction in live]
+
+
+def merge_blocks(function):
+    """Joins blocks with single successor to successors with single predecessor"""
+    removed = set()
+    for block in function.blocks:
+        if block in removed:
+            continue
+        while block.terminator.opcode == "jump":
+            successor = block.successors[0]
+            if len(successor.predecessors) != 1 or successor.exception_sources or successor.phis or \
+                    successor is function.entry or successor is block:
+                break
+
+            for instruction in successor.instructions:
+                instruction.block = block
+                resume = instruction.resume
+                if resume is not None:
+                    resume.exception_sources = [block if source is successor else source
+                                                for source in resume.exception_sources]
+                    if resume.exception_sources.count(block) > 1:
+                        resume.exception_sources.remove(block)
+            block.instructions += successor.instructions
+            block.terminator = successor.terminator
+            block.terminator.block = block
+            block.successors = successor.successors
+            for target in block.successors:
+                target.predecessors = [block if predecessor is successor else predecessor
+                                       for predecessor in target.predecessors]
+            removed.add(successor)
+
+    function.blocks = [block for block in function.blocks if block not in removed]
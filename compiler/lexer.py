@@ -1,7 +1,11 @@
 import difflib
+import functools
+import re
 
 import ply.lex as lex
 
+from compiler.built_ins import built_ins
+
 
 class Lexer:
     MINIMAL_SIMILARITY = 1
@@ -61,11 +65,21 @@ class Lexer:
 
     def __init__(self):
         self._lexer = None
+        self._output = None
 
     @property
     def lexer(self):
         return self._lexer
 
+    @property
+    def output(self):
+        """File object receiving messages about illegal characters, standard output when None"""
+        return self._output
+
+    @output.setter
+    def output(self, output):
+        self._output = output
+
     @staticmethod
     def compare_strings(first, second):
         return sum([i[0] != " " for i in difflib.ndiff(first, second)]) / 2
@@ -75,7 +89,7 @@ class Lexer:
         return t
 
     def t_FUNCTION(self, t):
-        r"""(sin|asin|cos|acos|tan|atan|exp|log|sqrt|j) (?=\d+|\(.*\)) (?i)"""
+        # regular expression is built from the registry of built-in functions, see build
         return t
 
     def t_REAL(self, t):
@@ -104,18 +118,24 @@ class Lexer:
 
     def t_NAME(self, t):
         r"""[a-zA-Z_][a-zA-Z0-9_]*"""
-        t.type = self.reserved.get(t.value.lower(), "NAME")
-        if t.type == "NAME":
-            matches = difflib.get_close_matches(t.value, self.reserved.keys())
-            matches = list(map(lambda x: (x, Lexer.compare_strings(x, t.value)), matches))
+        t.type, t.value = self.classify_name(t.value)
+        return t
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def classify_name(name):
+        """Returns token type and value for name, which may be a misspelled reserved word"""
+        token_type = Lexer.reserved.get(name.lower(), "NAME")
+        if token_type == "NAME":
+            matches = difflib.get_close_matches(name, Lexer.reserved.keys())
+            matches = list(map(lambda x: (x, Lexer.compare_strings(x, name)), matches))
             matches.sort(key=lambda x: -x[1])
 
-            if len(matches) > 0 and matches[0][1] <= self.MINIMAL_SIMILARITY:
+            if len(matches) > 0 and matches[0][1] <= Lexer.MINIMAL_SIMILARITY:
                 word_name = matches[0][0]
-                t.type = self.reserved[word_name]
-                t.value = word_name
+                return Lexer.reserved[word_name], word_name
 
-        return t
+        return token_type, name
 
     t_ignore = " \t"
 
@@ -124,12 +144,21 @@ class Lexer:
         t.lexer.lineno += t.value.count("\n")
 
     def t_error(self, t):
-        print("Illegal character '%s'" % t.value[0])
+        print("Illegal character '%s'" % t.value[0], file=self._output)
         t.lexer.skip(1)
 
     def build(self, **kwargs):
+        Lexer.t_FUNCTION.regex = built_ins.get_token_pattern()
+        # all tokens are matched in any case, inline global flags are rejected by newer versions of re
+        kwargs.setdefault("reflags", int(re.VERBOSE | re.IGNORECASE))
         self._lexer = lex.lex(module=self, **kwargs)
 
+    def clone(self):
+        """Returns lexer with own input and position, sharing rules built by this one"""
+        lexer = Lexer()
+        lexer._lexer = self._lexer.clone(lexer)
+        return lexer
+
     def test(self, data):
         self.lexer.input(data)
         while True:
@@ -1,16 +1,41 @@
+import itertools
+import sys
 import threading
+import time
 
-import numpy as np
+from compiler.errors import AssignmentError, BudgetExceeded, CalcValueError, runtime_error
+from compiler.output import print_line
 
-from compiler.errors import AssignmentError, ExpressionResultSavingError
+
+def is_array(value):
+    # arrays exist only after numpy was imported by their declaration or by a built-in function
+    numpy = sys.modules.get("numpy")
+    return numpy is not None and isinstance(value, numpy.ndarray)
+
+
+class StringBuilder:
+    """Text extended at both ends, parts are joined once when the text is needed"""
+    __slots__ = ("_prefixes", "_text", "_suffixes")
+
+    def __init__(self, text):
+        # prefixes are kept in reversed order, the last one is the first part of the text
+        self._prefixes = []
+        self._text = text
+        self._suffixes = []
+
+    def extend(self, prefixes, suffixes):
+        self._prefixes.extend(reversed(prefixes))
+        self._suffixes.extend(suffixes)
+
+    def build(self):
+        return "".join(itertools.chain(reversed(self._prefixes), (self._text,), self._suffixes))
 
 
 class DeclaredName:
     def __init__(self, value_type, value):
         self._type = value_type
         self._value = value
-        self._changes = 0
-        self._used = False
+        self._builder = None
 
     @property
     def type(self):
@@ -18,19 +43,21 @@ class DeclaredName:
 
     @property
     def value(self):
-        return self._value, self._changes
-
-    @property
-    def used(self):
-        return self._used
-
-    def mark_as_used(self):
-        self._used = True
+        if self._builder is not None:
+            self._value = self._builder.build()
+            self._builder = None
+        return self._value
 
     @value.setter
     def value(self, value):
         self._value = value
-        self._changes += 1
+        self._builder = None
+
+    def extend(self, prefixes, suffixes):
+        """Adds strings before and after string value, which is built when it is read"""
+        if self._builder is None:
+            self._builder = StringBuilder(self._value)
+        self._builder.extend(prefixes, suffixes)
 
 
 class NamesDict:
@@ -41,13 +68,6 @@ class NamesDict:
         "str": ""
     }
 
-    np_types = {
-        "int": np.int,
-        "float": np.float,
-        "bool": np.bool,
-        "str": np.str
-    }
-
     def __init__(self):
         self._dict = {}
 
@@ -56,68 +76,101 @@ class NamesDict:
         return self._dict
 
     def declare(self, name, value_type, value, array_size=None):
+        if name in self._dict:
+            raise CalcValueError("Variable is already declared!")
+
+        if array_size is not None:
+            import numpy as np  # imported only by programs using arrays
+            array = np.zeros(array_size, dtype=value_type)
+            if value is not None:
+                self.assign_array(name, value_type, array, value)
+            self._dict[name] = DeclaredName(value_type, array)
+            return
+
         if value is None:
             value = self.defaults[value_type.__name__]
 
-        if name in self._dict:
-            raise ValueError("Variable is already declared!")
-
         # using isinstance fails when trying to assign bool to int
         if value_type != type(value):
             raise AssignmentError("Value of wrong type assigned to {}. Expected {} given {}"
                                   .format(name, value_type.__name__, type(value).__name__))
 
-        if array_size is None:
-            declared_name = DeclaredName(value_type, value)
-        else:
-            value = np.zeros(array_size, dtype=self.np_types[value_type.__name__])
-            declared_name = DeclaredName(value_type, value)
-        self._dict[name] = declared_name
+        self._dict[name] = DeclaredName(value_type, value)
+
+    @staticmethod
+    def assign_array(name, value_type, array, value):
+        """Copies elements of given array to array of the variable, both must have the same shape and type"""
+        import numpy as np
+        if not is_array(value):
+            raise AssignmentError("Value of wrong type assigned to {}. Expected {} array given {}"
+                                  .format(name, value_type.__name__, type(value).__name__))
+        if value.dtype.kind != np.dtype(value_type).kind:
+            raise AssignmentError("Value of wrong type assigned to {}. Expected {} array given {} array"
+                                  .format(name, value_type.__name__, value.dtype))
+        if value.shape != array.shape:
+            raise CalcValueError("Shape {} of assigned array does not match shape {} of {}"
+                                 .format(value.shape, array.shape, name))
+        array[...] = value
 
     def assign(self, name, value, array_index=None):
         if name not in self._dict:
-            raise ValueError("Variable not defined!")
+            raise CalcValueError("Variable not defined!")
 
         expected_type = self._dict[name].type
         if expected_type != type(value):
+            # whole array is assigned only to array variable
+            if array_index is None and is_array(value) and is_array(self._dict[name].value):
+                self.assign_array(name, expected_type, self._dict[name].value, value)
+                return
             raise AssignmentError("Value of wrong type assigned to {}. Expected {} given {}"
                                   .format(name, expected_type.__name__, type(value).__name__))
 
         if array_index is None:
             self._dict[name].value = value
         else:
-            array, _ = self._dict[name].value
+            array = self._dict[name].value
             shape = array.shape
             if len(array_index) != len(shape):
-                raise ValueError("Given indices number does not match dimension of an array")
+                raise CalcValueError("Given indices number does not match dimension of an array")
 
+            import numpy as np
             flattened_index = np.ravel_multi_index(array_index, shape)
             np.put(array, flattened_index, value)
 
-    def read(self, name, array_index=None):
+    def extend(self, name, prefixes, suffixes):
         if name not in self._dict:
-            raise ValueError("Variable not defined!")
+            raise CalcValueError("Variable not defined!")
 
-        self._dict[name].mark_as_used()
+        self._dict[name].extend(prefixes, suffixes)
 
-        result, changes = self._dict[name].value
-        if array_index is None:
-            return result, changes
-        else:
+    def read_type(self, name):
+        if name not in self._dict:
+            raise CalcValueError("Variable not defined!")
+
+        return self._dict[name].type
+
+    def read(self, name, array_index=None):
+        if name not in self._dict:
+            raise CalcValueError("Variable not defined!")
+
+        result = self._dict[name].value
+        if array_index is not None:
             for index in array_index:
                 result = result[index]
-            return result, changes
+        return result
 
     def contains(self, name):
         return name in self._dict
 
+    def set_temporary(self, name, value):
+        self._dict[name] = DeclaredName(type(value), value)
+
 
 class DeclaredFunction:
     def __init__(self, arg_list, body, returned_value=None):
         self._arg_list = arg_list
         self._body = body
         self._returned_value = returned_value
-        self._used = False
 
     @property
     def arg_list(self):
@@ -131,12 +184,6 @@ class DeclaredFunction:
     def returned_value(self):
         return self._returned_value
 
-    @property
-    def used(self):
-        return self._used
-
-    def mark_as_used(self):
-        self._used = True
 
 
 class FunctionsDict:
@@ -149,92 +196,147 @@ class FunctionsDict:
 
     def declare(self, name, arg_list, body, returned_value):
         if name in self._dict:
-            raise ValueError("Function {} is already declared!".format(name))
+            raise CalcValueError("Function {} is already declared!".format(name))
 
         declared_function = DeclaredFunction(arg_list, body, returned_value)
         self._dict[name] = declared_function
 
     def read(self, name):
         if name not in self._dict:
-            raise ValueError("Function not declared")
+            raise CalcValueError("Function not declared")
 
-        self._dict[name].mark_as_used()
         return self._dict[name]
 
     def contains(self, name):
         return name in self._dict
 
 
-class ExpressionSet:
-    def __init__(self):
-        self._set = []
+class Budget:
+    """Limits of a run, steps are iterations of loops and function calls.
+
+    Budget is shared by all scopes of the run, including copies used by parallel threads, and it can be
+    cancelled from another thread. Limits apply from the last start. Spending a step only decrements
+    a countdown, the step limit, deadline and cancellation are checked when it runs out, which happens
+    at least every CHECK_INTERVAL steps and right after cancellation.
+    """
+    CHECK_INTERVAL = 1000
+
+    def __init__(self, steps=None, seconds=None):
+        self._steps = steps
+        self._seconds = seconds
+        self.start()
 
     @property
-    def set(self):
-        return self._set
-
-    def add(self, expression):
-        self._set.append([expression, 0])
-
-    def __get_element_index(self, expression):
-        for index, element in enumerate(self._set):
-            if element[0] == expression:
-                return index
-
-        return -1
-
-    def get_if_declared(self, expression):
-        index = self.__get_element_index(expression)
-        if index != -1:
-            element = self._set[index]
-            self._set[index] = [element[0], element[1] + 1]
-            return element[0]
-
-        return None
-
-    def get_occurrences(self, expression):
-        for expr, counter in self._set:
-            if expr == expression:
-                return counter
-        return 0
-
-    def save_result(self, expression, result):
-        for index, element in enumerate(self._set):
-            if element[0] == expression:
-                if len(element) == 3:
-                    raise ExpressionResultSavingError("Result for this expression has been already saved")
-                self._set[index] = [element[0], element[1], result]
-                return
+    def steps(self):
+        return self._steps
 
-        raise ExpressionResultSavingError("Statement with given result has not been placed in expression set before")
+    @property
+    def seconds(self):
+        return self._seconds
 
-    def get_result(self, expression):
-        for element in self._set:
-            if element[0] == expression:
-                if len(element) == 3:
-                    return element[2]
-                else:
-                    return None
-        return None
+    @property
+    def exceeded(self):
+        """Error raised when the budget ran out in the current run, None if it did not"""
+        return self._exceeded
+
+    def start(self):
+        self._deadline = None if self._seconds is None else time.monotonic() + self._seconds
+        self._cancelled = False
+        self._exceeded = None
+        self._used = 0
+        self._chunk = 0
+        self._countdown = 0
+
+    def cancel(self):
+        self._cancelled = True
+        self._countdown = 0
+
+    def spend(self):
+        self._countdown -= 1
+        if self._countdown < 0:
+            self.__check()
+
+    def __check(self):
+        """Checks limits when countdown runs out and starts next countdown"""
+        self._used += self._chunk
+        if self._cancelled:
+            self.__exceed("cancelled", None)
+        if self._steps is not None and self._used >= self._steps:
+            self.__exceed("steps", self._steps)
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            self.__exceed("time", self._seconds)
+
+        self._chunk = self.CHECK_INTERVAL if self._steps is None else min(self.CHECK_INTERVAL,
+                                                                          self._steps - self._used)
+        # the step being spent now is the first one of the chunk
+        self._countdown = self._chunk - 1
+
+    def __exceed(self, kind, limit):
+        self._countdown = 0
+        self._chunk = 0
+        self._exceeded = BudgetExceeded(kind, limit)
+        raise self._exceeded
 
 
 class Scope:
-    def __init__(self):
+    """Names of a running program, its output and handler of its errors, which are printed by default"""
+
+    def __init__(self, error_handler=None, output=None, budget=None, tracer=None):
         self._functions = [FunctionsDict()]
         self._names = [NamesDict()]
-        self._expressions = ExpressionSet()
         self._lock = threading.RLock()
+        self._error_handler = error_handler
+        self._output = output
+        self._budget = budget
+        self._tracer = tracer
 
     def start_new(self):
         with self._lock:
             self._functions.append(FunctionsDict())
             self._names.append(NamesDict())
+            depth = len(self._names)
+        if self._tracer is not None:
+            self._tracer.on_scope_push(depth)
 
     def end_current(self):
         with self._lock:
             self._functions.pop()
             self._names.pop()
 
+    @property
+    def depth(self):
+        return len(self._names)
+
+    def unwind(self, depth):
+        """Leaves scopes entered above given depth, which were left open by an error"""
+        with self._lock:
+            del self._functions[depth:]
+            del self._names[depth:]
+
+    @property
+    def output(self):
+        """File object written by the program, standard output when None"""
+        return self._output
+
+    @property
+    def budget(self):
+        """Budget spent by loops and calls of the program, None when execution is not limited"""
+        return self._budget
+
+    @property
+    def tracer(self):
+        """Tracer passed events of the program execution, None when execution is not traced"""
+        return self._tracer
+
+    def print_value(self, value):
+        print_line(value, self._output)
+
+    def report_error(self, err):
+        if self._error_handler is not None:
+            self._error_handler(err)
+        else:
+            self.print_value(runtime_error(err).describe())
+
     def declare_function(self, name, arg_list, body, returned_value):
         with self._lock:
             self._functions[-1].declare(name, arg_list, body, returned_value)
@@ -245,12 +347,7 @@ class Scope:
                 if functions_dict.contains(name):
                     return functions_dict.read(name)
 
-            raise ValueError("Function {} not declared in any scope".format(name))
-
-    def get_unused_functions(self):
-        with self._lock:
-            function_scope = self._functions[-1].dict
-            return {k: v for k, v in function_scope.items() if not v.used}
+            raise CalcValueError("Function {} not declared in any scope".format(name))
 
     def declare_name(self, name, value_type, value=None, array_size=None):
         with self._lock:
@@ -262,7 +359,7 @@ class Scope:
                 if names_dict.contains(name):
                     return self._names.index(names_dict)
 
-            raise ValueError("Name {} not declared in any scope".format(name))
+            raise CalcValueError("Name {} not declared in any scope".format(name))
 
     def assign_name(self, name, value, array_index=None):
         with self._lock:
@@ -274,27 +371,28 @@ class Scope:
             index = self.get_dict_index_for_name(name)
             return self._names[index].read(name, array_index)
 
-    def get_unused_names(self):
-        with self._lock:
-            name_scope = self._names[-1].dict
-            return {k: v for k, v in name_scope.items() if not v.used}
-
-    def add_expression(self, expression):
-        with self._lock:
-            self._expressions.add(expression)
-
-    def get_expression(self, expression):
+    def read_name_type(self, name):
+        """Returns declared type of variable, None when it is not declared"""
         with self._lock:
-            return self._expressions.get_if_declared(expression)
+            for names_dict in reversed(self._names):
+                if names_dict.contains(name):
+                    return names_dict.read_type(name)
+            return None
 
-    def get_expression_occurrence(self, expression):
+    def extend_name(self, name, prefixes, suffixes):
+        """Adds strings before and after value of string variable without copying it"""
         with self._lock:
-            return self._expressions.get_occurrences(expression)
+            index = self.get_dict_index_for_name(name)
+            self._names[index].extend(name, prefixes, suffixes)
 
-    def save_expression_result(self, expression, result):
+    def set_temporary(self, name, value):
         with self._lock:
-            self._expressions.save_result(expression, result)
+            self._names[-1].set_temporary(name, value)
 
-    def get_expression_result(self, expression):
+    def read_temporary(self, name):
+        """Returns value of compiler generated temporary or None if it has not been set in any scope"""
         with self._lock:
-            return self._expressions.get_result(expression)
+            for names_dict in reversed(self._names):
+                if names_dict.contains(name):
+                    return names_dict.read(name)
+            return None
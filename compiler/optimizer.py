@@ -0,0 +1,1054 @@
+import copy
+import itertools
+import operator
+
+from compiler import ast
+from compiler.parser import Parser
+from compiler.visitor import NodeTransformer, NodeVisitor
+
+
+class Usage:
+    """Names and functions referenced by a subtree, gathered in a single walk."""
+
+    def __init__(self):
+        self.reads = set()
+        self.writes = set()
+        self.impure_writes = set()
+        self.calls = set()
+        self.functions = []
+        self.side_effects = False
+
+
+class UsageCollector(NodeVisitor):
+    """Adds names and functions referenced by visited subtree to given usage"""
+
+    def visit_FunctionArgumentList(self, node, usage):
+        pass
+
+    def visit_CustomFunction(self, node, usage):
+        # body is analysed separately, only when the function is reachable
+        usage.functions.append(node)
+
+    def visit_Print(self, node, usage):
+        usage.side_effects = True
+        self.visit(node.expression, usage)
+
+    def visit_For(self, node, usage):
+        self.visit(node.initial_assignment, usage)
+        self.visit(node.condition, usage)
+        if node.preheader is not None:
+            self.visit(node.preheader, usage)
+            self.visit(node.iteration_condition, usage)
+        self.visit(node.step_assignment, usage)
+        self.visit(node.block, usage)
+
+    def visit_While(self, node, usage):
+        self.visit(node.condition, usage)
+        if node.preheader is not None:
+            self.visit(node.preheader, usage)
+            self.visit(node.iteration_condition, usage)
+        self.visit(node.block, usage)
+
+    def visit_Call(self, node, usage):
+        usage.calls.add(node.function_name)
+        usage.side_effects = True
+        self.visit(node.arg_list, usage)
+
+    def visit_PreFixExpression(self, node, usage):
+        usage.reads.add(node.name)
+        usage.writes.add(node.name)
+        usage.side_effects = True
+
+    def visit_PostFixExpression(self, node, usage):
+        usage.reads.add(node.name)
+        usage.writes.add(node.name)
+        usage.side_effects = True
+
+    def visit_Assignment(self, node, usage):
+        self.visit_store(node, usage)
+
+    def visit_Declaration(self, node, usage):
+        self.visit_store(node, usage)
+
+    def visit_store(self, node, usage):
+        side_effects = usage.side_effects
+        usage.side_effects = False
+
+        self.generic_visit(node, usage)
+
+        usage.writes.add(node.name)
+        if usage.side_effects:
+            usage.impure_writes.add(node.name)
+        usage.side_effects |= side_effects
+
+    def visit_Name(self, node, usage):
+        usage.reads.add(node.name)
+        self.generic_visit(node, usage)
+
+    def visit_BuiltInFunction(self, node, usage):
+        if not node.built_in.pure:
+            usage.side_effects = True
+        self.visit(node.arguments, usage)
+
+
+def collect_usage(node, usage):
+    UsageCollector().visit(node, usage)
+
+
+def get_usage(node):
+    usage = Usage()
+    collect_usage(node, usage)
+    return usage
+
+
+def get_body_usage(function):
+    usage = get_usage(function.body)
+    if function.returned_value is not None:
+        collect_usage(function.returned_value, usage)
+    return usage
+
+
+def is_pure(node):
+    return not get_usage(node).side_effects
+
+
+class ProgramAnalysis:
+    """Usage of names in the whole program, including bodies of functions which may be called.
+
+    Functions are resolved dynamically in this language, so a call is treated as reading and
+    writing every name read or written by any reachable function. When functions are kept, all
+    of them are reachable, as they may be called after the program.
+    """
+
+    def __init__(self, program, keep_functions=False):
+        top_level = get_usage(program)
+
+        functions_usage = {}
+        pending = list(top_level.functions)
+        while pending:
+            function = pending.pop()
+            usage = get_body_usage(function)
+            functions_usage.setdefault(function.name, []).append(usage)
+            pending += usage.functions
+
+        reachable = set()
+        pending = list(top_level.calls)
+        if keep_functions:
+            pending += functions_usage.keys()
+        while pending:
+            name = pending.pop()
+            if name in reachable:
+                continue
+            reachable.add(name)
+            for usage in functions_usage.get(name, []):
+                pending += usage.calls
+
+        self._function_reads = set()
+        self._function_writes = set()
+        writes = set(top_level.writes)
+        impure_writes = set(top_level.impure_writes)
+        for name in reachable:
+            for usage in functions_usage.get(name, []):
+                self._function_reads |= usage.reads
+                self._function_writes |= usage.writes
+                writes |= usage.writes
+                impure_writes |= usage.impure_writes
+
+        self._reachable_functions = reachable
+        self._global_reads = top_level.reads | self._function_reads
+        self._removable_names = writes - self._global_reads - impure_writes
+
+    @property
+    def global_reads(self):
+        return self._global_reads
+
+    @property
+    def removable_names(self):
+        return self._removable_names
+
+    def is_reachable(self, function_name):
+        return function_name in self._reachable_functions
+
+    def get_reads(self, usage):
+        if usage.calls:
+            return usage.reads | self._function_reads
+        return usage.reads
+
+    def get_writes(self, usage):
+        if usage.calls:
+            return usage.writes | self._function_writes
+        return usage.writes
+
+
+def is_constant_condition(condition, value):
+    return isinstance(condition, ast.Boolean) and condition.value is value
+
+
+NUMERIC_OPERATIONS = {operator.add, operator.sub, operator.mul}
+COMPARISONS = {operator.lt, operator.le, operator.gt, operator.ge}
+EQUALITIES = {operator.eq, operator.ne}
+LOGICAL_OPERATIONS = {operator.and_, operator.or_, operator.xor}
+
+
+class StoreChecker(NodeVisitor):
+    """Finds declarations, assignments and expressions which cannot raise.
+
+    Only such stores may be removed as dead and only such expressions may be computed before
+    statements which precede them. Statements are visited in order of their execution with a stack
+    of scopes, every scope maps names declared in it to their types. Type is None for names which
+    may be declared, but whose declaration may have failed. Visiting an expression returns its type
+    when it is known and the expression cannot raise, None otherwise.
+    """
+
+    def __init__(self, program):
+        self._scopes = [{}]
+        self._safe_stores = set()
+        self._unsafe_names = set()
+        self._types = {}
+        self.visit(program)
+
+    def visit(self, node, *args):
+        value_type = super().visit(node, *args)
+        if value_type is not None:
+            self._types[id(node)] = value_type
+        return value_type
+
+    @property
+    def unsafe_names(self):
+        """Names with at least one store which may raise"""
+        return self._unsafe_names
+
+    def is_safe(self, store):
+        return id(store) in self._safe_stores
+
+    def get_type(self, expression):
+        """Returns type of expression which cannot raise, None for other expressions"""
+        return self._types.get(id(expression))
+
+    def mark(self, store, safe):
+        if safe:
+            self._safe_stores.add(id(store))
+        else:
+            self._unsafe_names.add(store.name)
+
+    def lookup(self, name):
+        for scope in reversed(self._scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    def visit_in_scope(self, node, scope=None):
+        self._scopes.append({} if scope is None else scope)
+        self.visit(node)
+        self._scopes.pop()
+
+    def visit_CustomFunction(self, node):
+        # names of the calling scope are not known, function sees only its parameters
+        scopes, self._scopes = self._scopes, []
+        parameters = {}
+        for argument in node.arg_list.arguments:
+            parameters[argument.name] = None if argument.name in parameters else argument.type
+        self.visit_in_scope(node.body, parameters)
+        if node.returned_value is not None:
+            self.visit(node.returned_value)
+        self._scopes = scopes
+
+    def visit_Parallel(self, node):
+        # statements are not ordered, each of them may be executed before names declared by others
+        scope = self._scopes[-1]
+        for statement in node.statement_list:
+            for name in statement.get_declared_names():
+                scope[name] = None
+        for statement in node.statement_list:
+            self.visit(statement)
+
+    def visit_RepeatUntil(self, node):
+        self.visit_in_scope(node.block)
+        self.visit(node.condition)
+
+    def visit_For(self, node):
+        self.visit(node.initial_assignment)
+        self.visit(node.condition)
+        self.visit_in_scope(node.block)
+        self.visit(node.step_assignment)
+
+    def visit_While(self, node):
+        self.visit(node.condition)
+        self.visit_in_scope(node.block)
+
+    def visit_ConditionalIfElse(self, node):
+        self.visit(node.condition)
+        self.visit_in_scope(node.block_if)
+        self.visit_in_scope(node.block_else)
+
+    def visit_ConditionalIf(self, node):
+        self.visit(node.condition)
+        self.visit_in_scope(node.statement)
+
+    def visit_Declaration(self, node):
+        scope = self._scopes[-1]
+        value_type = None
+        # size of array may be invalid, so declarations of arrays are never safe
+        if node.array_size is None:
+            value_type = node.value_type if node.value is None else self.visit(node.value)
+            if node.value_type is not None and value_type is not node.value_type:
+                value_type = None
+
+        # declaring name again in the same scope raises
+        self.mark(node, value_type is not None and node.name not in scope)
+        scope[node.name] = value_type if node.name not in scope else None
+
+    def visit_Assignment(self, node):
+        value_type = self.visit(node.value)
+        self.mark(node, node.index is None and value_type is not None and self.lookup(node.name) is value_type)
+
+    def visit_Name(self, node):
+        return self.lookup(node.name) if node.index is None else None
+
+    def visit_Integer(self, node):
+        return int
+
+    def visit_Real(self, node):
+        return float
+
+    def visit_Boolean(self, node):
+        return bool
+
+    def visit_String(self, node):
+        return str
+
+    def visit_Minus(self, node):
+        value_type = self.visit(node.value)
+        return int if value_type is bool else value_type if value_type in (int, float) else None
+
+    def visit_BinaryOperation(self, node):
+        left_type, right_type = self.visit(node.left), self.visit(node.right)
+        if left_type is None or left_type is not right_type:
+            return None
+
+        operation = node.operation
+        if operation in NUMERIC_OPERATIONS and left_type in (int, float) or \
+                operation is operator.add and left_type is str or \
+                operation in LOGICAL_OPERATIONS and left_type in (int, bool):
+            return left_type
+        if operation in EQUALITIES or operation in COMPARISONS and left_type in (int, float, str, bool):
+            return bool
+        return None
+
+
+class DeadCodeEliminator(NodeVisitor):
+    """Static liveness based dead code elimination performed before execution.
+
+    Removes declarations and assignments of names which are never read, stores overwritten before
+    being read, branches of conditionals and loops with constant false condition and functions
+    which are never called. Only stores which cannot raise are removed. When names are kept, like
+    in the interactive console, names and functions may be used after the program and only stores
+    overwritten inside of it are removed.
+
+    Visiting a statement returns list of statements replacing it. Set live contains names which
+    may be read after the statement, it is updated in place to names which may be read before it.
+    Statements of a block with constant true condition are moved only to the enclosing block, as an
+    error stops the whole block, while the program continues with its next statement.
+    """
+
+    MAX_ITERATIONS = 10
+
+    def __init__(self, program, keep_names=False):
+        self._program = program
+        self._keep_names = keep_names
+        self._analysis = None
+        self._stores = None
+        self._removable_names = set()
+        self._changed = False
+        self._in_block = False
+
+    @property
+    def global_reads(self):
+        return self._analysis.global_reads
+
+    @property
+    def removable_names(self):
+        return self._removable_names
+
+    def mark_changed(self):
+        self._changed = True
+        ast.Node.invalidate_names()
+
+    def is_reachable(self, function_name):
+        return self._analysis.is_reachable(function_name)
+
+    def run(self):
+        for _ in range(self.MAX_ITERATIONS):
+            self._changed = False
+            self._analysis = ProgramAnalysis(self._program, self._keep_names)
+            self._stores = StoreChecker(self._program)
+            live = set()
+            if self._keep_names:
+                self._removable_names = set()
+                live = set(self._analysis.get_writes(get_usage(self._program)))
+            else:
+                self._removable_names = self._analysis.removable_names - self._stores.unsafe_names
+            self.visit(self._program, live)
+            if not self._changed:
+                break
+
+    def get_reads(self, node):
+        return self._analysis.get_reads(get_usage(node))
+
+    def eliminate_in_list(self, statement_list, live, in_block=True):
+        in_block, self._in_block = self._in_block, in_block
+        result = []
+        for statement in reversed(statement_list):
+            result += reversed(self.visit(statement, live))
+        result.reverse()
+        self._in_block = in_block
+
+        if len(result) != len(statement_list):
+            self.mark_changed()
+        return result
+
+    def generic_visit(self, node, live):
+        live |= self.get_reads(node)
+        return [node]
+
+    def visit_Program(self, node, live):
+        node.statement_list = self.eliminate_in_list(node.statement_list, live, in_block=False)
+        return [node]
+
+    def visit_Block(self, node, live):
+        node.statement_list = self.eliminate_in_list(node.statement_list, live)
+        return [node]
+
+    def visit_CustomFunction(self, node, live):
+        if not self.is_reachable(node.name):
+            self.mark_changed()
+            return []
+
+        # function may be called from any place, which may read any name afterwards
+        self.visit(node.body, set(self.global_reads))
+        return [node]
+
+    def visit_Parallel(self, node, live):
+        # statements are not ordered, so none of them can overwrite value stored by other
+        live_after = live | self.get_reads(node)
+        statement_list = []
+        in_block, self._in_block = self._in_block, False
+        for statement in node.statement_list:
+            statement_list += self.visit(statement, set(live_after))
+        self._in_block = in_block
+
+        if len(statement_list) != len(node.statement_list):
+            self.mark_changed()
+        node.statement_list = statement_list
+
+        if not statement_list:
+            return []
+
+        live |= self.get_reads(node)
+        return [node]
+
+    def visit_RepeatUntil(self, node, live):
+        self.visit(node.block, live | self.get_reads(node))
+        live |= self.get_reads(node)
+        return [node]
+
+    def visit_For(self, node, live):
+        # loop run in parallel way still reports it before checking the condition
+        if is_constant_condition(node.condition, False) and not node.parallel:
+            self.mark_changed()
+            return self.visit(node.initial_assignment, live)
+
+        self.visit(node.block, live | self.get_reads(node))
+        live |= self.get_reads(node)
+        return [node]
+
+    def visit_While(self, node, live):
+        if is_constant_condition(node.condition, False):
+            self.mark_changed()
+            return []
+
+        self.visit(node.block, live | self.get_reads(node))
+        live |= self.get_reads(node)
+        return [node]
+
+    def visit_ConditionalIfElse(self, node, live):
+        if is_constant_condition(node.condition, True):
+            self.mark_changed()
+            return self.visit(ast.ConditionalIf(node.condition, node.block_if), live)
+        elif is_constant_condition(node.condition, False):
+            self.mark_changed()
+            return self.visit(ast.ConditionalIf(ast.Boolean(True), node.block_else), live)
+
+        live_if = set(live)
+        self.visit(node.block_if, live_if)
+        self.visit(node.block_else, live)
+        live |= live_if | self.get_reads(node.condition)
+        return [node]
+
+    def visit_ConditionalIf(self, node, live):
+        if is_constant_condition(node.condition, False):
+            self.mark_changed()
+            return []
+        elif is_constant_condition(node.condition, True) and self._in_block and \
+                not node.statement.get_declared_names():
+            # block without declarations can be executed directly in the current scope
+            self.mark_changed()
+            return self.eliminate_in_list(node.statement.statement_list, live)
+
+        live_if = set(live)
+        self.visit(node.statement, live_if)
+        live |= live_if | self.get_reads(node.condition)
+        return [node]
+
+    def visit_Assignment(self, node, live):
+        if node.name in self.removable_names:
+            self.mark_changed()
+            return []
+
+        # store which may raise does not overwrite value of earlier store
+        if node.index is None and self._stores.is_safe(node):
+            if node.name not in live:
+                self.mark_changed()
+                return []
+            live.discard(node.name)
+
+        live |= self.get_reads(node)
+        return [node]
+
+    def visit_Declaration(self, node, live):
+        if node.name in self.removable_names:
+            self.mark_changed()
+            return []
+
+        safe = self._stores.is_safe(node)
+        if node.name not in live and node.value is not None and safe:
+            self.mark_changed()
+            node.value = None
+
+        if safe:
+            live.discard(node.name)
+        live |= self.get_reads(node)
+        # before the declaration name refers to variable from outer scope
+        if node.name in self.global_reads:
+            live.add(node.name)
+        return [node]
+
+
+class LoopInvariantCodeMotion(NodeVisitor):
+    """Moves computations which give the same result in every iteration to the loop preheader.
+
+    Preheader is executed once, only when the loop body is going to be executed at least once, so
+    moved computations are never evaluated when they would not be evaluated originally. Only
+    statements placed directly in the loop body are considered, as only they are executed in every
+    iteration. Preheader is executed before the body, so only computations which cannot raise are
+    moved, otherwise an error would be reported before effects of statements preceding them, and
+    assignments are moved only when no statement preceding them in the body may raise.
+    Multiplications of integer induction variable of for loop by constant are replaced with
+    a temporary increased together with the variable.
+    """
+
+    TEMPORARY_PREFIX = "$licm"
+    INDUCTION_PREFIX = "$ind"
+
+    def __init__(self, program):
+        self._program = program
+        self._analysis = None
+        self._stores = None
+        self._hoister = InvariantHoister(self)
+        self._loop_writes = set()
+        self._preheader = []
+        self._hoisted = {}
+        self._induction_variable = None
+        self._induction_temporaries = {}
+
+    def run(self):
+        self._analysis = ProgramAnalysis(self._program)
+        self._stores = StoreChecker(self._program)
+        self.visit(self._program)
+
+    def visit_RepeatUntil(self, node):
+        # condition is always checked after preheader
+        node.preheader = self.optimize_loop(node.block, [node.condition])
+
+    def visit_For(self, node):
+        # the first condition check happens before preheader, so it has to use the original condition
+        condition = copy.deepcopy(node.condition)
+        node.preheader = self.optimize_loop(node.block, [condition, node.step_assignment],
+                                            get_induction(node.step_assignment))
+        if node.preheader is not None:
+            node.iteration_condition = condition
+
+    def visit_While(self, node):
+        condition = copy.deepcopy(node.condition)
+        node.preheader = self.optimize_loop(node.block, [condition])
+        if node.preheader is not None:
+            node.iteration_condition = condition
+
+    def optimize_loop(self, block, loop_parts, induction=None):
+        """Returns preheader block for loop with given body and other parts executed in every iteration."""
+        self.visit(block)
+        if not isinstance(block, ast.Block):
+            return None
+
+        self._preheader = []
+        self._hoisted = {}
+
+        loop_usage = Usage()
+        for part in loop_parts:
+            collect_usage(part, loop_usage)
+        parts_writes = set(self._analysis.get_writes(loop_usage))
+        reads_before = set(self._analysis.get_reads(loop_usage))
+        collect_usage(block, loop_usage)
+        self._loop_writes = set(self._analysis.get_writes(loop_usage))
+
+        self.__move_assignments(block, parts_writes, reads_before)
+
+        self._induction_variable = None
+        self._induction_temporaries = {}
+        if induction is not None and induction[0] not in self._analysis.get_writes(get_usage(block)):
+            self._induction_variable = induction
+
+        for statement in block.statement_list:
+            self._hoister.visit(statement)
+
+        if self._induction_temporaries:
+            block.statement_list = block.statement_list + self.__get_induction_updates()
+        self._induction_variable = None
+
+        for part in loop_parts:
+            self._hoister.visit(part)
+
+        if not self._preheader:
+            return None
+        # hoisted expressions are replaced by names of temporaries
+        ast.Node.invalidate_names()
+        return ast.Block(self._preheader)
+
+    def __move_assignments(self, block, parts_writes, reads_before):
+        statements_usage = [get_usage(statement) for statement in block.statement_list]
+        write_counts = {}
+        for usage in statements_usage:
+            for name in self._analysis.get_writes(usage):
+                write_counts[name] = write_counts.get(name, 0) + 1
+
+        remaining = []
+        # assignment following a statement which may raise would be done although the body stops before it
+        may_raise = False
+        for statement, usage in zip(block.statement_list, statements_usage):
+            if not may_raise and \
+                    self.__is_movable_assignment(statement, usage, parts_writes, reads_before, write_counts):
+                self._preheader.append(statement)
+                self._loop_writes.discard(statement.name)
+            else:
+                reads_before |= self._analysis.get_reads(usage)
+                remaining.append(statement)
+                may_raise |= not self._stores.is_safe(statement)
+
+        block.statement_list = remaining
+
+    def __is_movable_assignment(self, statement, usage, parts_writes, reads_before, write_counts):
+        if not isinstance(statement, ast.Assignment) or not self._stores.is_safe(statement):
+            return False
+
+        name = statement.name
+        # value has to be the same in each iteration and no one can see the value from before the loop
+        return write_counts[name] == 1 and name not in parts_writes and name not in reads_before and \
+            not (usage.reads & self._loop_writes)
+
+    def __get_induction_updates(self):
+        _, step = self._induction_variable
+        return [ast.Assignment(temporary, ast.BinaryOperation(
+                    ast.Name(temporary), Parser.operations["+"], ast.Integer(step * factor)))
+                for factor, temporary in self._induction_temporaries.items()]
+
+    def is_invariant_name(self, name):
+        return name not in self._loop_writes
+
+    def hoist(self, expression):
+        if is_leaf(expression):
+            return expression
+        if self._stores.get_type(expression) is None:
+            # parts which cannot raise are still computed once
+            expression.replace_children(self.hoist)
+            return expression
+
+        key = expression_key(expression)
+        if key in self._hoisted:
+            return ast.Name(self._hoisted[key])
+
+        name = new_temporary_name(self.TEMPORARY_PREFIX)
+        self._preheader.append(ast.Declaration(name, None, expression))
+        if key is not None:
+            self._hoisted[key] = name
+        return ast.Name(name)
+
+    def process(self, expression):
+        """Returns expression to be used in place of given one and whether it is loop invariant."""
+        reduced = self.__reduce_strength(expression)
+        if reduced is not None:
+            return reduced, False
+        return expression, self._hoister.visit(expression)
+
+    def process_root(self, expression):
+        expression, invariant = self.process(expression)
+        return self.hoist(expression) if invariant else expression
+
+    def __reduce_strength(self, expression):
+        if self._induction_variable is None or not isinstance(expression, ast.BinaryOperation) or \
+                expression.operation is not operator.mul:
+            return None
+
+        name, _ = self._induction_variable
+        variable, factor = expression.left, expression.right
+        if isinstance(variable, ast.Integer):
+            variable, factor = factor, variable
+        if not (isinstance(variable, ast.Name) and variable.name == name and variable.index is None and
+                isinstance(factor, ast.Integer) and self._stores.get_type(variable) is int):
+            return None
+
+        # temporary keeps value of variable * factor and is increased together with the variable
+        if factor.value not in self._induction_temporaries:
+            temporary = new_temporary_name(self.INDUCTION_PREFIX)
+            self._induction_temporaries[factor.value] = temporary
+            self._preheader.append(ast.Declaration(temporary, None, ast.BinaryOperation(
+                ast.Name(name), Parser.operations["*"], ast.Integer(factor.value))))
+        return ast.Name(self._induction_temporaries[factor.value])
+
+
+class InvariantHoister(NodeVisitor):
+    """Replaces loop invariant parts of visited statement with temporaries computed in preheader.
+
+    Visiting an expression returns whether it is loop invariant as a whole, in which case it is
+    left to the caller to hoist it together with the enclosing expression.
+    """
+
+    def __init__(self, licm):
+        self._licm = licm
+
+    def generic_visit(self, node):
+        return False
+
+    def visit_Print(self, node):
+        node.expression = self._licm.process_root(node.expression)
+        return False
+
+    def visit_Assignment(self, node):
+        node.value = self._licm.process_root(node.value)
+        return False
+
+    def visit_Declaration(self, node):
+        if node.value is not None:
+            node.value = self._licm.process_root(node.value)
+        return False
+
+    def visit_CallArgumentList(self, node):
+        arguments = node.arguments
+        invariants = []
+        for index, argument in enumerate(arguments):
+            arguments[index], invariant = self._licm.process(argument)
+            invariants.append(invariant)
+
+        if all(invariants):
+            return True
+
+        for index, invariant in enumerate(invariants):
+            if invariant:
+                arguments[index] = self._licm.hoist(arguments[index])
+        return False
+
+    def visit_Call(self, node):
+        if self.visit(node.arg_list):
+            arguments = node.arg_list.arguments
+            for index, argument in enumerate(arguments):
+                arguments[index] = self._licm.hoist(argument)
+        return False
+
+    def visit_BuiltInFunction(self, node):
+        return self.visit(node.arguments) and node.built_in.pure
+
+    def visit_Minus(self, node):
+        node.value, invariant = self._licm.process(node.value)
+        return invariant
+
+    def visit_Conversion(self, node):
+        node.value, invariant = self._licm.process(node.value)
+        return invariant
+
+    def visit_BinaryOperation(self, node):
+        node.left, left_invariant = self._licm.process(node.left)
+        node.right, right_invariant = self._licm.process(node.right)
+        if left_invariant and right_invariant:
+            return True
+
+        if left_invariant:
+            node.left = self._licm.hoist(node.left)
+        if right_invariant:
+            node.right = self._licm.hoist(node.right)
+        return False
+
+    def visit_Real(self, node):
+        return True
+
+    def visit_Integer(self, node):
+        return True
+
+    def visit_Boolean(self, node):
+        return True
+
+    def visit_String(self, node):
+        return True
+
+    def visit_Name(self, node):
+        return node.index is None and self._licm.is_invariant_name(node.name)
+
+
+COMMUTATIVE_OPERATIONS = {operator.mul, operator.eq, operator.ne, operator.and_, operator.or_, operator.xor}
+
+
+class ExpressionKey(NodeVisitor):
+    """Returns structural key of pure expression which may be shared or None"""
+
+    def generic_visit(self, node):
+        return None
+
+    def visit_BinaryOperation(self, node):
+        keys = [self.visit(node.left), self.visit(node.right)]
+        if None in keys:
+            return None
+        if node.operation in COMMUTATIVE_OPERATIONS:
+            keys.sort(key=repr)
+        return ("binary", node.operation.__name__) + tuple(keys)
+
+    def visit_Minus(self, node):
+        key = self.visit(node.value)
+        return None if key is None else ("minus", key)
+
+    def visit_Conversion(self, node):
+        key = self.visit(node.value)
+        return None if key is None else ("conversion", node.type_from, node.operation, key)
+
+    def visit_BuiltInFunction(self, node):
+        if not node.built_in.pure:
+            return None
+        keys = tuple(self.visit(argument) for argument in node.arguments.arguments)
+        return None if None in keys else ("builtin", node.built_in.name) + keys
+
+    def visit_Real(self, node):
+        return "real", repr(node.value)
+
+    def visit_Integer(self, node):
+        return "integer", node.value
+
+    def visit_Boolean(self, node):
+        return "boolean", node.value
+
+    def visit_String(self, node):
+        return "string", node.value
+
+    def visit_Name(self, node):
+        return ("name", node.name) if node.index is None else None
+
+
+def expression_key(expression):
+    return ExpressionKey().visit(expression)
+
+
+class AvailableExpression:
+    def __init__(self, expression, names):
+        self.expression = expression
+        self.names = names
+        self.temporary = None
+
+
+class CommonSubexpressionEliminator(NodeVisitor):
+    """Computes repeated pure expressions once and keeps their values in temporaries.
+
+    Expressions are available for statements following the one which evaluated them, including
+    nested blocks, until any of the names they use is written; calls may write any name. First
+    occurrence saves its value and later ones read it. Occurrences keep the original expression
+    and evaluate it if saving statement failed before the value was saved.
+
+    Statements are visited in execution order, found occurrences are replaced afterwards by
+    SubexpressionSharer.
+    """
+
+    TEMPORARY_PREFIX = "$cse"
+
+    def __init__(self, program):
+        self._program = program
+        self._available = {}
+        # ids of nodes which save or read temporaries, nodes define equality structurally
+        self._saved = {}
+        self._reused = {}
+
+    def run(self):
+        self.visit(self._program)
+        if self._reused:
+            SubexpressionSharer(self._saved, self._reused).visit(self._program)
+
+    def generic_visit(self, node):
+        self.kill(get_usage(node))
+
+    def visit_Program(self, node):
+        self.find_in_list(node.statement_list)
+
+    def visit_Block(self, node):
+        self.find_in_list(node.statement_list)
+
+    def visit_CustomFunction(self, node):
+        available = self._available
+        self._available = {}
+        self.visit(node.body)
+        self._available = available
+
+    def visit_Print(self, node):
+        self.find_in_statement(node, [node.expression])
+
+    def visit_Assignment(self, node):
+        if node.index is None:
+            self.find_in_statement(node, [node.value])
+        else:
+            self.kill(get_usage(node))
+
+    def visit_Declaration(self, node):
+        if node.array_size is None and node.value is not None:
+            self.find_in_statement(node, [node.value])
+        else:
+            self.kill(get_usage(node))
+
+    def visit_ConditionalIf(self, node):
+        self.find_in_statement(node, [node.condition], [node.statement])
+
+    def visit_ConditionalIfElse(self, node):
+        self.find_in_statement(node, [node.condition], [node.block_if, node.block_else])
+
+    def visit_RepeatUntil(self, node):
+        self.find_in_loop(node, node.block, node.preheader)
+
+    def visit_For(self, node):
+        # parallel loop body is executed in threads, temporaries would be shared between them
+        self.find_in_loop(node, None if node.parallel else node.block, node.preheader)
+
+    def visit_While(self, node):
+        self.find_in_loop(node, node.block, node.preheader)
+
+    def find_in_list(self, statement_list):
+        for statement in statement_list:
+            self.visit(statement)
+
+    def find_in_nested(self, statement):
+        available = self._available
+        self._available = dict(available)
+        self.visit(statement)
+        self._available = available
+
+    def find_in_loop(self, loop, block, preheader):
+        # names written in any iteration cannot be used by expressions reaching the loop body
+        usage = get_usage(loop)
+        available = self._available
+        self.kill(usage)
+        for statement in (preheader, block):
+            if statement is not None:
+                self.find_in_nested(statement)
+        self._available = available
+        self.kill(usage)
+
+    def find_in_statement(self, statement, expressions, nested=()):
+        usage = get_usage(statement)
+        if not all(is_pure(expression) for expression in expressions):
+            self.kill(usage)
+            return
+
+        for expression in expressions:
+            self.find_in_expression(expression)
+        for nested_statement in nested:
+            self.find_in_nested(nested_statement)
+        self.kill(usage)
+
+    def find_in_expression(self, expression):
+        key = expression_key(expression)
+        if key is None or is_leaf(expression):
+            for subexpression in get_subexpressions(expression):
+                self.find_in_expression(subexpression)
+            return
+
+        available = self._available.get(key)
+        if available is not None:
+            if available.temporary is None:
+                available.temporary = new_temporary_name(self.TEMPORARY_PREFIX)
+                self._saved[available.expression.id] = available.temporary
+            self._reused[expression.id] = available.temporary
+            return
+
+        self._available[key] = AvailableExpression(expression, get_usage(expression).reads)
+        for subexpression in get_subexpressions(expression):
+            self.find_in_expression(subexpression)
+
+    def kill(self, usage):
+        if usage.calls:
+            self._available = {}
+            return
+
+        self._available = {key: available for key, available in self._available.items()
+                           if not available.names & usage.writes}
+
+
+class SubexpressionSharer(NodeTransformer):
+    """Replaces found occurrences of common subexpressions with nodes saving or reading temporaries"""
+
+    def __init__(self, saved, reused):
+        self._saved = saved
+        self._reused = reused
+
+    def generic_visit(self, node):
+        temporary = self._reused.get(node.id)
+        if temporary is not None:
+            return ast.TemporaryName(temporary, node)
+
+        super().generic_visit(node)
+        temporary = self._saved.get(node.id)
+        if temporary is not None:
+            return ast.TemporaryAssignment(temporary, node)
+        return node
+
+
+def get_subexpressions(expression):
+    # indices are not shared, as names with them are not pure expressions
+    return [] if isinstance(expression, ast.Name) else expression.children()
+
+
+def get_induction(step_assignment):
+    """Returns name and constant step of variable changed by for loop step, if it is induction variable."""
+    value = step_assignment.value
+    if step_assignment.index is not None or not isinstance(value, ast.BinaryOperation):
+        return None
+
+    variable, step = value.left, value.right
+    if value.operation is operator.add and isinstance(variable, ast.Integer):
+        variable, step = step, variable
+    elif value.operation is not operator.sub and value.operation is not operator.add:
+        return None
+
+    if not (isinstance(variable, ast.Name) and variable.name == step_assignment.name and
+            variable.index is None and isinstance(step, ast.Integer)):
+        return None
+
+    return variable.name, step.value if value.operation is operator.add else -step.value
+
+
+def is_leaf(expression):
+    return isinstance(expression, (ast.Name, ast.Integer, ast.Real, ast.Boolean, ast.String))
+
+
+def new_temporary_name(prefix):
+    # names with prefixes not allowed by lexer cannot collide with names from the code
+    return "{}{}".format(prefix, next(temporary_counter))
+
+
+temporary_counter = itertools.count()
+
+
+def optimize(program, keep_names=False):
+    DeadCodeEliminator(program, keep_names).run()
+    LoopInvariantCodeMotion(program).run()
+    CommonSubexpressionEliminator(program).run()
@@ -0,0 +1,72 @@
+import os
+import sys
+import threading
+
+DEFAULT_BUFFER_SIZE = 65536
+
+
+def print_line(value, output=None):
+    """Writes value with new line in a single write, so lines printed by parallel threads are not mixed"""
+    (output if output is not None else sys.stdout).write(str(value) + "\n")
+
+
+class BufferedOutput:
+    """File object collecting written text and writing it in batches.
+
+    Text is written to given file object, standard output by default, or directly to given file
+    descriptor when the buffer holds at least buffer_size characters, on flush and on close. With zero
+    size every write is passed at once. Writes are serialized, so text of a single write, like a printed
+    line, is never mixed with text of other threads and all of them appear in order of writing.
+    """
+
+    def __init__(self, file=None, fd=None, buffer_size=DEFAULT_BUFFER_SIZE, encoding="utf-8"):
+        self._file = file
+        self._fd = fd
+        self._buffer_size = buffer_size
+        self._encoding = encoding
+        self._parts = []
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def buffer_size(self):
+        return self._buffer_size
+
+    def write(self, text):
+        with self._lock:
+            self._parts.append(text)
+            self._size += len(text)
+            if self._size >= self._buffer_size:
+                self.__write_buffer()
+        return len(text)
+
+    def flush(self):
+        with self._lock:
+            self.__write_buffer()
+            if self._fd is None:
+                (self._file if self._file is not None else sys.stdout).flush()
+
+    def close(self):
+        self.flush()
+
+    def __write_buffer(self):
+        if not self._parts:
+            return
+
+        text = "".join(self._parts)
+        self._parts = []
+        self._size = 0
+        if self._fd is None:
+            (self._file if self._file is not None else sys.stdout).write(text)
+            return
+
+        data = text.encode(self._encoding)
+        while data:
+            written = os.write(self._fd, data)
+            data = data[written:]
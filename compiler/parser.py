@@ -1,10 +1,12 @@
-import math
+import copy
 import operator
+import re
 
 import ply.yacc as yacc
-from scipy.special import jv
 
 from compiler import ast
+from compiler.built_ins import built_ins
+from compiler.simplifier import Simplifier
 
 
 class Parser:
@@ -38,19 +40,6 @@ class Parser:
         "^": (operator.xor, True)
     }
 
-    built_in_functions = {
-        "sin": math.sin,
-        "cos": math.cos,
-        "tan": math.tan,
-        "asin": math.asin,
-        "acos": math.acos,
-        "atan": math.atan,
-        "exp": math.exp,
-        "log": math.log,
-        "sqrt": math.sqrt,
-        "j": jv
-    }
-
     types = {
         "int": int,
         "real": float,
@@ -82,20 +71,38 @@ class Parser:
 
     def __init__(self, tokens):
         self._yacc = None
+        self._output = None
+        self._simplifier = Simplifier(self.operations, self.python_types_to_ast)
         self.tokens = tokens
 
-    @staticmethod
-    def is_number(element):
-        return isinstance(element, (ast.Integer, ast.Real))
-
-    @staticmethod
-    def is_simple_value(element):
-        return isinstance(element, (ast.Integer, ast.Real, ast.String, ast.Boolean))
-
     @property
     def yacc(self):
         return self._yacc
 
+    @property
+    def output(self):
+        """File object receiving messages about syntax errors, standard output when None"""
+        return self._output
+
+    @output.setter
+    def output(self, output):
+        self._output = output
+
+    @staticmethod
+    def position(p, index):
+        """Returns line and column of the given symbol, which has to be a token"""
+        lexpos = p.lexpos(index)
+        line_start = p.lexer.lexdata.rfind("\n", 0, lexpos)
+        column = lexpos - line_start
+        # parsed text may start inside of a source line
+        return p.lineno(index), column + p.lexer.first_column if line_start == -1 else column
+
+    @staticmethod
+    def located(node, position):
+        """Returns node marked with the source position it starts at"""
+        node.position = position
+        return node
+
     def p_program(self, p):
         """program : statement_set"""
         p[0] = ast.Program(p[1])
@@ -114,112 +121,130 @@ class Parser:
 
     def p_block(self, p):
         """block : '{' statement_set '}'"""
-        p[0] = ast.Block(p[2])
+        p[0] = self.located(ast.Block(p[2]), self.position(p, 1))
 
+    # lists are left-recursive, so they are built in linear time with bounded parser stack
     def p_statement_set(self, p):
-        """statement_set : statement ';' statement_set
+        """statement_set : statement_set statement ';'
                          | statement ';'"""
         if len(p) == 3:
             p[0] = [p[1]]
         else:
-            p[0] = [p[1]] + p[3]
+            p[1].append(p[2])
+            p[0] = p[1]
 
     def p_arglist(self, p):
-        """arglist : func_arg
-                   | func_arg ',' arglist
+        """arglist : func_args
                    |"""
         if len(p) == 2:
-            p[0] = ast.FunctionArgumentList([p[1]])
-        elif len(p) == 1:
+            p[0] = p[1]
+        else:
             p[0] = ast.FunctionArgumentList([])
+
+    def p_func_args(self, p):
+        """func_args : func_args ',' func_arg
+                     | func_arg"""
+        if len(p) == 2:
+            p[0] = self.located(ast.FunctionArgumentList([p[1]]), p[1].position)
         else:
-            p[3].append_argument(p[1])
-            p[0] = p[3]
+            p[1].append_argument(p[3])
+            p[0] = p[1]
 
     def p_func_arg(self, p):
         """func_arg : TYPE NAME"""
-        p[0] = ast.FunctionArgument(self.types[p[1]], p[2])
+        p[0] = self.located(ast.FunctionArgument(self.types[p[1]], p[2]), self.position(p, 1))
 
     def p_procedure(self, p):
         """procedure : PROCEDURE NAME '(' arglist ')' block"""
-        p[0] = ast.CustomFunction(p[2], p[4], p[6])
+        p[0] = self.located(ast.CustomFunction(p[2], p[4], p[6]), self.position(p, 1))
 
     def p_customfunc(self, p):
         """customfunc : CUSTOMFUNC NAME '(' arglist ')' block RETURN expression"""
-        p[0] = ast.CustomFunction(p[2], p[4], p[6], p[8])
+        p[0] = self.located(ast.CustomFunction(p[2], p[4], p[6], p[8]), self.position(p, 1))
 
     def p_print(self, p):
         """print : PRINT '(' expression ')' """
-        p[0] = ast.Print(p[3])
+        p[0] = self.located(ast.Print(p[3]), self.position(p, 1))
 
     def p_parallel(self, p):
         """parallel : PARALLEL '(' statement_set ')'"""
-        p[0] = ast.Parallel(p[3])
+        p[0] = self.located(ast.Parallel(p[3]), self.position(p, 1))
 
     def p_repeat_until(self, p):
         """loop : REPEAT statement UNTIL '(' expression ')'
                 | REPEAT block UNTIL '(' expression ')'"""
-        p[0] = ast.RepeatUntil(p[2], p[5])
+        p[0] = self.located(ast.RepeatUntil(p[2], p[5]), self.position(p, 1))
 
     def p_for(self, p):
         """loop : FOR '(' assignment ';' expression ';' assignment ')' statement
                 | FOR '(' assignment ';' expression ';' assignment ')' block"""
-        p[0] = ast.For(p[3], p[5], p[7], p[9])
+        p[0] = self.located(ast.For(p[3], p[5], p[7], p[9]), self.position(p, 1))
 
     def p_while(self, p):
         """loop : WHILE '(' expression ')' statement
                 | WHILE '(' expression ')' block"""
-        p[0] = ast.While(p[3], p[5])
+        p[0] = self.located(ast.While(p[3], p[5]), self.position(p, 1))
 
     def p_if_else_conditional(self, p):
         """conditional : IF '(' expression ')' block ELSE block"""
-        p[0] = ast.ConditionalIfElse(p[3], p[5], p[7])
+        p[0] = self.located(ast.ConditionalIfElse(p[3], p[5], p[7]), self.position(p, 1))
 
     def p_if_conditional(self, p):
         """conditional : IF '(' expression ')' block %prec IFX"""
-        p[0] = ast.ConditionalIf(p[3], p[5])
+        p[0] = self.located(ast.ConditionalIf(p[3], p[5]), self.position(p, 1))
 
     def p_call_args(self, p):
-        """call_args : expression
-                     | expression ',' call_args
+        """call_args : expressions
                      |"""
-        if len(p) == 1:
+        if len(p) == 2:
+            p[0] = p[1]
+        else:
             p[0] = ast.CallArgumentList([])
-        elif len(p) == 2:
-            p[0] = ast.CallArgumentList([p[1]])
+
+    def p_expressions(self, p):
+        """expressions : expressions ',' expression
+                       | expression"""
+        if len(p) == 2:
+            p[0] = self.located(ast.CallArgumentList([p[1]]), p[1].position)
         else:
-            p[3].append_argument(p[1])
-            p[0] = p[3]
+            p[1].append_argument(p[3])
+            p[0] = p[1]
 
     def p_expression_call(self, p):
         """expression : NAME '(' call_args ')'"""
-        p[0] = ast.Call(p[1], p[3])
+        p[0] = self.located(ast.Call(p[1], p[3]), self.position(p, 1))
 
     def p_expression_prefix(self, p):
         """expression : INCR NAME
                       | DECR NAME"""
-        p[0] = ast.PreFixExpression(p[2], p[1])
+        p[0] = self.located(ast.PreFixExpression(p[2], p[1]), self.position(p, 1))
 
     def p_expression_postfix(self, p):
         """expression : NAME INCR
                       | NAME DECR"""
-        p[0] = ast.PostFixExpression(p[1], p[2])
+        p[0] = self.located(ast.PostFixExpression(p[1], p[2]), self.position(p, 1))
 
     def p_expression_function(self, p):
         """expression : FUNCTION '(' call_args ')'"""
-        p[0] = ast.BuiltInFunction(self.built_in_functions[p[1]], p[3])
+        built_in = built_ins.get(p[1])
+        if len(p[3].arguments) != built_in.arity:
+            print("Wrong number of arguments of '{}', expected {} given {}"
+                  .format(built_in.name, built_in.arity, len(p[3].arguments)), file=self._output)
+            raise SyntaxError
+        function = ast.BuiltInFunction(built_in, p[3])
+        p[0] = self.located(self._simplifier.rewrite(function), self.position(p, 1))
 
     def p_assignment(self, p):
         """assignment : NAME ASSIGN expression
                       | NAME array_size ASSIGN expression"""
         if len(p) == 4:
-            p[0] = ast.Assignment(p[1], p[3])
+            p[0] = self.located(ast.Assignment(p[1], p[3]), self.position(p, 1))
         elif len(p) == 5:
-            p[0] = ast.Assignment(p[1], p[4], index=p[2])
+            p[0] = self.located(ast.Assignment(p[1], p[4], index=p[2]), self.position(p, 1))
 
     def p_expression_uminus(self, p):
         """expression : SUB expression %prec UMINUS"""
-        p[0] = ast.Minus(p[2])
+        p[0] = self.located(self._simplifier.rewrite(ast.Minus(p[2])), self.position(p, 1))
 
     def p_expression_group(self, p):
         """expression : '(' expression ')'"""
@@ -228,13 +253,16 @@ class Parser:
     def p_declaration(self, p):
         """declaration : TYPE NAME
                        | TYPE NAME array_size
-                       | TYPE NAME ASSIGN expression"""
+                       | TYPE NAME ASSIGN expression
+                       | TYPE NAME array_size ASSIGN expression"""
         if len(p) == 3:
-            p[0] = ast.Declaration(p[2], self.types[p[1]])
+            p[0] = self.located(ast.Declaration(p[2], self.types[p[1]]), self.position(p, 1))
         elif len(p) == 4:
-            p[0] = ast.Declaration(p[2], self.types[p[1]], array_size=p[3])
+            p[0] = self.located(ast.Declaration(p[2], self.types[p[1]], array_size=p[3]), self.position(p, 1))
         elif len(p) == 5:
-            p[0] = ast.Declaration(p[2], self.types[p[1]], p[4])
+            p[0] = self.located(ast.Declaration(p[2], self.types[p[1]], p[4]), self.position(p, 1))
+        elif len(p) == 6:
+            p[0] = self.located(ast.Declaration(p[2], self.types[p[1]], p[5], array_size=p[3]), self.position(p, 1))
 
     def p_array_size(self, p):
         """array_size : '[' expression ']'
@@ -258,7 +286,7 @@ class Parser:
                       | STRTOREAL '(' expression ')'
                       | STRTOBOOLEAN '(' expression ')'"""
         conversion = self.conversions[p[1]]
-        p[0] = ast.Conversion(conversion[0], conversion[1], p[3])
+        p[0] = self.located(ast.Conversion(conversion[0], conversion[1], p[3]), self.position(p, 1))
 
     def p_expression_binop(self, p):
         """expression : expression ADD expression
@@ -276,104 +304,129 @@ class Parser:
                       | expression AND expression
                       | expression OR expression
                       | expression XOR expression"""
-        left = p[1]
-        right = p[3]
-
-        # operation between two constants
-        if Parser.is_simple_value(left) and Parser.is_simple_value(right) and type(left) == type(right):
-            if isinstance(left, ast.Boolean):
-                if p[2] == "+":
-                    p[2] = "|"
-                elif p[2] == "*":
-                    p[2] = "&"
-
-            result = self.operations[p[2]][0](left.value, right.value)
-            result_type = self.python_types_to_ast[type(result)]
-            p[0] = result_type(result)
-            return
-
-        elif p[2] == "+" or p[2] == "-":
-            # 0 + x = x or 0 - x = -x
-            if Parser.is_number(left) and left.value == 0:
-                p[0] = right if p[2] == "+" else ast.Minus(right)
-                return
-            # x +/- 0 = x
-            elif Parser.is_number(right) and right.value == 0:
-                p[0] = left
-                return
-
-        elif p[2] == "*":
-            # 1 * x = x
-            if Parser.is_number(left) and left.value == 1:
-                p[0] = right
-                return
-            # x * 1 = x
-            elif Parser.is_number(right) and right.value == 1:
-                p[0] = left
-                return
-            # x * 0 = 0 * x = 0
-            elif (Parser.is_number(left) and left.value == 0) or (Parser.is_number(right) and right.value == 0):
-                p[0] = ast.Integer(0)
-                return
-            # x * 2 = x + x
-            elif Parser.is_number(right) and right.value == 2:
-                p[0] = ast.BinaryOperation(left, self.operations["+"], left)
-                return
-            # 2 * x = x + x
-            elif Parser.is_number(left) and left.value == 2:
-                p[0] = ast.BinaryOperation(right, self.operations["+"], right)
-                return
-
-        elif p[2] == "/":
-            # x / 1 = x
-            if Parser.is_number(right) and right.value == 1:
-                p[0] = left
-                return
-            # x / 2 = 0.5 * x
-            elif Parser.is_number(right) and right.value == 2:
-                p[0] = ast.BinaryOperation(left, self.operations["*"], ast.Real(0.5))
-                return
-
-        elif p[2] == "**":
-            # x ** 2 = x * x
-            if Parser.is_number(right) and right.value == 2:
-                p[0] = ast.BinaryOperation(left, self.operations["*"], left)
-                return
-
-        p[0] = ast.BinaryOperation(left, self.operations[p[2]], right)
+        binary_operation = ast.BinaryOperation(p[1], self.operations[p[2]], p[3])
+        p[0] = self.located(self._simplifier.rewrite(binary_operation), p[1].position)
 
     def p_expression_real(self, p):
         """expression : REAL"""
-        p[0] = ast.Real(p[1])
+        p[0] = self.located(ast.Real(p[1]), self.position(p, 1))
 
     def p_expression_integer(self, p):
         """expression : INTEGER"""
-        p[0] = ast.Integer(p[1])
+        p[0] = self.located(ast.Integer(p[1]), self.position(p, 1))
 
     def p_expression_boolean(self, p):
         """expression : BOOLEAN"""
-        p[0] = ast.Boolean(p[1])
+        p[0] = self.located(ast.Boolean(p[1]), self.position(p, 1))
 
     def p_expression_string(self, p):
         """expression : STRING"""
-        p[0] = ast.String(p[1])
+        p[0] = self.located(ast.String(p[1]), self.position(p, 1))
 
     def p_expression_name(self, p):
         """expression : NAME
                       | NAME array_size"""
         if len(p) == 2:
-            p[0] = ast.Name(p[1])
+            p[0] = self.located(ast.Name(p[1]), self.position(p, 1))
         elif len(p) == 3:
-            p[0] = ast.Name(p[1], p[2])
+            p[0] = self.located(ast.Name(p[1], p[2]), self.position(p, 1))
 
     def p_error(self, p):
         if p:
-            print("Syntax error at '%s'" % p.value)
+            print("Syntax error at '%s'" % p.value, file=self._output)
         else:
-            print("Syntax error at EOF")
+            print("Syntax error at EOF", file=self._output)
 
     def build(self, **kwargs):
         self._yacc = yacc.yacc(module=self, **kwargs)
 
-    def parse(self, lexer, text):
+    def clone(self):
+        """Returns parser with own parsing state, sharing tables built by this one"""
+        parser = copy.copy(self)
+        parser._yacc = copy.copy(self._yacc)
+        parser._yacc.errorfunc = parser.p_error
+        return parser
+
+    def parse(self, lexer, text, first_line=1, first_column=0):
+        """Parses text starting at given line and after given number of characters of that line"""
+        lexer.lexer.lineno = first_line
+        lexer.lexer.first_column = first_column
         return self._yacc.parse(text, lexer=lexer.lexer)
+
+    def parse_stream(self, lexer, chunks):
+        """Yields top-level statements of code given in chunks as soon as each of them is complete.
+
+        Every statement is parsed separately, so memory used does not depend on length of the code.
+        Statements with syntax errors are reported and skipped.
+        """
+        reader = StatementReader()
+        line, column = 1, 0
+        for chunk in chunks:
+            for text in reader.feed(chunk):
+                yield from self.__parse_statement(lexer, text, line, column)
+                line += text.count("\n")
+                line_start = text.rfind("\n")
+                column = column + len(text) if line_start == -1 else len(text) - line_start - 1
+
+        rest = reader.finish()
+        if rest is not None:
+            yield from self.__parse_statement(lexer, rest, line, column)
+
+    def __parse_statement(self, lexer, text, line, column):
+        program = self.parse(lexer, text, line, column)
+        if program is not None:
+            yield from program.statement_list
+
+
+class StatementReader:
+    """Splits code given in chunks into texts of complete top-level statements.
+
+    Top-level statement ends with ';' placed outside of brackets and strings. Strings are the only
+    tokens which may contain brackets or semicolons, so code can be split before lexing.
+    """
+
+    SPECIAL_CHARACTERS = re.compile(r"""[;(){}\[\]'"]""")
+
+    def __init__(self):
+        self._pending = []
+        self._depth = 0
+        self._quote = None
+
+    def feed(self, chunk):
+        position = 0
+        start = 0
+        while position < len(chunk):
+            if self._quote is not None:
+                end = chunk.find(self._quote, position)
+                if end == -1:
+                    break
+                self._quote = None
+                position = end + 1
+                continue
+
+            match = self.SPECIAL_CHARACTERS.search(chunk, position)
+            if match is None:
+                break
+            character = match.group()
+            position = match.end()
+
+            if character in "'\"":
+                self._quote = character
+            elif character in "({[":
+                self._depth += 1
+            elif character in ")}]":
+                # unbalanced brackets are reported by parser
+                self._depth = max(self._depth - 1, 0)
+            elif self._depth == 0:
+                self._pending.append(chunk[start:position])
+                start = position
+                yield "".join(self._pending)
+                self._pending = []
+
+        self._pending.append(chunk[start:])
+
+    def finish(self):
+        """Returns text left after the last complete statement, if it is not blank."""
+        rest = "".join(self._pending)
+        self._pending = []
+        return rest if rest.strip() else None
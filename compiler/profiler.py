@@ -0,0 +1,163 @@
+import threading
+import time
+
+from compiler import ast
+
+
+class Frame:
+    __slots__ = ("path", "line", "children_time")
+
+    def __init__(self, path, line):
+        self.path = path
+        self.line = line
+        self.children_time = 0.0
+
+
+class Statistics:
+    __slots__ = ("calls", "total_time", "self_time")
+
+    def __init__(self):
+        self.calls = 0
+        self.total_time = 0.0
+        self.self_time = 0.0
+
+
+class Profiler:
+    """Measures execution of nodes of instrumented programs.
+
+    Nodes of an instrumented program get subclasses of their node classes, whose execute methods
+    collect number of calls, total and self time per node type and per source line, so other programs
+    run unchanged code. Nodes without line are counted in the line of the closest enclosing node. Time
+    of recursive calls is added to total time only once. Self time is also collected per stack of
+    executed nodes, which gives collapsed stacks for flame graphs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._classes = {}
+        self._instrumented = []
+        self._node_types = {}
+        self._lines = {}
+        self._stacks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.restore()
+
+    def instrument(self, program):
+        """Makes nodes of given program measured, including nodes kept only by other nodes' attributes"""
+        pending, visited = [program], set()
+        while pending:
+            node = pending.pop()
+            if id(node) in visited:
+                continue
+            visited.add(id(node))
+            self._instrumented.append((node, node.__class__))
+            node.__class__ = self.__profiled_class(node.__class__)
+
+            for slot in ast.get_slots(node.__class__):
+                value = getattr(node, slot, None)
+                if isinstance(value, list):
+                    pending.extend(element for element in value if isinstance(element, ast.Node))
+                elif isinstance(value, ast.Node):
+                    pending.append(value)
+
+    def restore(self):
+        """Gives instrumented nodes their original classes back"""
+        for node, node_class in self._instrumented:
+            node.__class__ = node_class
+        self._instrumented = []
+
+    def __profiled_class(self, node_class):
+        profiled_class = self._classes.get(node_class)
+        if profiled_class is None:
+            node_type, execute = node_class.__name__, node_class.execute
+
+            def profiled_execute(node, scope, opt):
+                return self.__call(node, node_type, execute, scope, opt)
+
+            # empty slots keep layout of the node class, so classes of existing nodes can be changed
+            profiled_class = type(node_type, (node_class,), {"__slots__": (), "execute": profiled_execute})
+            self._classes[node_class] = profiled_class
+        return profiled_class
+
+    def __thread_state(self):
+        state = getattr(self._local, "state", None)
+        if state is None:
+            # stack of frames and numbers of active calls of node types and lines
+            state = self._local.state = ([], {}, {})
+        return state
+
+    def __call(self, node, node_type, execute, scope, opt):
+        stack, active_types, active_lines = self.__thread_state()
+        parent = stack[-1] if stack else None
+        line = node.line if node.line is not None else (parent.line if parent is not None else None)
+        label = node_type if node.position is None else "{}:{}:{}".format(node_type, *node.position)
+        frame = Frame(label if parent is None else parent.path + ";" + label, line)
+
+        stack.append(frame)
+        active_types[node_type] = active_types.get(node_type, 0) + 1
+        entered_line = line is not None and active_lines.get(line, 0) == 0
+        active_lines[line] = active_lines.get(line, 0) + 1
+        start = time.perf_counter()
+        try:
+            return execute(node, scope, opt)
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            active_types[node_type] -= 1
+            active_lines[line] -= 1
+            if parent is not None:
+                parent.children_time += elapsed
+            self.__record(frame, node_type, elapsed, active_types[node_type] == 0, entered_line)
+
+    def __record(self, frame, node_type, elapsed, outermost_type, entered_line):
+        self_time = elapsed - frame.children_time
+        with self._lock:
+            statistics = self._node_types.get(node_type)
+            if statistics is None:
+                statistics = self._node_types[node_type] = Statistics()
+            statistics.calls += 1
+            statistics.self_time += self_time
+            if outermost_type:
+                statistics.total_time += elapsed
+
+            if frame.line is not None:
+                statistics = self._lines.get(frame.line)
+                if statistics is None:
+                    statistics = self._lines[frame.line] = Statistics()
+                statistics.self_time += self_time
+                if entered_line:
+                    statistics.calls += 1
+                    statistics.total_time += elapsed
+
+            self._stacks[frame.path] = self._stacks.get(frame.path, 0.0) + self_time
+
+    @property
+    def node_types(self):
+        return self._node_types
+
+    @property
+    def lines(self):
+        return self._lines
+
+    def format_table(self):
+        rows = ["{:<24} {:>10} {:>12} {:>12}".format("Node type", "Calls", "Total [s]", "Self [s]")]
+        for node_type, statistics in sorted(self._node_types.items(), key=lambda item: -item[1].self_time):
+            rows.append("{:<24} {:>10} {:>12.6f} {:>12.6f}".format(node_type, statistics.calls,
+                                                                    statistics.total_time, statistics.self_time))
+        rows.append("")
+        rows.append("{:<24} {:>10} {:>12} {:>12}".format("Line", "Entries", "Total [s]", "Self [s]"))
+        for line, statistics in sorted(self._lines.items(), key=lambda item: -item[1].total_time):
+            rows.append("{:<24} {:>10} {:>12.6f} {:>12.6f}".format(line, statistics.calls,
+                                                                    statistics.total_time, statistics.self_time))
+        return "\n".join(rows)
+
+    def write_collapsed_stacks(self, file_name):
+        """Writes self time of every stack in microseconds, in format read by flamegraph.pl"""
+        with open(file_name, "w") as output_file:
+            for path, self_time in sorted(self._stacks.items()):
+                output_file.write("{} {}\n".format(path, int(round(self_time * 1e6))))
@@ -0,0 +1,73 @@
+import io
+import os
+import socketserver
+import stat
+
+from compiler.client import END_OF_RESPONSE, EXIT_COMMAND
+from compiler.interpreter import Interpreter
+from compiler.names import Budget, Scope
+
+
+class ReplSession(socketserver.StreamRequestHandler):
+    """Console of a single client, every received line is run like a line of the interactive console.
+
+    Output, syntax and runtime errors of a line are sent back followed by END_OF_RESPONSE. Names and
+    functions declared by the client are kept in its own scope until it disconnects or sends exit.
+    Every line is limited by the budget of the server, when it has one.
+    """
+
+    def handle(self):
+        reader = io.TextIOWrapper(self.rfile, encoding="utf-8", newline="\n")
+        writer = io.TextIOWrapper(self.wfile, encoding="utf-8", newline="\n")
+        interpreter = Interpreter(self.server.opt, self.server.engine, writer)
+        budget = self.server.create_budget()
+        session = Scope(output=writer, budget=budget)
+
+        for line in reader:
+            line = line.strip()
+            if line.lower() == EXIT_COMMAND:
+                break
+            if line:
+                if budget is not None:
+                    budget.start()
+                program = interpreter.compile(line, repl_mode=True)
+                if program is not None:
+                    program.run(session=session)
+            writer.write(END_OF_RESPONSE + "\n")
+            writer.flush()
+
+
+class ReplServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Interpreter daemon listening on a UNIX socket, each connection is an independent console session.
+
+    Parsing tables are built once when the server starts, clients only parse their snippets.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path, opt=False, engine="ast", steps=None, seconds=None):
+        self._opt = opt
+        self._engine = engine
+        self._steps = steps
+        self._seconds = seconds
+        Interpreter(opt, engine)
+        if os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+            os.unlink(socket_path)  # left by a server which did not stop cleanly
+        super().__init__(socket_path, ReplSession)
+
+    @property
+    def opt(self):
+        return self._opt
+
+    @property
+    def engine(self):
+        return self._engine
+
+    def create_budget(self):
+        if self._steps is None and self._seconds is None:
+            return None
+        return Budget(self._steps, self._seconds)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
@@ -0,0 +1,440 @@
+"""Algebraic simplification of expressions with rewrite rules.
+
+Every rule rewrites an expression matching its pattern into its template. Simplifier is applied to
+expressions when they are built, so operands are already simplified and the result of a rule is
+simplified again, which brings the whole tree to a fixpoint. Rules do not change results of
+evaluations which succeed, except dividing by 2, which keeps the original parser behaviour. Rules
+which hold only for values of some types are applied when operands are known to have them.
+"""
+
+import copy
+import math
+
+from compiler import ast
+from compiler.visitor import NodeVisitor
+
+
+class NotApplicable(Exception):
+    pass
+
+
+class Bindings:
+    """Expressions matched by pattern variables, every use after the first one gets a copy"""
+    def __init__(self, simplifier=None):
+        self._nodes = {}
+        self._taken = set()
+        self.operation = None
+        self.simplifier = simplifier
+
+    def __contains__(self, name):
+        return name in self._nodes
+
+    def __getitem__(self, name):
+        return self._nodes[name]
+
+    def __setitem__(self, name, node):
+        self._nodes[name] = node
+
+    def take(self, name):
+        if name in self._taken:
+            return copy.deepcopy(self._nodes[name])
+        self._taken.add(name)
+        return self._nodes[name]
+
+
+class Variable:
+    """Matches any expression, variables with the same name have to match equal expressions"""
+    def __init__(self, name):
+        self._name = name
+
+    def match(self, node, bindings, simplifier):
+        if self._name in bindings:
+            return bindings[self._name] == node
+        bindings[self._name] = node
+        return True
+
+    def build(self, bindings, simplifier):
+        return bindings.take(self._name)
+
+
+class Constant(Variable):
+    def __init__(self, name, kinds=(ast.Integer, ast.Real, ast.Boolean, ast.String)):
+        super().__init__(name)
+        self._kinds = kinds
+
+    def match(self, node, bindings, simplifier):
+        return isinstance(node, self._kinds) and super().match(node, bindings, simplifier)
+
+
+class Number:
+    """Matches integer or real literal with given value"""
+    def __init__(self, value):
+        self._value = value
+
+    def match(self, node, bindings, simplifier):
+        return isinstance(node, (ast.Integer, ast.Real)) and node.value == self._value
+
+
+class Literal:
+    def __init__(self, kind, value):
+        self._kind = kind
+        self._value = value
+
+    def match(self, node, bindings, simplifier):
+        return isinstance(node, self._kind) and node.value == self._value
+
+    def build(self, bindings, simplifier):
+        return self._kind(self._value)
+
+
+class Operation:
+    """Matches binary operation with one of given symbols, None matches any operation"""
+    def __init__(self, symbols, left, right):
+        self._symbols = (symbols,) if isinstance(symbols, str) else symbols
+        self._left = left
+        self._right = right
+
+    @property
+    def symbols(self):
+        return self._symbols
+
+    def match(self, node, bindings, simplifier):
+        return isinstance(node, ast.BinaryOperation) and \
+               (self._symbols is None or simplifier.get_symbol(node) in self._symbols) and \
+               self._left.match(node.left, bindings, simplifier) and \
+               self._right.match(node.right, bindings, simplifier)
+
+    def build(self, bindings, simplifier):
+        return simplifier.rewrite(ast.BinaryOperation(self._left.build(bindings, simplifier),
+                                                      simplifier.operations[self._symbols[0]],
+                                                      self._right.build(bindings, simplifier)))
+
+
+class Negate:
+    def __init__(self, value):
+        self._value = value
+
+    def match(self, node, bindings, simplifier):
+        return isinstance(node, ast.Minus) and self._value.match(node.value, bindings, simplifier)
+
+    def build(self, bindings, simplifier):
+        return simplifier.rewrite(ast.Minus(self._value.build(bindings, simplifier)))
+
+
+class Fold:
+    """Computes operation on constants, None uses operation of the rewritten expression"""
+    def __init__(self, symbol, left, right):
+        self._symbol = symbol
+        self._left = left
+        self._right = right
+
+    def build(self, bindings, simplifier):
+        return simplifier.fold(self._symbol or bindings.operation,
+                               self._left.build(bindings, simplifier), self._right.build(bindings, simplifier))
+
+
+class Rule:
+    def __init__(self, description, pattern, template, when=None):
+        self._description = description
+        self._pattern = pattern
+        self._template = template
+        self._when = when
+
+    @property
+    def description(self):
+        return self._description
+
+    @property
+    def pattern(self):
+        return self._pattern
+
+    def apply(self, node, simplifier):
+        bindings = Bindings(simplifier)
+        if isinstance(node, ast.BinaryOperation):
+            bindings.operation = simplifier.get_symbol(node)
+
+        if not self._pattern.match(node, bindings, simplifier):
+            return None
+        if self._when is not None and not self._when(bindings):
+            return None
+
+        try:
+            return self._template.build(bindings, simplifier)
+        except NotApplicable:
+            return None
+
+
+class PurityChecker(NodeVisitor):
+    """Returns whether evaluation of visited expression has no effects besides giving its value"""
+
+    def generic_visit(self, node):
+        return False
+
+    def visit_operands(self, node):
+        return all(self.visit(child) for child in node.children())
+
+    visit_Integer = visit_Real = visit_Boolean = visit_String = visit_operands
+    visit_Name = visit_BinaryOperation = visit_Minus = visit_Conversion = visit_CallArgumentList = visit_operands
+
+    def visit_BuiltInFunction(self, node):
+        return node.built_in.pure and self.visit_operands(node)
+
+
+def is_pure(node):
+    return PurityChecker().visit(node)
+
+
+class StaticType(NodeVisitor):
+    """Returns type of value of visited expression when its evaluation succeeds, None when it is not known"""
+
+    COMPARISONS = {"==", "!=", "<", "<=", ">", ">="}
+
+    def __init__(self, simplifier):
+        self._simplifier = simplifier
+
+    def generic_visit(self, node):
+        return None
+
+    def visit_Integer(self, node):
+        return int
+
+    def visit_Real(self, node):
+        return float
+
+    def visit_Boolean(self, node):
+        return bool
+
+    def visit_String(self, node):
+        return str
+
+    def visit_Conversion(self, node):
+        return node.operation
+
+    def visit_Minus(self, node):
+        value_type = self.visit(node.value)
+        return int if value_type is bool else value_type if value_type in (int, float) else None
+
+    def visit_BinaryOperation(self, node):
+        symbol = self._simplifier.get_symbol(node)
+        if symbol in self.COMPARISONS:
+            return bool
+
+        # operands of different types raise
+        left_type, right_type = self.visit(node.left), self.visit(node.right)
+        if left_type is not right_type:
+            return None
+        if symbol in ("&", "|", "^") and left_type in (int, bool) or \
+                symbol in ("+", "-", "*") and left_type in (int, float) or symbol == "+" and left_type is str:
+            return left_type
+        return None
+
+
+def is_power_of_two(value):
+    if isinstance(value, int):
+        return value > 0 and value & (value - 1) == 0
+    return value > 0 and math.frexp(value)[0] == 0.5
+
+
+def pure(name):
+    return lambda bindings: is_pure(bindings[name])
+
+
+def typed(name, *types):
+    """Condition of rules which hold only for values of given types"""
+    return lambda bindings: StaticType(bindings.simplifier).visit(bindings[name]) in types
+
+
+def pure_typed(name, *types):
+    return lambda bindings: typed(name, *types)(bindings) and is_pure(bindings[name])
+
+
+def same_type(first, second):
+    return lambda bindings: type(bindings[first]) == type(bindings[second])
+
+
+def power_of_two(name):
+    return lambda bindings: is_power_of_two(bindings[name].value)
+
+
+X = Variable("x")
+C1, C2 = Constant("c1"), Constant("c2")
+I1, I2 = Constant("c1", ast.Integer), Constant("c2", ast.Integer)
+R1 = Constant("c1", ast.Real)
+S1, S2 = Constant("c1", ast.String), Constant("c2", ast.String)
+B1, B2 = Constant("c1", (ast.Integer, ast.Boolean)), Constant("c2", (ast.Integer, ast.Boolean))
+ZERO, ONE, TWO = Number(0), Number(1), Number(2)
+TRUE, FALSE = Literal(ast.Boolean, True), Literal(ast.Boolean, False)
+
+
+def associative(symbol, first, second, commutative=True):
+    """Rules moving constants c1 and c2 together, when folding them is exact"""
+    rules = [
+        Rule("(x {0} c1) {0} c2 = x {0} (c1 {0} c2)".format(symbol),
+             Operation(symbol, Operation(symbol, X, first), second), Operation(symbol, X, Fold(symbol, C1, C2)),
+             when=same_type("c1", "c2")),
+        Rule("c1 {0} (c2 {0} x) = (c1 {0} c2) {0} x".format(symbol),
+             Operation(symbol, first, Operation(symbol, second, X)), Operation(symbol, Fold(symbol, C1, C2), X),
+             when=same_type("c1", "c2"))
+    ]
+    if commutative:
+        rules += [
+            Rule("(c1 {0} x) {0} c2 = (c1 {0} c2) {0} x".format(symbol),
+                 Operation(symbol, Operation(symbol, first, X), second), Operation(symbol, Fold(symbol, C1, C2), X),
+                 when=same_type("c1", "c2")),
+            Rule("c1 {0} (x {0} c2) = x {0} (c1 {0} c2)".format(symbol),
+                 Operation(symbol, first, Operation(symbol, X, second)), Operation(symbol, X, Fold(symbol, C1, C2)),
+                 when=same_type("c1", "c2"))
+        ]
+    return rules
+
+
+# rules are tried in order, the first matching one is applied
+RULES = [
+    Rule("constant folding", Operation(None, C1, C2), Fold(None, C1, C2), when=same_type("c1", "c2")),
+    Rule("-c = (-1) * c", Negate(C1), Fold("*", Literal(ast.Integer, -1), C1)),
+
+    Rule("x + 0 = x", Operation("+", X, ZERO), X),
+    Rule("0 + x = x", Operation("+", ZERO, X), X),
+    Rule("x - 0 = x", Operation("-", X, ZERO), X),
+    Rule("0 - x = -x", Operation("-", ZERO, X), Negate(X)),
+    Rule("x * 1 = x", Operation("*", X, ONE), X),
+    Rule("1 * x = x", Operation("*", ONE, X), X),
+    # real zero is left alone, infinite or nan operand does not give zero
+    Rule("x * 0 = 0", Operation("*", X, Literal(ast.Integer, 0)), Literal(ast.Integer, 0), when=pure("x")),
+    Rule("0 * x = 0", Operation("*", Literal(ast.Integer, 0), X), Literal(ast.Integer, 0), when=pure("x")),
+    Rule("x / 1 = x", Operation("/", X, ONE), X),
+    Rule("x ** 1 = x", Operation("**", X, Literal(ast.Integer, 1)), X, when=typed("x", int, float)),
+    Rule("x ** 0 = 1", Operation("**", X, Literal(ast.Integer, 0)), Literal(ast.Integer, 1),
+         when=pure_typed("x", int)),
+
+    # logical identities hold only for booleans, operands of other types raise
+    Rule("x & true = x", Operation("&", X, TRUE), X, when=typed("x", bool)),
+    Rule("true & x = x", Operation("&", TRUE, X), X, when=typed("x", bool)),
+    Rule("x | false = x", Operation("|", X, FALSE), X, when=typed("x", bool)),
+    Rule("false | x = x", Operation("|", FALSE, X), X, when=typed("x", bool)),
+    Rule("x ^ false = x", Operation("^", X, FALSE), X, when=typed("x", bool)),
+    Rule("false ^ x = x", Operation("^", FALSE, X), X, when=typed("x", bool)),
+    Rule("x & false = false", Operation("&", X, FALSE), FALSE, when=pure_typed("x", bool)),
+    Rule("false & x = false", Operation("&", FALSE, X), FALSE, when=pure_typed("x", bool)),
+    Rule("x | true = true", Operation("|", X, TRUE), TRUE, when=pure_typed("x", bool)),
+    Rule("true | x = true", Operation("|", TRUE, X), TRUE, when=pure_typed("x", bool)),
+    Rule("x == true = x", Operation("==", X, TRUE), X, when=typed("x", bool)),
+    Rule("true == x = x", Operation("==", TRUE, X), X, when=typed("x", bool)),
+    Rule("x != false = x", Operation("!=", X, FALSE), X, when=typed("x", bool)),
+    Rule("false != x = x", Operation("!=", FALSE, X), X, when=typed("x", bool)),
+    Rule("x & x = x", Operation("&", X, X), X, when=pure_typed("x", bool, int)),
+    Rule("x | x = x", Operation("|", X, X), X, when=pure_typed("x", bool, int)),
+
+    # floating point operations are not associative, constants are only moved in exact ones
+    *associative("+", I1, I2),
+    *associative("+", S1, S2, commutative=False),
+    *associative("*", I1, I2),
+    *associative("&", B1, B2),
+    *associative("|", B1, B2),
+    *associative("^", B1, B2),
+    Rule("(x - c1) + c2 = x + (c2 - c1)", Operation("+", Operation("-", X, I1), I2),
+         Operation("+", X, Fold("-", C2, C1))),
+    Rule("(x + c1) - c2 = x + (c1 - c2)", Operation("-", Operation("+", X, I1), I2),
+         Operation("+", X, Fold("-", C1, C2))),
+    Rule("(x - c1) - c2 = x - (c1 + c2)", Operation("-", Operation("-", X, I1), I2),
+         Operation("-", X, Fold("+", C1, C2))),
+
+    Rule("x * c1 + x * c2 = x * (c1 + c2)", Operation("+", Operation("*", X, I1), Operation("*", X, I2)),
+         Operation("*", X, Fold("+", C1, C2)), when=pure("x")),
+    Rule("x * c1 - x * c2 = x * (c1 - c2)", Operation("-", Operation("*", X, I1), Operation("*", X, I2)),
+         Operation("*", X, Fold("-", C1, C2)), when=pure("x")),
+    Rule("c1 * x + c2 * x = (c1 + c2) * x", Operation("+", Operation("*", I1, X), Operation("*", I2, X)),
+         Operation("*", Fold("+", C1, C2), X), when=pure("x")),
+    Rule("c1 * (x + c2) = x * c1 + c1 * c2", Operation("*", I1, Operation("+", X, I2)),
+         Operation("+", Operation("*", X, C1), Fold("*", C1, C2))),
+    Rule("(x + c2) * c1 = x * c1 + c2 * c1", Operation("*", Operation("+", X, I2), I1),
+         Operation("+", Operation("*", X, C1), Fold("*", C2, C1))),
+    Rule("c1 * (x - c2) = x * c1 - c1 * c2", Operation("*", I1, Operation("-", X, I2)),
+         Operation("-", Operation("*", X, C1), Fold("*", C1, C2))),
+    Rule("(x - c2) * c1 = x * c1 - c2 * c1", Operation("*", Operation("-", X, I2), I1),
+         Operation("-", Operation("*", X, C1), Fold("*", C2, C1))),
+
+    Rule("x * 2 = x + x", Operation("*", X, TWO), Operation("+", X, X), when=pure("x")),
+    Rule("2 * x = x + x", Operation("*", TWO, X), Operation("+", X, X), when=pure("x")),
+    Rule("x ** 2 = x * x", Operation("**", X, TWO), Operation("*", X, X), when=pure("x")),
+    Rule("x / 2 = x * 0.5", Operation("/", X, TWO), Operation("*", X, Literal(ast.Real, 0.5))),
+    Rule("x / 2.0 ** k = x * 2.0 ** -k", Operation("/", X, R1),
+         Operation("*", X, Fold("/", Literal(ast.Real, 1.0), C1)), when=power_of_two("c1")),
+    Rule("x % 2 ** k = x & (2 ** k - 1)", Operation("%", X, I1),
+         Operation("&", X, Fold("-", C1, Literal(ast.Integer, 1))), when=power_of_two("c1"))
+]
+
+
+class Simplifier:
+    def __init__(self, operations, literals, rules=None):
+        self._operations = operations
+        self._literals = literals
+        self._symbols = {operation[0]: symbol for symbol, operation in operations.items()}
+        self._negations = []
+        self._operation_rules = {symbol: [] for symbol in operations}
+
+        for rule in RULES if rules is None else rules:
+            if isinstance(rule.pattern, Negate):
+                self._negations.append(rule)
+                continue
+            for symbol in rule.pattern.symbols or operations:
+                self._operation_rules[symbol].append(rule)
+
+    @property
+    def operations(self):
+        return self._operations
+
+    def get_symbol(self, node):
+        return self._symbols[node.operation]
+
+    def rewrite(self, node):
+        """Returns simplified expression, operands of the given one have to be already simplified"""
+        if isinstance(node, ast.BinaryOperation):
+            rules = self._operation_rules[self.get_symbol(node)]
+        elif isinstance(node, ast.Minus):
+            rules = self._negations
+        elif isinstance(node, ast.BuiltInFunction):
+            return self.fold_call(node)
+        else:
+            return node
+
+        for rule in rules:
+            result = rule.apply(node, self)
+            if result is not None:
+                return result
+        return node
+
+    def fold(self, symbol, left, right):
+        # booleans use logical operations instead of arithmetic ones
+        if isinstance(left, ast.Boolean) and isinstance(right, ast.Boolean):
+            symbol = {"+": "|", "*": "&"}.get(symbol, symbol)
+
+        try:
+            result = self._operations[symbol][0](left.value, right.value)
+        except (ArithmeticError, ValueError, TypeError):
+            raise NotApplicable()
+
+        if type(result) not in self._literals:
+            raise NotApplicable()
+        return self._literals[type(result)](result)
+
+    def fold_call(self, node):
+        """Computes call of pure built-in function with constant arguments, errors are left for execution"""
+        built_in = node.built_in
+        arguments = node.arguments.arguments
+        if not built_in.pure or not all(isinstance(argument, (ast.Integer, ast.Real, ast.Boolean))
+                                        for argument in arguments):
+            return node
+
+        values = [argument.value for argument in arguments]
+        result_type = built_in.get_result_type([type(value) for value in values])
+        if result_type not in self._literals:
+            return node
+        try:
+            result = built_in.function(*values)
+        except (ArithmeticError, ValueError, TypeError):
+            return node
+
+        if type(result) is not result_type or isinstance(result, float) and not math.isfinite(result):
+            return node
+        return self._literals[result_type](result)
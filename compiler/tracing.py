@@ -0,0 +1,136 @@
+import json
+import threading
+
+
+class Hooks:
+    """Base class of execution hooks, events which are not overridden are ignored"""
+
+    def on_statement(self, node):
+        pass
+
+    def on_call(self, node):
+        pass
+
+    def on_loop_iteration(self, node):
+        pass
+
+    def on_scope_push(self, depth):
+        pass
+
+    def on_temporary(self, node, hit):
+        """Called when saved common subexpression is read, hit is False when it has to be evaluated again"""
+        pass
+
+    def on_finish(self):
+        pass
+
+
+class Tracer:
+    """Passes execution events to registered hooks, used by scopes created with it.
+
+    Nodes check whether their scope has a tracer, so execution without tracer runs only these checks
+    and other interpreters are not affected. Statements are elements of statement lists and statements
+    executed with error handling, iterations are executions of loop bodies.
+    """
+
+    def __init__(self, hooks=()):
+        self._hooks = list(hooks)
+
+    def register(self, hooks):
+        self._hooks.append(hooks)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.finish()
+
+    def on_statement(self, node):
+        for hooks in self._hooks:
+            hooks.on_statement(node)
+
+    def on_call(self, node):
+        for hooks in self._hooks:
+            hooks.on_call(node)
+
+    def on_loop_iteration(self, node):
+        for hooks in self._hooks:
+            hooks.on_loop_iteration(node)
+
+    def on_scope_push(self, depth):
+        for hooks in self._hooks:
+            hooks.on_scope_push(depth)
+
+    def on_temporary(self, node, hit):
+        for hooks in self._hooks:
+            hooks.on_temporary(node, hit)
+
+    def finish(self):
+        for hooks in self._hooks:
+            hooks.on_finish()
+
+
+class MetricsCollector(Hooks):
+    """Counts executed statements, loop iterations, function calls and reads of common subexpressions.
+
+    Metrics are written when execution finishes, as Prometheus text format when file name ends
+    with .prom and as JSON otherwise.
+    """
+
+    def __init__(self, file_name=None):
+        self._file_name = file_name
+        self._lock = threading.Lock()
+        self._metrics = {
+            "statements_executed": 0,
+            "loop_iterations": 0,
+            "function_calls": 0,
+            "max_scope_depth": 1,
+            "cse_hits": 0,
+            "cse_misses": 0,
+        }
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    def __count(self, metric):
+        with self._lock:
+            self._metrics[metric] += 1
+
+    def on_statement(self, node):
+        self.__count("statements_executed")
+
+    def on_call(self, node):
+        self.__count("function_calls")
+
+    def on_loop_iteration(self, node):
+        self.__count("loop_iterations")
+
+    def on_scope_push(self, depth):
+        with self._lock:
+            self._metrics["max_scope_depth"] = max(self._metrics["max_scope_depth"], depth)
+
+    def on_temporary(self, node, hit):
+        self.__count("cse_hits" if hit else "cse_misses")
+
+    def on_finish(self):
+        if self._file_name is None:
+            return
+
+        with open(self._file_name, "w") as output_file:
+            if self._file_name.endswith(".prom"):
+                output_file.write(self.format_prometheus())
+            else:
+                json.dump(self._metrics, output_file, indent=2)
+                output_file.write("\n")
+
+    def format_prometheus(self):
+        lines = []
+        for metric, value in self._metrics.items():
+            if metric == "max_scope_depth":
+                name, metric_type = "calc_" + metric, "gauge"
+            else:
+                name, metric_type = "calc_{}_total".format(metric), "counter"
+            lines.append("# TYPE {} {}".format(name, metric_type))
+            lines.append("{} {}".format(name, value))
+        return "\n".join(lines) + "\n"
@@ -1,189 +1,178 @@
-from compiler import ast
-
-
-def add_to_class(cls):
-    def decorator(func):
-        setattr(cls, func.__name__, func)
-        return func
-
-    return decorator
-
-
-class TreePrinter:
-    @add_to_class(ast.Node)
-    def print_tree(self, graph):
-        raise Exception("printTree not defined in class " + self.__class__.__name__)
-
-    @add_to_class(ast.Program)
-    def print_tree(self, graph):
-        graph.node(self.id, "Program")
-        for statement in self._statement_list:
-            graph.edge(self.id, statement.print_tree(graph))
-        return self.id
-
-    @add_to_class(ast.Block)
-    def print_tree(self, graph):
-        graph.node(self.id, "Block")
-        for statement in self._statement_list:
-            graph.edge(self.id, statement.print_tree(graph))
-        return self.id
-
-    @add_to_class(ast.FunctionArgumentList)
-    def print_tree(self, graph):
-        graph.node(self.id, "Arguments list")
-        for argument in self._arguments:
-            graph.edge(self.id, argument.print_tree(graph))
-        return self.id
-
-    @add_to_class(ast.FunctionArgument)
-    def print_tree(self, graph):
-        graph.node(self.id, "Argument: {}: {}".format(self._name, self._type.__name__))
-        return self.id
-
-    @add_to_class(ast.CustomFunction)
-    def print_tree(self, graph):
-        graph.node(self.id, "Function {}".format(self._name))
-        graph.edge(self.id, self._arg_list.print_tree(graph), "Arguments")
-        graph.edge(self.id, self._body.print_tree(graph), "Body")
-        if self._returned_value:
-            graph.edge(self.id, self._returned_value.print_tree(graph), "Returns")
-
-        return self.id
-
-    @add_to_class(ast.Print)
-    def print_tree(self, graph):
-        graph.node(self.id, "Print")
-        graph.edge(self.id, self._expression.print_tree(graph), "Expression")
-        return self.id
-
-    @add_to_class(ast.Parallel)
-    def print_tree(self, graph):
-        graph.node(self.id, "Parallel")
-        for statement in self._statement_list:
-            graph.edge(self.id, statement.print_tree(graph))
-
-        return self.id
-
-    @add_to_class(ast.RepeatUntil)
-    def print_tree(self, graph):
-        graph.node(self.id, "Repeat")
-        graph.edge(self.id, self._block.print_tree(graph), "Block")
-        graph.edge(self.id, self._condition.print_tree(graph), "Until")
-        return self.id
-
-    @add_to_class(ast.For)
-    def print_tree(self, graph):
-        graph.node(self.id, "For")
-        graph.edge(self.id, self._initial_assignment.print_tree(graph), "Initial")
-        graph.edge(self.id, self._condition.print_tree(graph), "Condition")
-        graph.edge(self.id, self._step_assignment.print_tree(graph), "Step")
-        graph.edge(self.id, self._block.print_tree(graph), "Block")
-        return self.id
-
-    @add_to_class(ast.While)
-    def print_tree(self, graph):
-        graph.node(self.id, "While")
-        graph.edge(self.id, self._condition.print_tree(graph), "Condition")
-        graph.edge(self.id, self._block.print_tree(graph), "Block")
-        return self.id
-
-    @add_to_class(ast.ConditionalIfElse)
-    def print_tree(self, graph):
-        graph.node(self.id, "IfElse")
-        graph.edge(self.id, self._condition.print_tree(graph), "Condition")
-        graph.edge(self.id, self._block_if.print_tree(graph), "If")
-        graph.edge(self.id, self._block_else.print_tree(graph), "Else")
-        return self.id
-
-    @add_to_class(ast.ConditionalIf)
-    def print_tree(self, graph):
-        graph.node(self.id, "If")
-        graph.edge(self.id, self._condition.print_tree(graph), "Condition")
-        graph.edge(self.id, self._statement.print_tree(graph), "Instructions")
-        return self.id
-
-    @add_to_class(ast.CallArgumentList)
-    def print_tree(self, graph):
-        graph.node(self.id, "Call arguments")
-        for argument in self._arguments:
-            graph.edge(self.id, argument.print_tree(graph))
-        return self.id
-
-    @add_to_class(ast.Call)
-    def print_tree(self, graph):
-        graph.node(self.id, "Call {}".format(self._function_name))
-        graph.edge(self.id, self._arg_list.print_tree(graph))
-        return self.id
-
-    @add_to_class(ast.PreFixExpression)
-    def print_tree(self, graph):
-        graph.node(self.id, "Prefix expression: " + self._operation)
-        return self.id
-
-    @add_to_class(ast.PostFixExpression)
-    def print_tree(self, graph):
-        graph.node(self.id, "Postfix expression: " + self._operation)
-        return self.id
-
-    @add_to_class(ast.BuiltInFunction)
-    def print_tree(self, graph):
-        graph.node(self.id, "Built-in function: " + self._function.__name__)
-        graph.edge(self.id, self._arguments.print_tree(graph), "Argument")
-        return self.id
-
-    @add_to_class(ast.Assignment)
-    def print_tree(self, graph):
-        graph.node(self.id, "Assignment to " + self._name)
-        graph.edge(self.id, self._value.print_tree(graph), "Equals")
-        return self.id
-
-    @add_to_class(ast.Minus)
-    def print_tree(self, graph):
-        graph.node(self.id, "Minus")
-        graph.edge(self.id, self._value.print_tree(graph))
-        return self.id
-
-    @add_to_class(ast.Declaration)
-    def print_tree(self, graph):
-        graph.node(self.id, "DeclareVariable: " + self._name + ", type: " + self._value_type.__name__)
-        if self._value is not None:
-            graph.edge(self.id, self._value.print_tree(graph), "Assign")
-        return self.id
-
-    @add_to_class(ast.Conversion)
-    def print_tree(self, graph):
-        graph.node(self.id, "Conversion from {} to {}".format(self._type_from.__name__, self._operation.__name__))
-        graph.edge(self.id, self._value.print_tree(graph), "Value")
-        return self.id
-
-    @add_to_class(ast.BinaryOperation)
-    def print_tree(self, graph):
-        graph.node(self.id, "BinaryOperation: " + self._operation.__name__)
-        graph.edge(self.id, self._left.print_tree(graph), "Left")
-        graph.edge(self.id, self._right.print_tree(graph), "Right")
-        return self.id
-
-    @add_to_class(ast.Real)
-    def print_tree(self, graph):
-        graph.node(self.id, "Real: " + str(self._value))
-        return self.id
-
-    @add_to_class(ast.Integer)
-    def print_tree(self, graph):
-        graph.node(self.id, "Integer: " + str(self._value))
-        return self.id
-
-    @add_to_class(ast.Boolean)
-    def print_tree(self, graph):
-        graph.node(self.id, "Boolean: " + str(self._value))
-        return self.id
-
-    @add_to_class(ast.String)
-    def print_tree(self, graph):
-        graph.node(self.id, "String: " + self._value)
-        return self.id
-
-    @add_to_class(ast.Name)
-    def print_tree(self, graph):
-        graph.node(self.id, "VariableName: " + self._name)
-        return self.id
+from compiler.visitor import NodeVisitor
+
+
+class TreePrinter(NodeVisitor):
+    """Draws visited tree on the given graph, every visit returns graph identifier of the visited node"""
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def add_node(self, node, label):
+        identifier = str(node.id)
+        if node.position is not None:
+            label += "\n{}:{}".format(*node.position)
+        self._graph.node(identifier, label)
+        return identifier
+
+    def add_edge(self, identifier, child, label=None):
+        self._graph.edge(identifier, self.visit(child), label)
+
+    def generic_visit(self, node):
+        raise Exception("printTree not defined in class " + node.__class__.__name__)
+
+    def visit_Program(self, node):
+        identifier = self.add_node(node, "Program")
+        for statement in node.statement_list:
+            self.add_edge(identifier, statement)
+        return identifier
+
+    def visit_Block(self, node):
+        identifier = self.add_node(node, "Block")
+        for statement in node.statement_list:
+            self.add_edge(identifier, statement)
+        return identifier
+
+    def visit_FunctionArgumentList(self, node):
+        identifier = self.add_node(node, "Arguments list")
+        for argument in node.arguments:
+            self.add_edge(identifier, argument)
+        return identifier
+
+    def visit_FunctionArgument(self, node):
+        return self.add_node(node, "Argument: {}: {}".format(node.name, node.type.__name__))
+
+    def visit_CustomFunction(self, node):
+        identifier = self.add_node(node, "Function {}".format(node.name))
+        self.add_edge(identifier, node.arg_list, "Arguments")
+        self.add_edge(identifier, node.body, "Body")
+        if node.returned_value:
+            self.add_edge(identifier, node.returned_value, "Returns")
+
+        return identifier
+
+    def visit_Print(self, node):
+        identifier = self.add_node(node, "Print")
+        self.add_edge(identifier, node.expression, "Expression")
+        return identifier
+
+    def visit_Parallel(self, node):
+        identifier = self.add_node(node, "Parallel")
+        for statement in node.statement_list:
+            self.add_edge(identifier, statement)
+
+        return identifier
+
+    def visit_RepeatUntil(self, node):
+        identifier = self.add_node(node, "Repeat")
+        if node.preheader is not None:
+            self.add_edge(identifier, node.preheader, "Preheader")
+        self.add_edge(identifier, node.block, "Block")
+        self.add_edge(identifier, node.condition, "Until")
+        return identifier
+
+    def visit_For(self, node):
+        identifier = self.add_node(node, "For")
+        self.add_edge(identifier, node.initial_assignment, "Initial")
+        self.add_edge(identifier, node.condition, "Condition")
+        if node.preheader is not None:
+            self.add_edge(identifier, node.preheader, "Preheader")
+            self.add_edge(identifier, node.iteration_condition, "Iteration condition")
+        self.add_edge(identifier, node.step_assignment, "Step")
+        self.add_edge(identifier, node.block, "Block")
+        return identifier
+
+    def visit_While(self, node):
+        identifier = self.add_node(node, "While")
+        self.add_edge(identifier, node.condition, "Condition")
+        if node.preheader is not None:
+            self.add_edge(identifier, node.preheader, "Preheader")
+            self.add_edge(identifier, node.iteration_condition, "Iteration condition")
+        self.add_edge(identifier, node.block, "Block")
+        return identifier
+
+    def visit_ConditionalIfElse(self, node):
+        identifier = self.add_node(node, "IfElse")
+        self.add_edge(identifier, node.condition, "Condition")
+        self.add_edge(identifier, node.block_if, "If")
+        self.add_edge(identifier, node.block_else, "Else")
+        return identifier
+
+    def visit_ConditionalIf(self, node):
+        identifier = self.add_node(node, "If")
+        self.add_edge(identifier, node.condition, "Condition")
+        self.add_edge(identifier, node.statement, "Instructions")
+        return identifier
+
+    def visit_CallArgumentList(self, node):
+        identifier = self.add_node(node, "Call arguments")
+        for argument in node.arguments:
+            self.add_edge(identifier, argument)
+        return identifier
+
+    def visit_Call(self, node):
+        identifier = self.add_node(node, "Call {}".format(node.function_name))
+        self.add_edge(identifier, node.arg_list)
+        return identifier
+
+    def visit_PreFixExpression(self, node):
+        return self.add_node(node, "Prefix expression: " + node.operation)
+
+    def visit_PostFixExpression(self, node):
+        return self.add_node(node, "Postfix expression: " + node.operation)
+
+    def visit_BuiltInFunction(self, node):
+        identifier = self.add_node(node, "Built-in function: " + node.name)
+        self.add_edge(identifier, node.arguments, "Argument")
+        return identifier
+
+    def visit_Assignment(self, node):
+        identifier = self.add_node(node, "Assignment to " + node.name)
+        self.add_edge(identifier, node.value, "Equals")
+        return identifier
+
+    def visit_Minus(self, node):
+        identifier = self.add_node(node, "Minus")
+        self.add_edge(identifier, node.value)
+        return identifier
+
+    def visit_Declaration(self, node):
+        type_name = node.value_type.__name__ if node.value_type is not None else "inferred"
+        identifier = self.add_node(node, "DeclareVariable: " + node.name + ", type: " + type_name)
+        if node.value is not None:
+            self.add_edge(identifier, node.value, "Assign")
+        return identifier
+
+    def visit_Conversion(self, node):
+        identifier = self.add_node(node, "Conversion from {} to {}".format(node.type_from.__name__,
+                                                                          node.operation.__name__))
+        self.add_edge(identifier, node.value, "Value")
+        return identifier
+
+    def visit_BinaryOperation(self, node):
+        identifier = self.add_node(node, "BinaryOperation: " + node.operation.__name__)
+        self.add_edge(identifier, node.left, "Left")
+        self.add_edge(identifier, node.right, "Right")
+        return identifier
+
+    def visit_Real(self, node):
+        return self.add_node(node, "Real: " + str(node.value))
+
+    def visit_Integer(self, node):
+        return self.add_node(node, "Integer: " + str(node.value))
+
+    def visit_Boolean(self, node):
+        return self.add_node(node, "Boolean: " + str(node.value))
+
+    def visit_String(self, node):
+        return self.add_node(node, "String: " + node.value)
+
+    def visit_Name(self, node):
+        return self.add_node(node, "VariableName: " + node.name)
+
+    def visit_TemporaryAssignment(self, node):
+        identifier = self.add_node(node, "Save: " + node.name)
+        self.add_edge(identifier, node.expression)
+        return identifier
+
+    def visit_TemporaryName(self, node):
+        return self.add_node(node, "Saved: " + node.name)
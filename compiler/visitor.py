@@ -0,0 +1,39 @@
+class NodeVisitor:
+    """Calls visit_<class name> method of the visitor for the visited node.
+
+    Methods are searched along the hierarchy of the node class, nodes without any are passed to
+    generic_visit, which visits all children with the same arguments. Found methods are cached
+    per visitor class.
+    """
+
+    _methods = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._methods = {}
+
+    def visit(self, node, *args):
+        method = self._methods.get(node.__class__)
+        if method is None:
+            method = self._methods[node.__class__] = self.__find_method(node.__class__)
+        return method(self, node, *args)
+
+    @classmethod
+    def __find_method(cls, node_class):
+        for base in node_class.__mro__:
+            method = getattr(cls, "visit_" + base.__name__, None)
+            if method is not None:
+                return method
+        return cls.generic_visit
+
+    def generic_visit(self, node, *args):
+        for child in node.children():
+            self.visit(child, *args)
+
+
+class NodeTransformer(NodeVisitor):
+    """Visitor replacing every node with the result of its visit method"""
+
+    def generic_visit(self, node, *args):
+        node.replace_children(lambda child: self.visit(child, *args))
+        return node
@@ -1,52 +1,74 @@
 import argparse
+import asyncio
+import contextlib
+import sys
 
-from graphviz import Digraph
+from compiler.batch import BatchRunner, find_programs, format_summary
+from compiler.host import SessionHost
+from compiler.interpreter import Interpreter
+from compiler.names import Budget, Scope
+from compiler.output import DEFAULT_BUFFER_SIZE, BufferedOutput
+from compiler.profiler import Profiler
+from compiler.server import ReplServer
+from compiler.tracing import MetricsCollector, Tracer
 
-import compiler.tree_printer
-from compiler.lexer import Lexer
-from compiler.names import Scope
-from compiler.parser import Parser
 
-lexer = Lexer()
-lexer.build()
-parser = Parser(lexer.tokens)
-parser.build()
-scope = Scope()
+def print_tokens(interpreter, code):
+    for token in interpreter.tokens(code):
+        print(token)
 
 
-def print_tokens(code):
-    lexer.lexer.input(code)
-    tok = lexer.lexer.token()
-    while tok:
-        print(tok)
-        tok = lexer.lexer.token()
+def run(interpreter, code, ast_file_name=None, repl_mode=False, ir_file_name=None, session=None, budget=None,
+        output=None, tracer=None, profiler=None):
+    program = interpreter.compile(code, repl_mode)
 
+    if program is not None:
+        if profiler is not None:
+            profiler.instrument(program.program)
+        if ir_file_name and program.compiled is not None:
+            with open(ir_file_name, "w") as ir_file:
+                ir_file.write(str(program.compiled.module))
+        program.run(outputs=output, session=session, budget=budget, tracer=tracer)
 
-def run(code, opt, ast_file_name=None, repl_mode=False):
-    if repl_mode and code[-1] != ";":
-        code += ";"
+        if ast_file_name:
+            print_ast(program.program, ast_file_name)
 
-    res = parser.parse(lexer, code)
+    return program
 
-    if res is not None:
-        if repl_mode:
-            res.activate_repl_mode()
 
-        res.execute(scope, opt)
+def print_ast(program, ast_file_name):
+    # graphviz is needed only for printing AST, so it is not imported when the compiler starts
+    from graphviz import Digraph
+    from compiler.tree_printer import TreePrinter
 
-        if ast_file_name:
-            graph = Digraph(format="png")
-            res.print_tree(graph)
-            graph.render(ast_file_name)
+    graph = Digraph(format="png")
+    TreePrinter(graph).visit(program)
+    graph.render(ast_file_name)
 
 
-def interpret_file(file_name, ast_file_name, opt):
+def interpret_file(interpreter, file_name, ast_file_name, ir_file_name=None, budget=None, output=None,
+                   tracer=None, profiler=None):
     with open(file_name, "r") as input_file:
         code = input_file.read()
-        run(code, opt, ast_file_name)
+        run(interpreter, code, ast_file_name, ir_file_name=ir_file_name, budget=budget, output=output,
+            tracer=tracer, profiler=profiler)
+
 
+def interpret_stream(interpreter, input_file, budget=None, output=None, tracer=None):
+    session = Scope(output=output, budget=budget, tracer=tracer)
+    # statements typed by the user show their output at once
+    interactive = output is not None and input_file.isatty()
+    for statement in interpreter.parse_stream(input_file):
+        statement.execute_and_handle_errors(session, interpreter.opt)
+        if interactive:
+            output.flush()
+        if budget is not None and budget.exceeded is not None:
+            break
 
-def run_interactive_console(ast_file_name, print_tokens_mode):
+
+def run_interactive_console(interpreter, ast_file_name, print_tokens_mode, budget=None, output=None,
+                            tracer=None):
+    session = Scope(output=output, budget=budget, tracer=tracer)
     run_console = True
     while run_console:
         s = None
@@ -61,9 +83,13 @@ def run_interactive_console(ast_file_name, print_tokens_mode):
 
         if run_console:
             if print_tokens_mode:
-                print_tokens(s)
+                print_tokens(interpreter, s)
             else:
-                run(s, ast_file_name, repl_mode=True)
+                if budget is not None:
+                    budget.start()
+                run(interpreter, s, ast_file_name, repl_mode=True, session=session)
+                if output is not None:
+                    output.flush()
 
 
 def main():
@@ -72,15 +98,101 @@ def main():
     argparser.add_argument("-ast", type=str, help="Draw AST to given filename")
     argparser.add_argument("-opt", action="store_true", help="Use optimisations")
     argparser.add_argument("-token", action="store_true", help="Print tokens")
+    argparser.add_argument("-engine", choices=["ast", "ir"], default="ast",
+                           help="Execute AST directly or compile it through SSA IR")
+    argparser.add_argument("-ir", type=str, help="Write IR to given filename")
+    argparser.add_argument("-stream", action="store_true",
+                           help="Parse and execute statements one by one, reading standard input without a file")
+    argparser.add_argument("-profile", type=str,
+                           help="Print time spent in node types and lines, write collapsed stacks to given filename")
+    argparser.add_argument("-metrics", type=str,
+                           help="Write execution metrics to given filename, Prometheus text for .prom files")
+    argparser.add_argument("-batch", type=str, nargs="+",
+                           help="Run given files and .cd files of given directories in a pool of processes")
+    argparser.add_argument("-jobs", type=int, help="Number of processes used by -batch, number of CPUs by default")
+    argparser.add_argument("-results", type=str, default="results",
+                           help="Directory for output of every program run by -batch")
+    argparser.add_argument("-serve", type=str,
+                           help="Run interactive console sessions for clients connecting to given UNIX socket")
+    argparser.add_argument("-host", type=str,
+                           help="Serve console sessions of many clients of given UNIX socket from asyncio loop")
+    argparser.add_argument("-workers", type=int, default=4, help="Number of threads executing lines of -host sessions")
+    argparser.add_argument("-max-steps", type=int,
+                           help="Stop execution after given number of loop iterations and function calls")
+    argparser.add_argument("-timeout", type=float, help="Stop execution after given number of seconds")
+    argparser.add_argument("-buffer", type=int, default=DEFAULT_BUFFER_SIZE,
+                           help="Number of characters of output collected before writing them, 0 writes every line")
+    argparser.add_argument("-direct-output", action="store_true",
+                           help="Write output directly to descriptor of standard output")
 
     args = argparser.parse_args()
     input_file_name = args.input_file
     opt = args.opt
 
-    if input_file_name:
-        interpret_file(input_file_name, args.ast, opt)
-    else:
-        run_interactive_console(args.ast, args.token)
+    if args.metrics and args.engine != "ast":
+        argparser.error("-metrics are collected only by ast engine")
+
+    steps, seconds = args.max_steps, args.timeout
+    budget = Budget(steps, seconds) if steps is not None or seconds is not None else None
+
+    if args.batch:
+        if input_file_name or args.ast or args.ir or args.stream or args.profile or args.metrics or args.token:
+            argparser.error("-batch can be used only with -opt, -engine, -max-steps and -timeout")
+        runner = BatchRunner(args.results, args.jobs, opt, args.engine, steps, seconds)
+        summaries, batch_seconds = runner.run(find_programs(args.batch))
+        print(format_summary(summaries, batch_seconds))
+        return
+
+    if args.serve:
+        if input_file_name or args.ast or args.ir or args.stream or args.profile or args.metrics or args.token:
+            argparser.error("-serve can be used only with -opt, -engine, -max-steps and -timeout")
+        with ReplServer(args.serve, opt, args.engine, steps, seconds) as server:
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+        return
+
+    if args.host:
+        if input_file_name or args.ast or args.ir or args.stream or args.profile or args.metrics or args.token:
+            argparser.error("-host can be used only with -opt, -engine, -workers, -max-steps and -timeout")
+        host = SessionHost(opt, args.engine, args.workers, steps, seconds)
+        try:
+            asyncio.run(host.serve(args.host))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            host.close()
+        return
+
+    if args.direct_output:
+        sys.stdout.flush()
+    output = BufferedOutput(fd=sys.stdout.fileno() if args.direct_output else None, buffer_size=args.buffer)
+    # syntax errors are written to the same output, so they keep their order with printed values
+    interpreter = Interpreter(opt, args.engine, output)
+    tracer = Tracer([MetricsCollector(args.metrics)]) if args.metrics else None
+    with output, tracer or contextlib.nullcontext():
+        if args.stream:
+            if opt or args.ast or args.engine != "ast" or args.ir:
+                argparser.error("-stream cannot be used with options working on the whole program")
+            if input_file_name:
+                with open(input_file_name, "r") as input_file:
+                    interpret_stream(interpreter, input_file, budget, output, tracer)
+            else:
+                interpret_stream(interpreter, sys.stdin, budget, output, tracer)
+        elif args.profile:
+            if not input_file_name or args.engine != "ast":
+                argparser.error("-profile requires input file executed by ast engine")
+            with Profiler() as profiler:
+                interpret_file(interpreter, input_file_name, args.ast, budget=budget, output=output, tracer=tracer,
+                               profiler=profiler)
+            output.flush()
+            print(profiler.format_table(), file=sys.stderr)
+            profiler.write_collapsed_stacks(args.profile)
+        elif input_file_name:
+            interpret_file(interpreter, input_file_name, args.ast, args.ir, budget, output, tracer)
+        else:
+            run_interactive_console(interpreter, args.ast, args.token, budget, output, tracer)
 
 
 if __name__ == '__main__':